@@ -1,70 +1,450 @@
 import os
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import json
+import base64
+import hmac
+import time
+import uuid
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 
-from voiceChat.nova_sonic_bridge import NovaSonicBridge, DEFAULT_SYSTEM_PROMPT
+from voiceChat.nova_sonic_bridge import DEFAULT_SYSTEM_PROMPT
+from voiceChat.audio_codec import (
+    CODEC_PCM,
+    OUTPUT_SAMPLE_RATE,
+    available_codecs,
+    create_codec,
+    negotiate_codec,
+)
+from voiceChat.degradation import (
+    COARSE_AUDIO,
+    COARSE_OUTPUT_FRAME_MS,
+    NORMAL,
+    AudioCoalescer,
+    describe_mode,
+    get_degradation_controller,
+)
+from voiceChat.capture import create_session_recorder
+from voiceChat.identity import Identity, Unauthenticated, create_identity_verifier
+from voiceChat.introspection import get_introspector
+from voiceChat.resampler import create_input_normalizer
+from voiceChat.session_manager import SessionLimitExceeded, get_session_manager
+from voiceChat.supervisor import SessionActivity, get_supervisor
+from voiceChat.transcript_writer import TranscriptWriter, create_transcript_sink
+from voiceChat.record_context import create_record_context_cache
+from uploadImage.imageAnalyzeBot import ai_image_analyze_stream, get_region_selection
+from uploadImage.records import put_analysis_record, put_image
+from uploadImage.resilience import CircuitOpenError, get_guard
+from uploadImage.quotas import QuotaExceeded, create_quota_manager
+from uploadImage.search_index import analysis_document, create_search_index
+from voiceChat.similar_cases import CaseRetriever, create_case_index, transcript_case_text
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
 app = FastAPI()
+transcript_sink = create_transcript_sink()
+record_context = create_record_context_cache()
+# One long-lived process, so per-user buckets can live in memory
+quotas = create_quota_manager()
+case_index = create_case_index()
+degradation = get_degradation_controller(get_supervisor().mean_pending_sends)
+introspector = get_introspector()
+identity_verifier = create_identity_verifier()
+case_retriever = CaseRetriever(
+    case_index, min_score=float(os.getenv("CASE_MIN_SCORE", "0.35"))
+)
+_analysis_storage = None
+
+
+def analysis_storage():
+    """(s3, table, bucket, search index) for persisting streamed analyses, or None in dev."""
+    global _analysis_storage
+    bucket = os.getenv("S3_BUCKET_NAME")
+    table_name = os.getenv("TABLE_NAME")
+    if _analysis_storage is None and bucket and table_name:
+        import boto3
+
+        region = os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION") or "us-east-1"
+        table = boto3.resource("dynamodb", region_name=region).Table(table_name)
+        s3 = boto3.client("s3", region_name=region)
+        _analysis_storage = (s3, table, bucket, create_search_index(s3, bucket))
+    return _analysis_storage
+
+
+async def remember_case(case_id: str, text: str, summary: str, user_id: str, **meta):
+    """Add a finished analysis or conversation to the user's similar cases."""
+    try:
+        await asyncio.to_thread(case_index.add, case_id, text, summary, user_id=user_id, **meta)
+    except Exception as e:
+        print(f"case index update failed for {case_id}: {e}")
+
+
+def bearer_token(websocket: WebSocket) -> str | None:
+    header = websocket.headers.get("authorization", "")
+    return header.removeprefix("Bearer ").strip() or None
+
+
+async def authenticate(websocket: WebSocket, token: str | None) -> Identity | None:
+    """The caller's verified identity, or None once the socket is closed."""
+    try:
+        if identity_verifier is None:
+            raise Unauthenticated("authentication is not configured")
+        return await identity_verifier.verify(token)
+    except Unauthenticated as e:
+        # 1008: policy violation
+        message, code = f"Unauthorized: {e}", 1008
+    except Exception as e:
+        print(f"identity check failed: {e}")
+        # 1011: server error, the client may retry
+        message, code = "Could not verify identity, try again", 1011
+    await websocket.send_json({"type": "error", "message": message})
+    await websocket.close(code=code)
+    return None
+
+
+@app.on_event("startup")
+async def start_degradation_controller():
+    degradation.start()
+
+
+@app.on_event("startup")
+async def install_session_profiler():
+    # VOICE_PROFILE=1: per-session loop time and CPU; VOICE_PROFILE_FRAMES adds allocations
+    introspector.install()
+
+
+@app.on_event("startup")
+async def start_region_probes():
+    """Keep idle Bedrock regions measured when several are configured."""
+    interval = float(os.getenv("BEDROCK_REGION_PROBE_SECONDS", "60"))
+    selectors = [get_session_manager().selector, get_region_selection()]
+    if interval <= 0 or all(len(s.regions) == 1 for s in selectors):
+        return
+
+    async def probe():
+        while True:
+            for selector in selectors:
+                await asyncio.to_thread(selector.probe_all)
+            await asyncio.sleep(interval)
+
+    app.state.region_probes = asyncio.create_task(probe())
 
 
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    return {
+        "ok": True,
+        "nova": get_session_manager().stats(),
+        "sessions": get_supervisor().stats(),
+        "degradation": degradation.stats(),
+        "bedrock": get_guard().stats(),
+        "imageRegions": get_region_selection().stats(),
+    }
+
+
+@app.get("/debug/sessions")
+async def debug_sessions(request: Request, allocations: bool = False):
+    """Live voice sessions, heaviest first; needs ``Authorization: Bearer
+    $DEBUG_TOKEN`` and does not exist without DEBUG_TOKEN."""
+    token = os.getenv("DEBUG_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404)
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode("utf-8"), token.encode("utf-8")):
+        raise HTTPException(status_code=401)
+    return {
+        **introspector.stats(),
+        "sessions": introspector.sessions(),
+        # A tracemalloc snapshot takes a while on a busy process
+        "topAllocations": (
+            await asyncio.to_thread(introspector.top_allocations) if allocations else []
+        ),
+    }
 
 
 @app.websocket("/ws/nova")
 async def ws_nova(websocket: WebSocket):
     await websocket.accept()
     print("accepted")
+    # Browsers cannot set headers on a WebSocket, so they pass ?token=<ID token>
+    identity = await authenticate(
+        websocket, bearer_token(websocket) or websocket.query_params.get("token")
+    )
+    if identity is None:
+        return
+    user_id = identity.user_id
     send_lock = asyncio.Lock()
+    activity: SessionActivity | None = None
 
     async def send(payload: dict):
-        async with send_lock:
-            await websocket.send_json(payload)
-
-    region = os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION") or "us-east-1"
-
-    bridge = NovaSonicBridge(
-        model_id=os.getenv("NOVA_SONIC_MODEL_ID", "amazon.nova-sonic-v1:0"),
-        region=region,
-        system_prompt=os.getenv("NOVA_SONIC_SYSTEM_PROMPT", DEFAULT_SYSTEM_PROMPT),
-        on_text=lambda event: send({"type": "assistant_text", **event}),
-        on_audio=lambda event: send({"type": "assistant_audio", **event}),
-        on_error=lambda message: send({"type": "error", "message": message}),
-    )
+        # Same encoding as send_json; the size feeds the session's buffer budget
+        text = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        if activity:
+            activity.pending_sends += 1
+            activity.pending_bytes += len(text)
+        try:
+            async with send_lock:
+                if activity:
+                    activity.sending_since = time.monotonic()
+                await websocket.send_text(text)
+            if activity:
+                activity.messages_out += 1
+                activity.bytes_out += len(text)
+        finally:
+            if activity:
+                activity.sending_since = None
+                activity.pending_sends -= 1
+                activity.pending_bytes -= len(text)
 
-    await bridge.start()
-    await send({"type": "ready", "promptName": bridge.prompt_name})
+    # Clients list the codecs they can speak, e.g. /ws/nova?codecs=opus,pcm
+    requested = websocket.query_params.get("codecs", "")
+    codec = create_codec(negotiate_codec(requested.split(",")))
+    audio_info = codec.describe()
+    # Raw PCM clients may send their native capture format, e.g.
+    # ?sampleRate=48000&sampleFormat=f32&channels=1, and leave the
+    # resampling to the server (Opus already decodes to 16 kHz)
+    normalizer = None
+    if codec.name == CODEC_PCM:
+        try:
+            normalizer = create_input_normalizer(websocket.query_params)
+        except ValueError as e:
+            await send({"type": "error", "message": str(e)})
+            # 1003: unsupported data
+            await websocket.close(code=1003)
+            return
+        if normalizer:
+            audio_info["input"] = normalizer.describe()
 
+    if not degradation.accepting:
+        await send(
+            {"type": "error", "message": "Voice server is overloaded", "retryAfter": 30}
+        )
+        await websocket.close(code=1013)
+        return
+
+    manager = get_session_manager()
+    supervisor = get_supervisor()
     try:
+        quotas.acquire_voice_session(user_id)
+    except QuotaExceeded as e:
+        await send({"type": "error", "message": str(e), "retryAfter": e.retry_after})
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+
+    # From here on everything the session holds is released by cleanup(),
+    # however far the setup below got
+    handle = transcript = recorder = bridge = None
+    cleaned_up = False
+    background: set[asyncio.Task] = set()
+
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        background.add(task)
+        task.add_done_callback(background.discard)
+
+    def on_mode(mode: str, reason: str):
+        spawn(send({"type": "mode", **describe_mode(mode), "reason": reason}))
+
+    async def cleanup():
+        nonlocal cleaned_up
+        if cleaned_up:
+            return
+        cleaned_up = True
+        degradation.unsubscribe(on_mode)
+        for task in list(background):
+            task.cancel()
+        if handle is not None:
+            supervisor.unregister(handle.session_id)
+            introspector.unregister(handle.session_id)
+        if bridge is not None:
+            print("closing bridge")
+            try:
+                await bridge.close()
+            except Exception as e:
+                # The slots below must still be released
+                print(f"bridge close failed: {e}")
+        if recorder:
+            recorder.close()
+        if handle is not None:
+            manager.release(handle)
+        quotas.release_voice_session(user_id)
+        if handle is not None and transcript is not None:
+            text, summary = transcript_case_text(list(transcript.history))
+            if summary:
+                await remember_case(handle.session_id, text, summary, user_id, kind="voice")
+
+    async def reclaim(reason: str, code: int):
+        # Free the Nova stream and the slots first; the client may be gone
+        # and never complete the close handshake
+        try:
+            await asyncio.wait_for(send({"type": "session_closed", "reason": reason}), 1)
+        except Exception:
+            pass
+        await cleanup()
+        try:
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), 1)
+        except Exception:
+            pass
+
+    try:
+        try:
+            handle = manager.acquire(identity.tenant)
+        except SessionLimitExceeded as e:
+            await send({"type": "error", "message": str(e), "retryAfter": e.retry_after})
+            await websocket.close(code=1013)
+            return
+
+        # /ws/nova?recordId=... starts the conversation from a stored image analysis
+        context_text = None
+        record_id = websocket.query_params.get("recordId")
+        if record_id and record_context:
+            try:
+                context_text = await record_context.get(record_id, user_id)
+            except Exception as e:
+                print(f"record context lookup failed for {record_id}: {e}")
+
+        activity = SessionActivity(handle.session_id)
+        # Tasks this handler creates from here on are charged to the session
+        introspector.attach(handle.session_id)
+        transcript = TranscriptWriter(handle.session_id, user_id, transcript_sink)
+
+        # Under load assistant audio goes out in larger frames, or not at all
+        coalescer = AudioCoalescer(OUTPUT_SAMPLE_RATE * 2 * COARSE_OUTPUT_FRAME_MS // 1000)
+        flush_scheduled = False
+
+        async def send_audio(pcm: bytes):
+            content = base64.b64encode(pcm).decode("utf-8")
+            await send({"type": "assistant_audio", **codec.encode_output({"content": content})})
+
+        async def flush_audio():
+            nonlocal flush_scheduled
+            flush_scheduled = False
+            if coalescer.pending:
+                await send_audio(coalescer.take())
+
+        async def on_audio(event: dict):
+            nonlocal flush_scheduled
+            mode = degradation.mode
+            if mode == NORMAL:
+                if coalescer.pending:
+                    await flush_audio()
+                await send({"type": "assistant_audio", **codec.encode_output(event)})
+            elif mode == COARSE_AUDIO:
+                frame = coalescer.add(base64.b64decode(event.get("content", "")))
+                if frame is not None:
+                    await send_audio(frame)
+                elif not flush_scheduled:
+                    # The end of a reply rarely fills a whole frame
+                    flush_scheduled = True
+                    asyncio.get_running_loop().call_later(
+                        COARSE_OUTPUT_FRAME_MS / 1000, lambda: spawn(flush_audio())
+                    )
+            # text_only / shed: drop the audio, the text still goes out
+
+        async def on_audio_end(stop_reason: str):
+            if stop_reason == "INTERRUPTED":
+                # The user barged in; nothing buffered should still play
+                coalescer.take()
+                codec.reset()
+                return
+            if coalescer.pending:
+                await flush_audio()
+            tail = codec.flush()
+            if tail is not None:
+                await send({"type": "assistant_audio", **tail})
+
+        activity.add_probe(lambda: transcript.buffered_bytes)
+        model_id = os.getenv("NOVA_SONIC_MODEL_ID", "amazon.nova-sonic-v1:0")
+        # VOICE_CAPTURE_DIR: record this session for voiceChat/replay.py
+        recorder = create_session_recorder(
+            handle.session_id,
+            {
+                "sessionId": handle.session_id,
+                "modelId": model_id,
+                "codec": codec.name,
+                "audio": audio_info,
+                "recordContext": context_text is not None,
+                "startedAt": time.time(),
+            },
+        )
+        bridge = manager.create_bridge(
+            model_id=model_id,
+            system_prompt=os.getenv("NOVA_SONIC_SYSTEM_PROMPT", DEFAULT_SYSTEM_PROMPT),
+            on_text=lambda event: send({"type": "assistant_text", **event}),
+            on_audio=on_audio,
+            on_audio_end=on_audio_end,
+            on_error=lambda message: send({"type": "error", "message": message}),
+            transcript=transcript,
+            context_text=context_text,
+            case_lookup=lambda text, seen: case_retriever.lookup(text, seen, user_id),
+            on_activity=activity.touch,
+            keepalive_interval=float(os.getenv("NOVA_KEEPALIVE_SECONDS", "25")),
+            on_turn_latency=degradation.record_nova_latency,
+            recorder=recorder,
+        )
+
+        def describe_session() -> dict:
+            return {
+                "userId": user_id,
+                "tenant": handle.tenant_id,
+                "codec": codec.name,
+                "mode": degradation.mode,
+                **activity.debug_state(),
+                "transcriptBufferedBytes": transcript.buffered_bytes,
+                "audioCoalescing": coalescer.pending,
+                "droppedAudioPackets": codec.dropped_packets,
+                "backgroundTasks": len(background),
+                "bridge": bridge.debug_state(),
+            }
+
+        introspector.register(handle.session_id, describe_session)
+
+        supervisor.register(activity, reclaim)
+        await manager.start_bridge(bridge)
+        await send(
+            {
+                "type": "ready",
+                "promptName": bridge.prompt_name,
+                "sessionId": handle.session_id,
+                "recordContext": context_text is not None,
+                "audio": audio_info,
+                "supportedCodecs": available_codecs(),
+                "mode": describe_mode(degradation.mode),
+            }
+        )
+        degradation.subscribe(on_mode)
+
         while True:
-            msg = await websocket.receive_json()
+            raw = await websocket.receive_text()
+            activity.messages_in += 1
+            activity.bytes_in += len(raw)
+            msg = json.loads(raw)
             msg_type = msg.get("type")
 
             if msg_type == "ping":
                 await send({"type": "pong"})
                 continue
 
+            if msg_type in ("start_audio", "end_audio", "text"):
+                activity.touch()
+
             if msg_type == "start_audio":
                 await bridge.start_audio_input()
                 print("start audio")
                 continue
 
             if msg_type == "audio_chunk":
-                content = msg.get("content", "")
-                chunk_len = len(content)
-                # On first real chunk, log first 16 bytes as hex to confirm PCM format
-                if not getattr(bridge, "_first_chunk_logged", False):
-                    import base64 as _b64
-
-                    first_bytes = _b64.b64decode(content[:24] + "==")[:16]
-                    print(f"audio_chunk #1 first bytes (hex): {first_bytes.hex()}")
-                    bridge._first_chunk_logged = True
-                print(f"audio_chunk received, b64 len={chunk_len}")
+                content = codec.decode_input(msg.get("content", ""))
+                if not content:
+                    # Undecodable packet, counted by the codec
+                    continue
+                if normalizer:
+                    content = normalizer.process(content)
+                    if not content:
+                        # Too short to yield an output sample yet
+                        continue
                 await bridge.send_audio_base64_chunk(content)
                 continue
 
@@ -84,11 +464,155 @@ async def ws_nova(websocket: WebSocket):
             )
 
         print("WebSocket connection closed by client")
+    except CircuitOpenError as e:
+        await send(
+            {"type": "error", "message": str(e), "retryAfter": round(e.retry_after)}
+        )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await cleanup()
+
+
+@app.websocket("/ws/analyze")
+async def ws_analyze(websocket: WebSocket):
+    """Streaming twin of POST /items: relays analysis text as it is generated.
+
+    Client sends {"imageBase64", "extension", "token"} (its Cognito ID token,
+    unless sent as a Bearer header); server answers with "delta" messages and
+    a final "done" carrying the stored keys and timings.
+    """
+    await websocket.accept()
+    try:
+        msg = await websocket.receive_json()
+    except WebSocketDisconnect:
+        return
+
+    identity = await authenticate(websocket, bearer_token(websocket) or msg.get("token"))
+    if identity is None:
+        return
+    user_id = identity.user_id
+    image_base64 = msg.get("imageBase64", "")
+    ext = msg.get("extension", "jpg")
+    try:
+        quotas.check_upload(user_id)
+    except QuotaExceeded as e:
+        await websocket.send_json(
+            {"type": "error", "message": str(e), "retryAfter": e.retry_after}
+        )
+        return
+
+    file_id = str(uuid.uuid4())
+    storage = analysis_storage()
+
+    # Upload the image while the model is generating
+    image_task = None
+    if storage:
+        s3, table, bucket, search_index = storage
+        image_task = asyncio.create_task(
+            asyncio.to_thread(
+                put_image, s3, bucket, file_id, ext, base64.b64decode(image_base64)
+            )
+        )
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    stream = None
+
+    def produce():
+        nonlocal stream
+        # boto3's event stream is blocking; iterate it off the event loop
+        try:
+            stream = ai_image_analyze_stream(image_base64)
+            for text in stream:
+                loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    started = time.perf_counter()
+    producer = asyncio.create_task(asyncio.to_thread(produce))
+    first_token_ms = None
+    stored = False
+    try:
+        while (item := await queue.get()) is not None:
+            if isinstance(item, Exception):
+                error = {"type": "error", "message": str(item)}
+                if isinstance(item, CircuitOpenError):
+                    error["retryAfter"] = round(item.retry_after)
+                await websocket.send_json(error)
+                return
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+            await websocket.send_json({"type": "delta", "text": item})
+        total_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"analysis {file_id}: first token {first_token_ms or 0:.0f} ms, "
+            f"total {total_ms:.0f} ms"
+        )
+
+        # The stream held back the <details> block; it is parsed by now
+        await producer
+        analysis = stream.analysis
+        image_key = analysis_key = None
+        if storage:
+            image_key = await image_task
+            analysis_key = await asyncio.to_thread(
+                put_analysis_record,
+                s3,
+                table,
+                bucket,
+                file_id,
+                image_key,
+                analysis.text,
+                user_id,
+                analysis.details(),
+            )
+            stored = True
+            try:
+                await asyncio.to_thread(
+                    search_index.add,
+                    user_id,
+                    [analysis_document(file_id, analysis.text, analysis.details())],
+                )
+            except Exception as e:
+                print(f"search index update failed for {file_id}: {e}")
+        await remember_case(
+            file_id,
+            " ".join([analysis.text, analysis.category, *analysis.symptoms]),
+            analysis.text,
+            user_id,
+            kind="analysis",
+            category=analysis.category,
+        )
+
+        await websocket.send_json(
+            {
+                "type": "done",
+                "id": file_id,
+                "reply": analysis.text,
+                "imageKey": image_key,
+                "analysisKey": analysis_key,
+                **analysis.details(),
+                "timings": {"firstTokenMs": first_token_ms, "totalMs": total_ms},
+            }
+        )
     except WebSocketDisconnect:
         pass
     finally:
-        print("closing bridge")
-        await bridge.close()
+        await asyncio.gather(producer, return_exceptions=True)
+        if image_task and not stored:
+            # No record points at the image; the upload thread cannot be
+            # cancelled, so let it finish and delete what it wrote
+            (image_key,) = await asyncio.gather(image_task, return_exceptions=True)
+            if isinstance(image_key, str):
+                try:
+                    await asyncio.to_thread(s3.delete_object, Bucket=bucket, Key=image_key)
+                    print(f"analysis {file_id} not stored, deleted {image_key}")
+                except Exception as e:
+                    print(f"could not delete orphaned image {image_key}: {e}")
 
 
 if __name__ == "__main__":
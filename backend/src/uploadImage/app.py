@@ -1,20 +1,112 @@
-from datetime import datetime
+# Imported first so STARTUP_PROFILE=1 can time every import below
+import startup
+
 import json
 import base64
+import re
+import threading
+import time
 import uuid
 import os
 import boto3
-from imageAnalyzeBot import ai_image_analyze
-import datetime
-
-s3 = boto3.client("s3", region_name="us-east-1")
-dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-table = dynamodb.Table(os.environ["TABLE_NAME"])
+import export
+import http_cache
+from imageAnalyzeBot import ai_image_analyze_structured, get_bedrock_client
+from records import category_key, put_analysis_record, put_image
+from resilience import CircuitOpenError, is_retryable
+from quotas import QuotaExceeded, create_quota_manager
+from idempotency import IdempotencyConflict, create_idempotency_manager, fingerprint
+from record_cache import create_record_cache
+from search_index import analysis_document, create_search_index
 
 BUCKET = os.environ["S3_BUCKET_NAME"]
 
+RECORD_URL_TTL = 3600
+
+# Record items and presigned URLs reused across invocations of this container
+record_cache = create_record_cache()
+
+# Clients are created on first use so each route only pays for what it
+# touches; warm_clients() builds them all up front when a snapshot or
+# WARM_UP_ON_INIT=1 makes that free for later invocations
+_s3 = None
+_table = None
+_quotas = None
+_idempotency = None
+_search_index = None
+
+
+def get_s3():
+    global _s3
+    if _s3 is None:
+        with startup.timed("init s3"):
+            _s3 = boto3.client("s3", region_name="us-east-1")
+    return _s3
+
+
+def get_table():
+    global _table
+    if _table is None:
+        with startup.timed("init dynamodb"):
+            dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+            _table = dynamodb.Table(os.environ["TABLE_NAME"])
+    return _table
+
+
+def get_quotas():
+    global _quotas
+    if _quotas is None:
+        quota_table_name = os.getenv("QUOTA_TABLE_NAME")
+        quota_table = None
+        if quota_table_name:
+            dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+            quota_table = dynamodb.Table(quota_table_name)
+        _quotas = create_quota_manager(quota_table)
+    return _quotas
+
+
+def get_idempotency():
+    global _idempotency
+    if _idempotency is None:
+        idempotency_table_name = os.getenv("IDEMPOTENCY_TABLE_NAME")
+        idempotency_table = None
+        if idempotency_table_name:
+            dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+            idempotency_table = dynamodb.Table(idempotency_table_name)
+        _idempotency = create_idempotency_manager(idempotency_table)
+    return _idempotency
+
+
+def get_search_index():
+    global _search_index
+    if _search_index is None:
+        _search_index = create_search_index(get_s3(), BUCKET)
+    return _search_index
+
+
+@startup.on_warm_up
+def warm_clients():
+    get_s3()
+    get_table()
+    with startup.timed("init bedrock"):
+        get_bedrock_client()
+
+
+startup.init_done()
+
 
 def lambda_handler(event, context):
+    invoke_started = time.perf_counter()
+    if "exportJob" in event:
+        # Async invocation from start_export_job(), not an API request
+        return run_export_job(event["exportJob"])
+    try:
+        return route(event)
+    finally:
+        startup.report_cold_start(invoke_started)
+
+
+def route(event):
     http_method = event.get("httpMethod", "")
     resource = event.get("resource", "")
     path_parameters = event.get("pathParameters") or {}
@@ -25,6 +117,15 @@ def lambda_handler(event, context):
     if http_method == "GET" and resource == "/records":
         return handle_get_records(event)
 
+    if http_method == "GET" and resource == "/records/search":
+        return handle_search_records(event)
+
+    if http_method == "GET" and resource == "/records/export":
+        return handle_export_records(event)
+
+    if http_method == "GET" and resource == "/records/export/{jobId}":
+        return handle_get_export_job(event, path_parameters.get("jobId") or "")
+
     if http_method == "GET" and resource == "/records/{id}":
         item_id = path_parameters.get("id")
         if not item_id:
@@ -49,41 +150,125 @@ def lambda_handler(event, context):
 
 
 def handle_upload(event):
-    body = json.loads(event["body"])
+    raw_body = event["body"]
+    # API Gateway base64-wraps bodies whose type is in binaryMediaTypes
+    if event.get("isBase64Encoded"):
+        raw_body = base64.b64decode(raw_body)
+    body = json.loads(raw_body)
+    user_id = (
+        event.get("requestContext", {})
+        .get("identity", {})
+        .get("cognitoIdentityId", "anonymous")
+    )
+
+    idempotency_key = http_cache.get_header(event, "Idempotency-Key")
+    if not idempotency_key:
+        return process_upload(body, user_id)
+
+    # Retries of one logical upload share the key: one image write, one
+    # Bedrock call, one record
+    key = f"upload#{user_id}#{idempotency_key}"
+    owner = str(uuid.uuid4())
+    idempotency = get_idempotency()
+    try:
+        stored = idempotency.begin(key, fingerprint(raw_body), owner)
+    except IdempotencyConflict as e:
+        headers = {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        }
+        if e.retry_after:
+            headers["Retry-After"] = str(e.retry_after)
+        return {
+            "statusCode": e.status_code,
+            "headers": headers,
+            "body": json.dumps({"error": str(e)}),
+        }
+    if stored is not None:
+        print(f"upload {idempotency_key}: replayed stored response")
+        return {
+            "statusCode": int(stored["statusCode"]),
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+                "Idempotent-Replayed": "true",
+            },
+            "body": stored["body"],
+        }
+
+    try:
+        response = process_upload(body, user_id)
+    except Exception:
+        idempotency.release(key, owner)
+        raise
+    if response["statusCode"] == 200:
+        idempotency.complete(
+            key, owner, {"statusCode": response["statusCode"], "body": response["body"]}
+        )
+    else:
+        # Rate limited or Bedrock busy: let the client's retry run it again
+        idempotency.release(key, owner)
+    return response
+
+
+def process_upload(body, user_id):
     image_base64 = body["imageBase64"]
     ext = body.get("extension", "jpg")
     image_bytes = base64.b64decode(image_base64)
 
     file_id = str(uuid.uuid4())
-    image_key = f"images/{file_id}.{ext}"
-    analysis_key = f"analysis/{file_id}.txt"
-
-    s3.put_object(
-        Bucket=BUCKET, Key=image_key, Body=image_bytes, ContentType=f"image/{ext}"
-    )
 
-    analysis_result = ai_image_analyze(image_base64)
+    try:
+        get_quotas().check_upload(user_id)
+    except QuotaExceeded as e:
+        return {
+            "statusCode": 429,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+                "Retry-After": str(e.retry_after),
+            },
+            "body": json.dumps({"error": str(e), "retryAfter": e.retry_after}),
+        }
 
-    s3.put_object(
-        Bucket=BUCKET,
-        Key=analysis_key,
-        Body=analysis_result.encode("utf-8"),
-        ContentType="text/plain",
-    )
+    s3 = get_s3()
+    image_key = put_image(s3, BUCKET, file_id, ext, image_bytes)
 
-    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
-
-    table.put_item(
-        Item={
-            "id": file_id,
-            "imageKey": image_key,
-            "analysisKey": analysis_key,
-            "createdAt": created_at,
-            "userId": event.get("requestContext", {})
-            .get("identity", {})
-            .get("cognitoIdentityId", "anonymous"),
+    started = time.perf_counter()
+    try:
+        analysis = ai_image_analyze_structured(
+            image_base64, detailed=bool(body.get("detailed"))
+        )
+    except Exception as e:
+        # Bedrock stayed throttled through every retry, or the breaker is open
+        if not (isinstance(e, CircuitOpenError) or is_retryable(e)):
+            raise
+        retry_after = round(getattr(e, "retry_after", 5))
+        return {
+            "statusCode": 503,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+                "Retry-After": str(retry_after),
+            },
+            "body": json.dumps(
+                {"error": "Image analysis is busy, please retry", "retryAfter": retry_after}
+            ),
         }
+    # Non-streaming: the first token reaches the user together with the last
+    print(f"analysis {file_id}: total {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    analysis_key = put_analysis_record(
+        s3,
+        get_table(),
+        BUCKET,
+        file_id,
+        image_key,
+        analysis.text,
+        user_id,
+        analysis.details(),
     )
+    index_analysis(user_id, file_id, analysis)
 
     return {
         "statusCode": 200,
@@ -93,14 +278,57 @@ def handle_upload(event):
         },
         "body": json.dumps(
             {
-                "reply": analysis_result,
+                "reply": analysis.text,
                 "imageKey": image_key,
                 "analysisKey": analysis_key,
+                **analysis.details(),
             }
         ),
     }
 
 
+def index_analysis(user_id, file_id, analysis):
+    try:
+        get_search_index().add(
+            user_id, [analysis_document(file_id, analysis.text, analysis.details())]
+        )
+    except Exception as e:
+        # The record is stored; a missed index entry must not fail the upload
+        print(f"search index update failed for {file_id}: {e}")
+
+
+def handle_search_records(event):
+    user_id = (
+        event.get("requestContext", {})
+        .get("identity", {})
+        .get("cognitoIdentityId", "anonymous")
+    )
+    query = ((event.get("queryStringParameters") or {}).get("q") or "").strip()
+    if not query:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+            },
+            "body": json.dumps({"error": "Missing search query"}),
+        }
+
+    started = time.perf_counter()
+    results = get_search_index().search(user_id, query)
+    print(
+        f"search: {len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": json.dumps(results),
+    }
+
+
 def handle_get_records(event):
     user_id = (
         event.get("requestContext", {})
@@ -108,29 +336,214 @@ def handle_get_records(event):
         .get("cognitoIdentityId", "anonymous")
     )
 
-    result = table.scan(
-        FilterExpression=boto3.dynamodb.conditions.Attr("userId").eq(user_id)
+    params = event.get("queryStringParameters") or {}
+    category = " ".join((params.get("category") or "").lower().split())
+
+    table = get_table()
+    route = "GET /records"
+    if category:
+        # Served from the per-user category index, never by reading analyses
+        route = "GET /records?category"
+
+        def load(**kwargs):
+            return query_user_category(table, user_id, category, **kwargs)
+
+    else:
+
+        def load(**kwargs):
+            return scan_user_records(table, user_id, **kwargs)
+
+    if http_cache.get_header(event, "If-None-Match"):
+        # Revalidation only needs the attributes the ETag is built from
+        versions = load(
+            ProjectionExpression="#id, createdAt, transcriptSegments",
+            ExpressionAttributeNames={"#id": "id"},
+        )
+        etag = records_etag(versions, category)
+        if http_cache.etag_matches(event, etag):
+            return http_cache.not_modified(route, etag)
+
+    items = load()
+    return http_cache.json_response(
+        route, event, json.dumps(items, default=str), records_etag(items, category)
     )
-    items = result.get("Items", [])
+
+
+def scan_user_records(table, user_id, **scan_kwargs):
+    return list(iter_user_records(table, user_id, **scan_kwargs))
+
+
+def iter_user_records(table, user_id, **scan_kwargs):
+    """The user's items one scan page at a time."""
+    from boto3.dynamodb.conditions import Attr
+
+    result = table.scan(FilterExpression=Attr("userId").eq(user_id), **scan_kwargs)
+    yield from result.get("Items", [])
 
     # handle pagination
     while "LastEvaluatedKey" in result:
         result = table.scan(
             ExclusiveStartKey=result["LastEvaluatedKey"],
-            FilterExpression=boto3.dynamodb.conditions.Attr("userId").eq(user_id),
+            FilterExpression=Attr("userId").eq(user_id),
+            **scan_kwargs,
+        )
+        yield from result.get("Items", [])
+
+
+def query_user_category(table, user_id, category, **query_kwargs):
+    from boto3.dynamodb.conditions import Key
+
+    condition = Key("userCategory").eq(category_key(user_id, category))
+    result = table.query(
+        IndexName="UserCategoryIndex",
+        KeyConditionExpression=condition,
+        ScanIndexForward=False,
+        **query_kwargs,
+    )
+    items = result.get("Items", [])
+    while "LastEvaluatedKey" in result:
+        result = table.query(
+            IndexName="UserCategoryIndex",
+            KeyConditionExpression=condition,
+            ScanIndexForward=False,
+            ExclusiveStartKey=result["LastEvaluatedKey"],
+            **query_kwargs,
         )
         items.extend(result.get("Items", []))
+    return items
+
+
+def handle_export_records(event):
+    user_id = (
+        event.get("requestContext", {})
+        .get("identity", {})
+        .get("cognitoIdentityId", "anonymous")
+    )
+    params = event.get("queryStringParameters") or {}
+    fmt = (params.get("format") or "zip").lower()
+    if fmt not in export.FORMATS:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+            },
+            "body": json.dumps({"error": "format must be zip or ndjson"}),
+        }
+
+    # The archive is binary: without an Accept API Gateway decodes, the
+    # client gets a link to it from the job instead
+    if params.get("async") != "1" and http_cache.accepts_binary(event):
+        started = time.perf_counter()
+        chunks = export.archive_chunks(
+            get_s3(), BUCKET, iter_user_records(get_table(), user_id), fmt
+        )
+        try:
+            body = export.build_inline(chunks)
+        except export.ExportTooLarge:
+            # Too big for one API Gateway response; hand it to a job
+            print("export: over the inline limit, starting a job")
+        else:
+            content_type, ext = export.FORMATS[fmt]
+            print(
+                f"export: {len(body)} bytes {fmt} in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Content-Type": content_type,
+                    "Content-Disposition": f'attachment; filename="homefix-export.{ext}"',
+                    "Access-Control-Allow-Origin": "*",
+                },
+                "body": base64.b64encode(body).decode("ascii"),
+                "isBase64Encoded": True,
+            }
 
+    job_id = start_export_job(user_id, fmt)
+    return {
+        "statusCode": 202,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": json.dumps(
+            {
+                "jobId": job_id,
+                "status": "running",
+                "statusUrl": f"/records/export/{job_id}",
+            }
+        ),
+    }
+
+
+def start_export_job(user_id, fmt):
+    """Run the export in the background: the EXPORT_JOB_FUNCTION Lambda when
+    deployed, a thread when running locally."""
+    job_id = export.new_job_id()
+    export.start_job_status(get_s3(), BUCKET, user_id, job_id, fmt)
+    job = {"userId": user_id, "jobId": job_id, "format": fmt}
+    function_name = os.getenv("EXPORT_JOB_FUNCTION")
+    if function_name:
+        boto3.client("lambda", region_name="us-east-1").invoke(
+            FunctionName=function_name,
+            InvocationType="Event",
+            Payload=json.dumps({"exportJob": job}).encode("utf-8"),
+        )
+    else:
+        threading.Thread(target=run_export_job, args=(job,), daemon=True).start()
+    return job_id
+
+
+def run_export_job(job):
+    export.run_export_job(
+        get_s3(),
+        BUCKET,
+        job["userId"],
+        job["jobId"],
+        job["format"],
+        iter_user_records(get_table(), job["userId"]),
+    )
+    return {"jobId": job["jobId"]}
+
+
+def handle_get_export_job(event, job_id):
+    user_id = (
+        event.get("requestContext", {})
+        .get("identity", {})
+        .get("cognitoIdentityId", "anonymous")
+    )
+    status = None
+    if re.fullmatch(r"[0-9a-f]{32}", job_id):
+        status = export.job_status(get_s3(), BUCKET, user_id, job_id)
+    if status is None:
+        return {
+            "statusCode": 404,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+            },
+            "body": json.dumps({"error": "Export not found"}),
+        }
     return {
         "statusCode": 200,
         "headers": {
             "Content-Type": "application/json",
+            "Cache-Control": "no-store",
             "Access-Control-Allow-Origin": "*",
         },
-        "body": json.dumps(items, default=str),
+        "body": json.dumps(status),
     }
 
 
+def records_etag(items, category: str = "") -> str:
+    """Records are only ever added, and voice transcripts only grow, so the
+    count, newest createdAt and total segment count identify the list."""
+    latest = max((item.get("createdAt", "") for item in items), default="")
+    segments = sum(int(item.get("transcriptSegments", 0)) for item in items)
+    return http_cache.make_etag("records", category, len(items), latest, segments)
+
+
 def handle_get_single_record(event, item_id):
     user_id = (
         event.get("requestContext", {})
@@ -139,8 +552,8 @@ def handle_get_single_record(event, item_id):
     )
 
     try:
-        response = table.get_item(Key={"id": item_id})
-        item = response.get("Item")
+        s3 = get_s3()
+        item = record_cache.get_item(get_table(), item_id)
 
         if not item:
             return {
@@ -163,28 +576,40 @@ def handle_get_single_record(event, item_id):
                 "body": json.dumps({"error": "Access denied"}),
             }
 
-        # Generate signed URLs for this specific item
+        def signed_url(key):
+            return record_cache.presigned_url(s3, BUCKET, key, RECORD_URL_TTL)[0]
+
+        # Signed URLs come from the cache until they are close to expiring
         if "imageKey" in item and item["imageKey"]:
-            item["imageUrl"] = s3.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": BUCKET, "Key": item["imageKey"]},
-                ExpiresIn=3600,
-            )
+            item["imageUrl"] = signed_url(item["imageKey"])
         if "analysisKey" in item and item["analysisKey"]:
-            item["analysisUrl"] = s3.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": BUCKET, "Key": item["analysisKey"]},
-                ExpiresIn=3600,
-            )
+            item["analysisUrl"] = signed_url(item["analysisKey"])
+        # Voice sessions store their transcript as numbered S3 segments. The
+        # cached item may be up to RECORD_CACHE_TTL (30 s) old, so during a
+        # live session the newest segments can be missing from transcriptUrls
+        # (and the ETag) for that long; the record is never cached when absent
+        if item.get("transcriptPrefix"):
+            item["transcriptUrls"] = [
+                signed_url(f"{item['transcriptPrefix']}{seq:05d}.jsonl")
+                for seq in range(int(item.get("transcriptSegments", 0)))
+            ]
 
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-            },
-            "body": json.dumps(item, default=str),
-        }
+        # The URLs are part of the ETag: a 304 is only sent while the URLs
+        # the client already holds are the ones we would hand out now
+        etag = http_cache.make_etag(
+            item_id,
+            item.get("createdAt"),
+            item.get("transcriptSegments", 0),
+            item.get("imageUrl"),
+            item.get("analysisUrl"),
+            *item.get("transcriptUrls", []),
+        )
+        if http_cache.etag_matches(event, etag):
+            return http_cache.not_modified("GET /records/{id}", etag)
+
+        return http_cache.json_response(
+            "GET /records/{id}", event, json.dumps(item, default=str), etag
+        )
 
     except Exception as e:
         return {
@@ -0,0 +1,307 @@
+"""
+Offline benchmark for the upload/records Lambda.
+
+Runs ``lambda_handler`` in-process against the LocalS3/LocalTable stand-ins
+and a FakeBedrock with configurable latency, then reports throughput and
+p50/p95/p99 for each route, GET /records at several table sizes and peak
+Python heap per uploaded image size. Results go to JSON; pass an earlier run
+as --baseline to fail (exit 1) when a scenario got slower than --tolerance.
+
+Run from src/uploadImage:
+    python bench_lambda.py --out bench.json
+    python bench_lambda.py --quick --baseline bench.json
+"""
+
+import argparse
+import base64
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+os.environ.setdefault("S3_BUCKET_NAME", "bench-bucket")
+os.environ.setdefault("TABLE_NAME", "bench-records")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "fake")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "fake")
+# Measure the handler, not the client-side limiters
+os.environ.setdefault("BEDROCK_RATE_PER_SEC", "100000")
+os.environ.setdefault("BEDROCK_BURST", "100000")
+os.environ.setdefault("UPLOADS_PER_MINUTE", "100000000")
+os.environ.setdefault("UPLOAD_BURST", "100000000")
+
+from fake_bedrock import FakeBedrock
+from local_aws import LocalS3, LocalTable
+from records import category_key
+
+USER_ID = "us-east-1:bench-user"
+ROW_COUNTS = (10, 1_000, 100_000)
+IMAGE_SIZES_KB = (64, 512, 2048, 4096)
+CATEGORIES = ("router", "kettle", "washing machine", "microwave", "smart tv")
+
+
+def event(
+    method: str, resource: str, *, body=None, path_parameters=None, headers=None, query=None
+) -> dict:
+    return {
+        "httpMethod": method,
+        "resource": resource,
+        "pathParameters": path_parameters,
+        "queryStringParameters": query,
+        # What the frontend sends through API Gateway
+        "headers": {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate, br",
+            **(headers or {}),
+        },
+        "requestContext": {"identity": {"cognitoIdentityId": USER_ID}},
+        "body": json.dumps(body) if body is not None else None,
+    }
+
+
+def upload_event(size_kb: int, rng: random.Random) -> dict:
+    image = rng.randbytes(size_kb * 1024)
+    return event(
+        "POST",
+        "/items",
+        body={"imageBase64": base64.b64encode(image).decode(), "extension": "jpg"},
+    )
+
+
+def seed_records(table: LocalTable, rows: int):
+    created = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    for i in range(rows):
+        file_id = str(uuid.UUID(int=i))
+        category = CATEGORIES[i % len(CATEGORIES)]
+        table.put_item(
+            Item={
+                "id": file_id,
+                "imageKey": f"images/{file_id}.jpg",
+                "analysisKey": f"analysis/{file_id}.txt",
+                "createdAt": (created + datetime.timedelta(minutes=i)).isoformat(),
+                "userId": USER_ID,
+                "category": category,
+                "userCategory": category_key(USER_ID, category),
+                "symptoms": ["no power"],
+            }
+        )
+
+
+def percentile(sorted_ms: list[float], p: float) -> float:
+    index = min(len(sorted_ms) - 1, max(0, round(p / 100 * len(sorted_ms)) - 1))
+    return sorted_ms[index]
+
+
+def measure(name: str, handler, make_event, iterations: int) -> dict:
+    # One unmeasured call so lazy clients and caches are warm
+    handler(make_event(), None)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        e = make_event()
+        t = time.perf_counter()
+        response = handler(e, None)
+        latencies.append((time.perf_counter() - t) * 1000)
+        if response["statusCode"] >= 400:
+            raise RuntimeError(f"{name}: HTTP {response['statusCode']} {response['body']}")
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "throughputPerSec": iterations / elapsed,
+        "meanMs": sum(latencies) / iterations,
+        "p50Ms": percentile(latencies, 50),
+        "p95Ms": percentile(latencies, 95),
+        "p99Ms": percentile(latencies, 99),
+        "status": response["statusCode"],
+        "responseBytes": len(response["body"] or ""),
+    }
+
+
+def peak_memory(handler, size_kb: int, rng: random.Random) -> dict:
+    e = upload_event(size_kb, rng)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        handler(e, None)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "imageKB": size_kb,
+        "eventKB": round(len(e["body"]) / 1024),
+        "peakMB": round((peak - baseline) / 2**20, 2),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    previous = {r["scenario"]: r for r in baseline.get("scenarios", [])}
+    regressions = []
+    for r in results["scenarios"]:
+        old = previous.get(r["scenario"])
+        if not old:
+            continue
+        if r["p95Ms"] > old["p95Ms"] * (1 + tolerance):
+            regressions.append(
+                f"{r['scenario']}: p95 {old['p95Ms']:.1f} -> {r['p95Ms']:.1f} ms"
+            )
+    old_memory = {m["imageKB"]: m for m in baseline.get("memory", [])}
+    for m in results["memory"]:
+        old = old_memory.get(m["imageKB"])
+        if old and m["peakMB"] > old["peakMB"] * (1 + tolerance):
+            regressions.append(
+                f"upload {m['imageKB']} KB: peak {old['peakMB']} -> {m['peakMB']} MB"
+            )
+    return regressions
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    with FakeBedrock(latency=args.bedrock_latency) as fake:
+        os.environ["BEDROCK_ENDPOINT_URL"] = fake.url
+        # The handler logs a line per upload; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app
+
+        s3 = LocalS3()
+        table = LocalTable(indexes={"UserCategoryIndex": ("userCategory", "createdAt")})
+        app._s3, app._table = s3, table
+
+        def handler(e, context):
+            with contextlib.redirect_stdout(io.StringIO()):
+                return app.lambda_handler(e, context)
+
+        scenarios = [
+            measure(
+                "POST /items",
+                handler,
+                lambda: upload_event(args.image_kb, rng),
+                args.iterations,
+            )
+        ]
+        # Every upload above was indexed
+        scenarios.append(
+            measure(
+                "GET /records/search",
+                handler,
+                lambda: event("GET", "/records/search", query={"q": "kettle not heating"}),
+                args.iterations,
+            )
+        )
+
+        for rows in args.rows:
+            table.items.clear()
+            table._sizes.clear()
+            seed_records(table, rows)
+            # Whole-table scans get slow; scale the sample down with the row count
+            iterations = max(3, args.iterations // max(1, rows // 1000))
+            scenarios.append(
+                measure(
+                    f"GET /records ({rows} rows)",
+                    handler,
+                    lambda: event("GET", "/records"),
+                    iterations,
+                )
+            )
+            scenarios.append(
+                measure(
+                    f"GET /records?category ({rows} rows)",
+                    handler,
+                    lambda: event("GET", "/records", query={"category": "router"}),
+                    iterations,
+                )
+            )
+            # Sidebar refresh with nothing new: answered with a 304
+            etag = handler(event("GET", "/records"), None)["headers"]["ETag"]
+            scenarios.append(
+                measure(
+                    f"GET /records ({rows} rows, 304)",
+                    handler,
+                    lambda: event("GET", "/records", headers={"If-None-Match": etag}),
+                    iterations,
+                )
+            )
+
+        record_id = next(iter(table.items))
+        scenarios.append(
+            measure(
+                "GET /records/{id}",
+                handler,
+                lambda: event("GET", "/records/{id}", path_parameters={"id": record_id}),
+                args.iterations,
+            )
+        )
+        # Every call a different record: item and URL cache misses
+        ids = iter(list(table.items)[1:] * 2)
+        scenarios.append(
+            measure(
+                "GET /records/{id} (unique)",
+                handler,
+                lambda: event("GET", "/records/{id}", path_parameters={"id": next(ids)}),
+                min(args.iterations, len(table.items) - 2),
+            )
+        )
+
+        memory = [peak_memory(handler, size, rng) for size in args.image_sizes]
+
+    return {
+        "startedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "bedrockLatencyMs": args.bedrock_latency * 1000,
+        "scenarios": scenarios,
+        "memory": memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lambda_handler offline")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rows", type=int, nargs="+", default=list(ROW_COUNTS))
+    parser.add_argument("--image-kb", type=int, default=256, help="upload size for POST /items")
+    parser.add_argument("--image-sizes", type=int, nargs="+", default=list(IMAGE_SIZES_KB))
+    parser.add_argument("--bedrock-latency", type=float, default=0.0, help="seconds per call")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--quick", action="store_true", help="small run for pre-deploy checks")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+    if args.quick:
+        args.iterations = min(args.iterations, 30)
+        args.rows = [r for r in args.rows if r <= 1_000]
+        args.image_sizes = args.image_sizes[:2]
+
+    results = run(args)
+
+    print(f"{'scenario':<36} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results["scenarios"]:
+        print(
+            f"{r['scenario']:<36} {r['throughputPerSec']:>8.1f} {r['p50Ms']:>8.2f} "
+            f"{r['p95Ms']:>8.2f} {r['p99Ms']:>8.2f}"
+        )
+    print(f"\n{'image KB':>9} {'event KB':>9} {'peak MB':>8}")
+    for m in results["memory"]:
+        print(f"{m['imageKB']:>9} {m['eventKB']:>9} {m['peakMB']:>8.2f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
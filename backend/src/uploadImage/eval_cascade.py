@@ -0,0 +1,142 @@
+"""
+Offline evaluation of the image-analysis cascade against a fake model.
+
+Each synthetic "image" carries its true category and a difficulty. The fake
+first-tier model is fast and cheap but less sure (and sometimes wrong) on
+hard images; the fake escalation model is slower, pricier and treated as the
+reference. For each setting we report mean/p95 latency, cost per 1k images,
+escalation rate and agreement with the reference category.
+
+Run from src/uploadImage:
+    python eval_cascade.py --images 100
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import time
+
+# The harness hammers the fake endpoint; don't let the client-side limiter skew latency
+os.environ.setdefault("BEDROCK_RATE_PER_SEC", "10000")
+os.environ.setdefault("BEDROCK_BURST", "10000")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "fake")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "fake")
+
+from fake_bedrock import FakeBedrock
+
+CATEGORIES = ["router", "kettle", "washing machine", "microwave", "smart tv", "kindle"]
+
+# USD per 1k tokens (input, output)
+PRICES = {
+    "us.amazon.nova-lite-v1:0": (0.00006, 0.00024),
+    "us.amazon.nova-pro-v1:0": (0.0008, 0.0032),
+}
+LATENCY = {"us.amazon.nova-lite-v1:0": 0.04, "us.amazon.nova-pro-v1:0": 0.15}
+
+
+def make_dataset(n: int, seed: int) -> list[tuple[str, dict]]:
+    rng = random.Random(seed)
+    images = []
+    for i in range(n):
+        label = {"id": i, "category": rng.choice(CATEGORIES), "difficulty": rng.random()}
+        images.append((base64.b64encode(json.dumps(label).encode()).decode(), label))
+    return images
+
+
+def fake_reply(model_id: str, request: dict) -> str:
+    time.sleep(LATENCY.get(model_id, 0.05))
+    image = request["messages"][0]["content"][0]["image"]["source"]["bytes"]
+    label = json.loads(base64.b64decode(image))
+    # Deterministic per (image, model) so every setting sees the same answers
+    rng = random.Random(f"{label['id']}:{model_id}")
+
+    if "nova-pro" in model_id:
+        category, confidence = label["category"], 0.9
+    else:
+        confidence = max(0.0, min(1.0, 1 - label["difficulty"] + rng.uniform(-0.15, 0.15)))
+        wrong = rng.random() < label["difficulty"] * 0.6
+        category = rng.choice(CATEGORIES) if wrong else label["category"]
+
+    return json.dumps(
+        {
+            "category": category,
+            "confidence": round(confidence, 2),
+            "answer": f"This looks like a {category}. Unplug it before inspecting.",
+        }
+    )
+
+
+def cost(calls: list[tuple[str, dict]]) -> float:
+    total = 0.0
+    for model_id, usage in calls:
+        price_in, price_out = PRICES.get(model_id, (0.0, 0.0))
+        total += usage.get("inputTokens", 0) / 1000 * price_in
+        total += usage.get("outputTokens", 0) / 1000 * price_out
+    return total
+
+
+def evaluate(name: str, images, run) -> dict:
+    latencies, costs, agree, escalated = [], [], 0, 0
+    for image_b64, label in images:
+        result = run(image_b64)
+        latencies.append(result.latency_ms)
+        costs.append(cost(result.calls))
+        agree += result.category == label["category"]
+        escalated += result.escalated
+    latencies.sort()
+    n = len(images)
+    return {
+        "setting": name,
+        "meanMs": sum(latencies) / n,
+        "p95Ms": latencies[min(n - 1, int(n * 0.95))],
+        "costPer1k": sum(costs) / n * 1000,
+        "escalated": escalated / n,
+        "agreement": agree / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate cascade settings offline")
+    parser.add_argument("--images", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    with FakeBedrock(reply=fake_reply) as fake:
+        os.environ["BEDROCK_ENDPOINT_URL"] = fake.url
+        from imageAnalyzeBot import CascadeConfig, analyze_with_cascade
+
+        images = make_dataset(args.images, args.seed)
+        settings = [
+            ("lite only", CascadeConfig(threshold=0.0), False),
+            ("pro only", CascadeConfig(), True),
+        ] + [
+            (f"cascade @{t}", CascadeConfig(threshold=t), False)
+            for t in (0.5, 0.7, 0.9)
+        ]
+
+        rows = [
+            evaluate(
+                name,
+                images,
+                lambda img, c=config, d=detailed: analyze_with_cascade(img, c, d),
+            )
+            for name, config, detailed in settings
+        ]
+
+    print(f"\n{args.images} images, reference = escalation model\n")
+    print(f"{'setting':<14} {'mean ms':>8} {'p95 ms':>7} {'$ / 1k':>8} {'escalated':>10} {'agreement':>10}")
+    for r in rows:
+        print(
+            f"{r['setting']:<14} {r['meanMs']:>8.0f} {r['p95Ms']:>7.0f} {r['costPer1k']:>8.3f} "
+            f"{r['escalated']:>10.0%} {r['agreement']:>10.0%}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Bulk export of a user's history (GET /records/export).
+
+A user's records are read page by page, every object a record points to
+(image, analysis, transcript segments) is fetched from S3 by a small thread
+pool that keeps at most ``prefetch`` objects in flight or waiting, and the
+archive is produced as a stream of byte chunks:
+
+    zip     records/<id>/record.json, image.<ext>, analysis.txt,
+            transcript/00000.jsonl ...
+    ndjson  one line per record: the item, analysis text, transcript events
+            and the image as base64
+
+Memory is bounded by the prefetch window (times the largest object), not by
+the size of the history: nothing is sorted or collected up front, and the
+ZIP is written with data descriptors so it never seeks back. Only the ZIP
+central directory (about 100 bytes per file) grows with the export.
+
+API Gateway buffers Lambda responses, so GET /records/export answers inline
+only while the archive fits in EXPORT_INLINE_MAX_BYTES; larger exports run
+as a background job that streams the same chunks into an S3 multipart
+upload and leaves a status object that GET /records/export/{jobId} turns
+into a presigned link.
+"""
+
+import base64
+import datetime
+import json
+import os
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+FORMATS = {
+    "zip": ("application/zip", "zip"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+PREFETCH = int(os.getenv("EXPORT_PREFETCH", "8"))
+# Lambda responses are capped at 6 MB and the body is base64 wrapped
+INLINE_MAX_BYTES = int(os.getenv("EXPORT_INLINE_MAX_BYTES", str(4 * 1024 * 1024)))
+# S3 multipart parts must be at least 5 MB (except the last)
+PART_SIZE = int(os.getenv("EXPORT_PART_BYTES", str(8 * 1024 * 1024)))
+EXPORT_URL_TTL = int(os.getenv("EXPORT_URL_TTL", "3600"))
+
+
+class ExportTooLarge(Exception):
+    """The archive outgrew the inline limit; run it as a job instead."""
+
+
+def record_objects(item: dict) -> list[tuple[str, str]]:
+    """(archive name, S3 key) for every object a record points to."""
+    objects = []
+    if item.get("imageKey"):
+        ext = item["imageKey"].rsplit(".", 1)[-1]
+        objects.append((f"image.{ext}", item["imageKey"]))
+    if item.get("analysisKey"):
+        objects.append(("analysis.txt", item["analysisKey"]))
+    if item.get("transcriptPrefix"):
+        for seq in range(int(item.get("transcriptSegments", 0))):
+            objects.append(
+                (f"transcript/{seq:05d}.jsonl", f"{item['transcriptPrefix']}{seq:05d}.jsonl")
+            )
+    return objects
+
+
+def _read_object(s3, bucket: str, key: str) -> bytes | None:
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except Exception as e:
+        # A record whose object is gone is still exported, without that file
+        print(f"export: skipping {key}: {e}")
+        return None
+
+
+def fetch_records(s3, bucket: str, items, prefetch: int = PREFETCH):
+    """Yield (item, {name: bytes}) in ``items`` order.
+
+    Object reads run ``prefetch`` ahead of the consumer and no further, so
+    the archive writer sets the pace and memory stays flat.
+    """
+    prefetch = max(1, prefetch)
+    with ThreadPoolExecutor(max_workers=prefetch) as pool:
+        window: deque = deque()
+        in_flight = 0
+
+        def ready():
+            item, futures = window.popleft()
+            files = {}
+            for name, future in futures:
+                body = future.result()
+                if body is not None:
+                    files[name] = body
+            return item, files, len(futures)
+
+        for item in items:
+            futures = [
+                (name, pool.submit(_read_object, s3, bucket, key))
+                for name, key in record_objects(item)
+            ]
+            window.append((item, futures))
+            in_flight += len(futures)
+            while window and in_flight >= prefetch:
+                item_done, files, count = ready()
+                in_flight -= count
+                yield item_done, files
+        while window:
+            item_done, files, _ = ready()
+            yield item_done, files
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object that hands its bytes back out."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_time(item: dict) -> tuple:
+    try:
+        created = datetime.datetime.fromisoformat(str(item.get("createdAt")))
+    except ValueError:
+        return (1980, 1, 1, 0, 0, 0)
+    return created.timetuple()[:6]
+
+
+def zip_chunks(records):
+    """Stream a ZIP of (item, files) pairs, one chunk per record."""
+    sink = _ChunkSink()
+    # An unseekable target makes zipfile write data descriptors instead of
+    # patching local headers, so entries are final once written
+    with zipfile.ZipFile(sink, "w") as archive:
+        for item, files in records:
+            folder = f"records/{item['id']}"
+            date_time = _zip_time(item)
+            entries = [("record.json", json.dumps(item, default=str, indent=2).encode("utf-8"))]
+            entries += files.items()
+            for name, data in entries:
+                info = zipfile.ZipInfo(f"{folder}/{name}", date_time=date_time)
+                # Images are already compressed; text shrinks well
+                info.compress_type = (
+                    zipfile.ZIP_STORED if name.startswith("image.") else zipfile.ZIP_DEFLATED
+                )
+                with archive.open(info, "w", force_zip64=len(data) > 2**31) as entry:
+                    entry.write(data)
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
+
+
+def ndjson_chunks(records):
+    """Stream one JSON line per record."""
+    for item, files in records:
+        line = {"record": item, "analysis": None, "image": None, "transcript": []}
+        for name, data in files.items():
+            if name == "analysis.txt":
+                line["analysis"] = data.decode("utf-8", errors="replace")
+            elif name.startswith("image."):
+                line["image"] = {
+                    "extension": name.split(".", 1)[1],
+                    "base64": base64.b64encode(data).decode("ascii"),
+                }
+            else:
+                line["transcript"].extend(
+                    json.loads(event) for event in data.decode("utf-8").splitlines() if event
+                )
+        yield (json.dumps(line, default=str) + "\n").encode("utf-8")
+
+
+def archive_chunks(s3, bucket: str, items, fmt: str, prefetch: int = PREFETCH):
+    records = fetch_records(s3, bucket, items, prefetch)
+    return zip_chunks(records) if fmt == "zip" else ndjson_chunks(records)
+
+
+def build_inline(chunks, limit: int = INLINE_MAX_BYTES) -> bytes:
+    """Collect an archive for a single response, or raise ExportTooLarge."""
+    parts, size = [], 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            chunks.close()
+            raise ExportTooLarge(f"export exceeds {limit} bytes")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+class S3MultipartWriter:
+    """Upload a stream of chunks to one S3 object, ``part_size`` at a time.
+
+    Small archives become a single put_object; nothing larger than one part
+    is ever held in memory.
+    """
+
+    def __init__(self, s3, bucket: str, key: str, content_type: str, part_size: int = PART_SIZE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id: str | None = None
+        self._parts: list[dict] = []
+
+    def write(self, data: bytes):
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+
+    def _upload_part(self, body: bytes):
+        if self._upload_id is None:
+            self._upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )["UploadId"]
+        number = len(self._parts) + 1
+        result = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=number,
+            Body=body,
+        )
+        self._parts.append({"PartNumber": number, "ETag": result["ETag"]})
+
+    def close(self):
+        if self._upload_id is None:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                ContentType=self.content_type,
+            )
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buffer = bytearray()
+
+    def abort(self):
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+            self._upload_id = None
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _job_prefix(user_id: str, job_id: str) -> str:
+    return f"exports/{user_id}/{job_id}"
+
+
+def _put_status(s3, bucket: str, user_id: str, job_id: str, status: dict):
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{_job_prefix(user_id, job_id)}.json",
+        Body=json.dumps(status).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def start_job_status(s3, bucket: str, user_id: str, job_id: str, fmt: str):
+    _put_status(s3, bucket, user_id, job_id, {"jobId": job_id, "format": fmt, "status": "running"})
+
+
+def run_export_job(s3, bucket: str, user_id: str, job_id: str, fmt: str, items):
+    """Stream the archive into S3 and record the outcome in the status object."""
+    content_type, ext = FORMATS[fmt]
+    key = f"{_job_prefix(user_id, job_id)}.{ext}"
+    writer = S3MultipartWriter(s3, bucket, key, content_type)
+    status = {"jobId": job_id, "format": fmt}
+    started = time.perf_counter()
+    try:
+        for chunk in archive_chunks(s3, bucket, items, fmt):
+            writer.write(chunk)
+        writer.close()
+    except Exception as e:
+        writer.abort()
+        print(f"export job {job_id} failed: {e}")
+        _put_status(s3, bucket, user_id, job_id, {**status, "status": "failed", "error": str(e)})
+        raise
+    elapsed = time.perf_counter() - started
+    print(
+        json.dumps(
+            {
+                "metric": "export_job",
+                "format": fmt,
+                "bytes": writer.size,
+                "seconds": round(elapsed, 2),
+            }
+        )
+    )
+    _put_status(
+        s3, bucket, user_id, job_id, {**status, "status": "done", "key": key, "bytes": writer.size}
+    )
+
+
+def job_status(s3, bucket: str, user_id: str, job_id: str) -> dict | None:
+    """The job's status, with a download link once it is done.
+
+    Status objects live under the user's own prefix, so another user's job
+    id simply is not found.
+    """
+    try:
+        body = s3.get_object(Bucket=bucket, Key=f"{_job_prefix(user_id, job_id)}.json")["Body"]
+    except Exception:
+        return None
+    status = json.loads(body.read())
+    if status.get("status") == "done":
+        filename = f"homefix-export.{FORMATS[status['format']][1]}"
+        status["url"] = s3.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": bucket,
+                "Key": status["key"],
+                "ResponseContentDisposition": f'attachment; filename="{filename}"',
+            },
+            ExpiresIn=EXPORT_URL_TTL,
+        )
+    return status
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the Bedrock InvokeModel endpoint.
+
+Point the image path at it with BEDROCK_ENDPOINT_URL. It answers in Nova's
+messages-v1 shape after a configurable latency and can inject throttling
+errors, which makes the retry / circuit-breaker behaviour reproducible.
+
+Try it from src/uploadImage:
+    python fake_bedrock.py --requests 30 --throttle 0.4
+
+With --regions it starts one fake per region (see regions.py) and shows the
+traffic moving when the preferred region slows down or starts throttling:
+    python fake_bedrock.py --regions us-east-1:0.05,us-west-2:0.12 --requests 60 --shift-after 20
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+def default_reply(model_id: str, request: dict) -> str:
+    return (
+        "This looks like an electric kettle (kitchen appliance).\n"
+        '<details>{"category": "kettle", "brand": null, "symptoms": ["not heating"]}</details>'
+    )
+
+
+class FakeBedrock:
+    def __init__(
+        self,
+        *,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        reply=default_reply,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.reply = reply
+        self.requests = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                # /model/<model id>/invoke
+                parts = self.path.split("/")
+                model_id = unquote(parts[2]) if len(parts) > 3 else ""
+                status, headers, payload = fake.handle(model_id, json.loads(body or b"{}"))
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for key, value in {**headers, "Content-Length": str(len(data))}.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, model_id: str, request: dict) -> tuple[int, dict, dict]:
+        with self._lock:
+            self.requests += 1
+            throttle = self._random.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if throttle:
+            return (
+                429,
+                {"x-amzn-ErrorType": "ThrottlingException"},
+                {"message": "Too many requests, please wait before trying again."},
+            )
+
+        time.sleep(self.latency)
+        text = self.reply(model_id, request)
+        return (
+            200,
+            {"Content-Type": "application/json"},
+            {
+                "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+                "stopReason": "end_turn",
+                "usage": {"inputTokens": 1200, "outputTokens": len(text.split())},
+            },
+        )
+
+    def start(self) -> "FakeBedrock":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def run_regions(args):
+    """One fake per region; after --shift-after requests the first region
+    becomes 10x slower and throttles half its calls."""
+    fakes = {}
+    for entry in args.regions.split(","):
+        region, _, rest = entry.partition(":")
+        latency, _, throttle = rest.partition(":")
+        fakes[region] = FakeBedrock(
+            latency=float(latency or args.latency), throttle_rate=float(throttle or 0), seed=1
+        ).start()
+    os.environ["BEDROCK_REGIONS"] = ",".join(fakes)
+    os.environ["BEDROCK_ENDPOINT_URLS"] = ",".join(f"{r}={f.url}" for r, f in fakes.items())
+
+    from imageAnalyzeBot import ai_image_analyze, get_region_selection
+
+    first = next(iter(fakes.values()))
+    served = []
+    try:
+        for i in range(args.requests):
+            if i == args.shift_after and args.shift_after:
+                first.latency *= 10
+                first.throttle_rate = 0.5
+                print(f"-- request {i}: {next(iter(fakes))} is now slow and throttling")
+            before = {r: f.requests for r, f in fakes.items()}
+            try:
+                ai_image_analyze("aGVsbG8=")
+            except Exception as e:
+                print(f"failed: {type(e).__name__}: {e}")
+            served.append(next(r for r, f in fakes.items() if f.requests > before[r]))
+        print("served by:", " ".join(r.split("-")[1][0] + r[-1] for r in served))
+        for region, stats in get_region_selection().stats().items():
+            print(f"{region}: {fakes[region].requests} requests, {stats}")
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--throttle", type=float, default=0.3, help="0..1 throttle rate")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per call")
+    parser.add_argument("--regions", help="region:latency[:throttle],... one fake per region")
+    parser.add_argument("--shift-after", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "fake")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "fake")
+    if args.regions:
+        run_regions(args)
+        return
+
+    with FakeBedrock(latency=args.latency, throttle_rate=args.throttle, seed=1) as fake:
+        os.environ["BEDROCK_ENDPOINT_URL"] = fake.url
+        from imageAnalyzeBot import ai_image_analyze
+        from resilience import get_guard
+
+        ok = failed = 0
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            try:
+                ai_image_analyze("aGVsbG8=")
+                ok += 1
+            except Exception as e:
+                failed += 1
+                print(f"failed: {type(e).__name__}: {e}")
+        elapsed = time.perf_counter() - started
+
+        print(f"{ok} ok, {failed} failed in {elapsed:.1f} s")
+        print(f"endpoint: {fake.requests} requests, {fake.throttled} throttled")
+        print(f"guard: {get_guard().stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Conditional GET and response compression for the record endpoints.
+
+The sidebar refreshes GET /records often and the list rarely changes, so
+responses carry a weak ETag and ``Cache-Control: no-cache``: the browser
+revalidates with If-None-Match and we answer 304 without rebuilding the body.
+Bodies over COMPRESS_MIN_BYTES are sent br (when the optional ``brotli``
+package is installed) or gzip encoded, base64 wrapped for API Gateway. The
+gateway only decodes that when the request's first Accept type is one of the
+API's binary media types, so other clients get the body uncompressed.
+
+Counters are per container and logged as one JSON metric line every
+HTTP_CACHE_LOG_EVERY responses (default 100), not per response.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+LOG_EVERY = max(1, int(os.getenv("HTTP_CACHE_LOG_EVERY", "100")))
+# Must match BinaryMediaTypes in template.yaml and binaryMediaTypes in
+# dad-fix/amplify/backend.ts
+BINARY_MEDIA_TYPES = {"application/json", "application/zip", "application/x-ndjson"}
+
+_stats = {
+    "requests": 0,
+    "conditional": 0,
+    "notModified": 0,
+    "rawBytes": 0,
+    "sentBytes": 0,
+}
+# Requests per route, reported alongside the totals
+_routes: dict[str, int] = {}
+_lock = threading.Lock()
+# Body size last sent per ETag, so a 304 can report the bytes it saved
+_sizes: OrderedDict[str, int] = OrderedDict()
+_MAX_SIZES = 512
+
+
+def get_header(event: dict, name: str) -> str | None:
+    name = name.lower()
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256("\x1f".join(map(str, parts)).encode("utf-8")).hexdigest()
+    # Weak: the same entity may be sent with different content encodings
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(event: dict, etag: str) -> bool:
+    header = get_header(event, "If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def accepts_binary(event: dict) -> bool:
+    """Whether API Gateway will decode an isBase64Encoded body for this request."""
+    first = (get_header(event, "Accept") or "").split(",")[0]
+    return first.partition(";")[0].strip().lower() in BINARY_MEDIA_TYPES
+
+
+def _accepted_encodings(event: dict) -> set[str]:
+    accepted = set()
+    for part in (get_header(event, "Accept-Encoding") or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def _compress(event: dict, raw: bytes) -> tuple[str | None, bytes]:
+    if len(raw) < MIN_COMPRESS_BYTES or not accepts_binary(event):
+        return None, raw
+    accepted = _accepted_encodings(event)
+    # Middle quality levels: most of the ratio for a fraction of the CPU
+    if brotli is not None and "br" in accepted:
+        return "br", brotli.compress(raw, quality=5)
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip", gzip.compress(raw, compresslevel=5)
+    return None, raw
+
+
+def _record(route: str, *, conditional: bool, not_modified: bool, raw: int, sent: int):
+    with _lock:
+        _stats["requests"] += 1
+        _stats["conditional"] += conditional
+        _stats["notModified"] += not_modified
+        _stats["rawBytes"] += raw
+        _stats["sentBytes"] += sent
+        _routes[route] = _routes.get(route, 0) + 1
+        if _stats["requests"] % LOG_EVERY:
+            return
+        s, routes = dict(_stats), dict(_routes)
+    print(
+        json.dumps(
+            {
+                "metric": "http_cache",
+                **s,
+                "notModifiedRatio": round(s["notModified"] / s["requests"], 3),
+                "savedBytes": s["rawBytes"] - s["sentBytes"],
+                "routes": routes,
+            }
+        )
+    )
+
+
+def not_modified(route: str, etag: str) -> dict:
+    with _lock:
+        raw_size = _sizes.get(etag, 0)
+    _record(route, conditional=True, not_modified=True, raw=raw_size, sent=0)
+    return {
+        "statusCode": 304,
+        "headers": {
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": "",
+    }
+
+
+def json_response(route: str, event: dict, body: str, etag: str) -> dict:
+    """200 with ETag, compressed when the client accepts it."""
+    raw = body.encode("utf-8")
+    encoding, payload = _compress(event, raw)
+    with _lock:
+        _sizes[etag] = len(raw)
+        _sizes.move_to_end(etag)
+        if len(_sizes) > _MAX_SIZES:
+            _sizes.popitem(last=False)
+    headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept, Accept-Encoding",
+    }
+    _record(
+        route,
+        conditional=get_header(event, "If-None-Match") is not None,
+        not_modified=False,
+        raw=len(raw),
+        sent=len(payload),
+    )
+    if encoding is None:
+        return {"statusCode": 200, "headers": headers, "body": body}
+    headers["Content-Encoding"] = encoding
+    return {
+        "statusCode": 200,
+        "headers": headers,
+        "body": base64.b64encode(payload).decode("ascii"),
+        "isBase64Encoded": True,
+    }
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,213 @@
+"""
+Idempotency-Key support for POST /items.
+
+A client (or API Gateway) retrying a slow upload sends the same key again.
+The first request claims the key with an in-progress marker holding a lease;
+duplicates that arrive while it runs get an immediate 409 with Retry-After
+rather than tying up a Lambda, and once it completes the stored response is
+replayed until the marker expires. Each logical upload therefore pays for one
+image write and one Bedrock call.
+
+A Lambda that dies mid-request leaves its marker behind. Once the lease
+(lockExpiresAt) has passed, the next retry takes the key over with the same
+conditional write; every claim carries an owner token, so a slow first owner
+that finishes after the takeover cannot overwrite or release the new claim.
+
+As with quotas, MemoryIdempotencyStore serves local runs and
+DynamoIdempotencyStore shares markers across Lambda containers through
+conditional writes.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+class IdempotencyConflict(Exception):
+    """The key is still being processed, or was used for a different request."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def fingerprint(body: str | bytes) -> str:
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+class MemoryIdempotencyStore:
+    def __init__(self):
+        self._records: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, record: dict) -> dict | None:
+        """Store ``record`` unless a live one exists; return the existing one."""
+        with self._lock:
+            existing = self._records.get(key)
+            now = time.time()
+            if existing and existing["expiresAt"] > now and not (
+                existing["status"] == IN_PROGRESS and existing["lockExpiresAt"] < now
+            ):
+                return existing
+            self._records[key] = record
+            return None
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            return self._records.get(key)
+
+    def complete(self, key: str, owner: str, response: dict, expires_at: int) -> bool:
+        with self._lock:
+            record = self._records.get(key)
+            if not record or record.get("owner") != owner:
+                return False
+            record.update(status=COMPLETED, response=response, expiresAt=expires_at)
+            return True
+
+    def release(self, key: str, owner: str):
+        with self._lock:
+            record = self._records.get(key)
+            if record and record.get("owner") == owner:
+                del self._records[key]
+
+
+class DynamoIdempotencyStore:
+    """Items ``{id, status, fingerprint, owner, lockExpiresAt, expiresAt[, response]}``;
+    finished keys disappear through the table's TTL on expiresAt."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def claim(self, key: str, record: dict) -> dict | None:
+        from botocore.exceptions import ClientError
+
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={"id": key, **record},
+                # TTL deletion is lazy, and a Lambda that died mid-request
+                # leaves a stale lock behind; both may be taken over
+                ConditionExpression=(
+                    "attribute_not_exists(id) OR expiresAt < :now "
+                    "OR (#s = :in_progress AND lockExpiresAt < :now)"
+                ),
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":now": now, ":in_progress": IN_PROGRESS},
+            )
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+        return self.get(key) or {"status": IN_PROGRESS, "fingerprint": record["fingerprint"]}
+
+    def get(self, key: str) -> dict | None:
+        return self.table.get_item(Key={"id": key}, ConsistentRead=True).get("Item")
+
+    def complete(self, key: str, owner: str, response: dict, expires_at: int) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.table.update_item(
+                Key={"id": key},
+                UpdateExpression="SET #s = :done, #r = :response, expiresAt = :exp",
+                ConditionExpression="#o = :owner",
+                ExpressionAttributeNames={"#s": "status", "#r": "response", "#o": "owner"},
+                ExpressionAttributeValues={
+                    ":done": COMPLETED,
+                    ":response": response,
+                    ":exp": expires_at,
+                    ":owner": owner,
+                },
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+
+    def release(self, key: str, owner: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.table.delete_item(
+                Key={"id": key},
+                ConditionExpression="#o = :owner",
+                ExpressionAttributeNames={"#o": "owner"},
+                ExpressionAttributeValues={":owner": owner},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+
+class IdempotencyManager:
+    def __init__(
+        self,
+        store,
+        *,
+        ttl_seconds: int = 86400,
+        lock_seconds: int = 35,
+        retry_after: int = 2,
+    ):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        # The lease: longer than one upload can take (Lambda timeout is 30 s),
+        # after which a crashed owner's key is taken over
+        self.lock_seconds = lock_seconds
+        # Seconds a duplicate is told to wait; most uploads finish in a few
+        self.retry_after = retry_after
+
+    def begin(self, key: str, body_fingerprint: str, owner: str) -> dict | None:
+        """Claim ``key`` for ``owner``; None if this request should do the
+        work, else the stored response to replay. Raises IdempotencyConflict
+        without waiting when the key is held or was used for another body."""
+        now = int(time.time())
+        existing = self.store.claim(
+            key,
+            {
+                "status": IN_PROGRESS,
+                "fingerprint": body_fingerprint,
+                "owner": owner,
+                "lockExpiresAt": now + self.lock_seconds,
+                "expiresAt": now + self.ttl_seconds,
+            },
+        )
+        if existing is None:
+            return None
+        if existing["fingerprint"] != body_fingerprint:
+            raise IdempotencyConflict(
+                "Idempotency-Key was already used for a different request", 422
+            )
+        if existing["status"] == COMPLETED:
+            return existing["response"]
+        lease_left = int(existing.get("lockExpiresAt", now)) - now
+        raise IdempotencyConflict(
+            "A request with this Idempotency-Key is still in progress",
+            409,
+            retry_after=max(1, min(lease_left, self.retry_after)),
+        )
+
+    def complete(self, key: str, owner: str, response: dict):
+        if not self.store.complete(key, owner, response, int(time.time()) + self.ttl_seconds):
+            print(f"idempotency lease on {key} was taken over; response not stored")
+
+    def release(self, key: str, owner: str):
+        """Forget a failed attempt so a retry runs it again."""
+        self.store.release(key, owner)
+
+
+def create_idempotency_manager(table=None) -> IdempotencyManager:
+    """Replay window from IDEMPOTENCY_TTL_SECONDS, lease from IDEMPOTENCY_LOCK_SECONDS."""
+    store = DynamoIdempotencyStore(table) if table is not None else MemoryIdempotencyStore()
+    return IdempotencyManager(
+        store,
+        ttl_seconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+        lock_seconds=int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "35")),
+    )
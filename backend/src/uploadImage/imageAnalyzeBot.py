@@ -1,22 +1,143 @@
 import base64
+import os
+import re
+import time
 import boto3
 import json
+from dataclasses import dataclass, field
+from botocore.config import Config
 
-def ai_image_analyze(image_base64: str) -> str:
-    client = boto3.client("bedrock-runtime", region_name="us-east-1")
-    MODEL_ID = "us.amazon.nova-lite-v1:0"
+# Package import from the FastAPI server, flat inside the Lambda bundle; see
+# regions.py for why this follows __package__ rather than try/except
+if __package__:
+    from .prompts import system_blocks, token_report
+    from .regions import get_region_selector, region_guard
+else:
+    from prompts import system_blocks, token_report
+    from regions import get_region_selector, region_guard
 
+MODEL_ID = "us.amazon.nova-lite-v1:0"
+# Used unless BEDROCK_REGIONS lists several (see regions.py); the us.*
+# inference profiles work from any US region
+DEFAULT_REGION = "us-east-1"
+SYSTEM_PROMPT = "homefix-image"
+# The prose goes to the user; the trailing <details> block is stripped off
+# and stored as filterable record attributes
+DETAILS_TAG = "<details>"
+ANALYZE_INSTRUCTION = """Analyze the image and categorize the main subject/device type.
+After your reply, add one final line with the device details as JSON inside <details></details> tags:
+<details>{"category": "<short device type, e.g. router, kettle, washing machine>", "brand": "<brand if visible, else null>", "symptoms": ["<short problem tags, e.g. no power, leaking>"]}</details>"""
+
+# Both cascade tiers answer in this shape so their outputs are comparable.
+# The short fields come first so that a reply cut off at maxTokens still
+# says how confident the model was (see _parse_cascade_reply)
+CASCADE_INSTRUCTION = """Identify the main device or household system in the image and what looks wrong with it.
+Reply with JSON only, no prose around it, with the keys in this order:
+{"confidence": <0.0-1.0, how sure you are of the category and problem>,
+ "category": "<short device type, e.g. router, kettle, washing machine>",
+ "brand": "<brand if visible, else null>",
+ "symptoms": ["<short problem tags, e.g. no power, leaking>"],
+ "answer": "<your reply to the user>"}"""
+
+MAX_SYMPTOMS = 5
+
+
+@dataclass
+class CascadeConfig:
+    first_model: str = "us.amazon.nova-lite-v1:0"
+    escalation_model: str = "us.amazon.nova-pro-v1:0"
+    # Escalate when the first pass is less confident than this
+    threshold: float = 0.7
+    # The JSON fields take ~60 tokens before the answer starts; a first tier
+    # cut off mid-answer escalates, so this must fit a complete reply
+    first_max_tokens: int = 400
+    escalation_max_tokens: int = 600
+
+    @classmethod
+    def from_env(cls) -> "CascadeConfig | None":
+        """The cascade is opt-in: ANALYSIS_CASCADE=1 plus optional overrides."""
+        if os.getenv("ANALYSIS_CASCADE") != "1":
+            return None
+        defaults = cls()
+        return cls(
+            first_model=os.getenv("ANALYSIS_CASCADE_FIRST_MODEL", defaults.first_model),
+            escalation_model=os.getenv(
+                "ANALYSIS_CASCADE_ESCALATION_MODEL", defaults.escalation_model
+            ),
+            threshold=float(
+                os.getenv("ANALYSIS_CASCADE_THRESHOLD", str(defaults.threshold))
+            ),
+        )
+
+
+@dataclass
+class Analysis:
+    text: str
+    category: str = "unknown"
+    brand: str | None = None
+    symptoms: list[str] = field(default_factory=list)
+
+    def details(self) -> dict:
+        return {"category": self.category, "brand": self.brand, "symptoms": self.symptoms}
+
+
+@dataclass
+class CascadeResult:
+    text: str
+    category: str
+    confidence: float
+    model: str
+    escalated: bool
+    # (model id, usage dict) for every call made, for cost accounting
+    calls: list[tuple[str, dict]] = field(default_factory=list)
+    latency_ms: float = 0.0
+    brand: str | None = None
+    symptoms: list[str] = field(default_factory=list)
+
+
+_clients: dict[str, object] = {}
+
+
+def get_region_selection():
+    selector = get_region_selector(
+        "image", DEFAULT_REGION, default_endpoint=os.getenv("BEDROCK_ENDPOINT_URL")
+    )
+    # Build every region's client up front so that client setup is never
+    # counted as a region's latency
+    for region in selector.regions:
+        get_bedrock_client(region, selector)
+    return selector
+
+
+def get_bedrock_client(region: str | None = None, selector=None):
+    """One Bedrock client per region per process instead of one per analysis."""
+    if region in _clients:
+        return _clients[region]
+    selector = selector or get_region_selection()
+    region = region or selector.regions[0]
+    client = _clients.get(region)
+    if client is None:
+        client = _clients[region] = boto3.client(
+            "bedrock-runtime",
+            region_name=region,
+            # Local fake endpoints for tests (see fake_bedrock.py)
+            endpoint_url=selector.endpoint(region),
+            # Retries are handled by the guard; botocore's would multiply them
+            config=Config(retries={"total_max_attempts": 1, "mode": "standard"}),
+        )
+    return client
+
+
+def _build_request(
+    image_base64: str,
+    instruction: str = ANALYZE_INSTRUCTION,
+    max_tokens: int = 300,
+    model_id: str = MODEL_ID,
+) -> dict:
     # image_base64 is already a base64 string — use directly
     base64_string = image_base64
 
-    system_list = [
-        {
-            "text": """You are homeFix, a friendly and practical home maintenance AI assistant.
-Your job is to help users diagnose and fix problems with home appliances,
-devices, and household systems — such as Kindle e-readers, TVs, routers,
-washing machines, microwaves, smart home devices, and more."""
-        }
-    ]
+    system_list = system_blocks(SYSTEM_PROMPT, model_id)
 
     message_list = [
         {
@@ -28,20 +149,250 @@ washing machines, microwaves, smart home devices, and more."""
                         "source": {"bytes": base64_string},
                     }
                 },
-                {"text": "Analyze the image and categorize the main subject/device type."},
+                {"text": instruction},
             ],
         }
     ]
 
-    inf_params = {"maxTokens": 300, "topP": 0.1, "topK": 20, "temperature": 0.3}
+    inf_params = {"maxTokens": max_tokens, "topP": 0.1, "topK": 20, "temperature": 0.3}
 
-    native_request = {
+    return {
         "schemaVersion": "messages-v1",
         "messages": message_list,
         "system": system_list,
         "inferenceConfig": inf_params,
     }
 
-    response = client.invoke_model(modelId=MODEL_ID, body=json.dumps(native_request))
+
+def _log_usage(usage: dict, started: float, model_id: str = MODEL_ID):
+    report = token_report(SYSTEM_PROMPT, usage)
+    report["model"] = model_id
+    report["latencyMs"] = round((time.perf_counter() - started) * 1000)
+    print(json.dumps(report))
+
+
+def _invoke(model_id: str, native_request: dict) -> dict:
+    selector = get_region_selection()
+    body = json.dumps(native_request)
+    started = time.perf_counter()
+    response = selector.call(
+        lambda region: region_guard(region, selector).call(
+            get_bedrock_client(region).invoke_model, modelId=model_id, body=body
+        )
+    )
     model_response = json.loads(response["body"].read())
-    return model_response["output"]["message"]["content"][0]["text"]
+    _log_usage(model_response.get("usage", {}), started, model_id)
+    return model_response
+
+
+def _json_object(text: str) -> dict:
+    match = re.search(r"\{.*\}", text, re.S)
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except json.JSONDecodeError:
+        data = {}
+    return data if isinstance(data, dict) else {}
+
+
+def _tag(value, max_length: int = 40) -> str:
+    return " ".join(str(value).lower().split())[:max_length]
+
+
+def normalize_details(data: dict) -> dict:
+    """Category/brand/symptoms in the shape stored on the record."""
+    category = _tag(data.get("category") or "") or "unknown"
+    brand = data.get("brand")
+    brand = " ".join(str(brand).split())[:40] if brand and str(brand).lower() != "null" else None
+    symptoms = data.get("symptoms") or []
+    if not isinstance(symptoms, list):
+        symptoms = [symptoms]
+    tags = []
+    for symptom in symptoms:
+        tag = _tag(symptom)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return {"category": category, "brand": brand, "symptoms": tags[:MAX_SYMPTOMS]}
+
+
+def split_analysis(text: str) -> Analysis:
+    """Separate the user-facing prose from the trailing <details> block."""
+    prose, _, tail = text.partition(DETAILS_TAG)
+    return Analysis(text=prose.strip(), **normalize_details(_json_object(tail)))
+
+
+_PARTIAL_FIELDS = {
+    "confidence": r'"confidence"\s*:\s*"?([0-9.]+)',
+    "category": r'"category"\s*:\s*"((?:[^"\\]|\\.)*)"',
+    "brand": r'"brand"\s*:\s*"((?:[^"\\]|\\.)*)"',
+    # Unterminated when the reply was cut off
+    "answer": r'"answer"\s*:\s*"((?:[^"\\]|\\.)*)',
+}
+
+
+def _partial_json_fields(text: str) -> dict:
+    """The fields that made it into a JSON reply cut off at maxTokens."""
+    data = {}
+    for key, pattern in _PARTIAL_FIELDS.items():
+        match = re.search(pattern, text)
+        if not match:
+            continue
+        value = match.group(1)
+        try:
+            data[key] = json.loads(f'"{value}"') if key != "confidence" else value
+        except json.JSONDecodeError:
+            # e.g. an escape sequence cut in half
+            data[key] = value
+    symptoms = re.search(r'"symptoms"\s*:\s*\[([^\]]*)\]', text)
+    if symptoms:
+        data["symptoms"] = re.findall(r'"((?:[^"\\]|\\.)*)"', symptoms.group(1))
+    return data
+
+
+def _parse_cascade_reply(text: str, truncated: bool = False) -> dict:
+    """Pull the JSON object out of a tier's reply; unparseable means 0 confidence.
+
+    A reply cut off at maxTokens is parsed field by field, so its confidence
+    and category survive; ``truncated`` tells the cascade the answer is partial.
+    """
+    data = _json_object(text)
+    if not data:
+        data = _partial_json_fields(text)
+        truncated = truncated or bool(data)
+    try:
+        confidence = max(0.0, min(1.0, float(data.get("confidence", 0))))
+    except (TypeError, ValueError):
+        confidence = 0.0
+    return {
+        **normalize_details(data),
+        "confidence": confidence,
+        "answer": str(data.get("answer") or text).strip(),
+        "truncated": truncated,
+    }
+
+
+def analyze_with_cascade(
+    image_base64: str, config: CascadeConfig, detailed: bool = False
+) -> CascadeResult:
+    """Cheap first pass; escalate when it is unsure or the user asked for detail."""
+    started = time.perf_counter()
+    calls = []
+
+    tiers = [(config.escalation_model, config.escalation_max_tokens)]
+    if not detailed:
+        tiers.insert(0, (config.first_model, config.first_max_tokens))
+
+    for i, (model_id, max_tokens) in enumerate(tiers):
+        model_response = _invoke(
+            model_id,
+            _build_request(image_base64, CASCADE_INSTRUCTION, max_tokens, model_id),
+        )
+        calls.append((model_id, model_response.get("usage", {})))
+        parsed = _parse_cascade_reply(
+            model_response["output"]["message"]["content"][0]["text"],
+            truncated=model_response.get("stopReason") == "max_tokens",
+        )
+        is_last = i == len(tiers) - 1
+        # A cut-off answer is not shown to the user while a tier is left
+        if is_last or (parsed["confidence"] >= config.threshold and not parsed["truncated"]):
+            return CascadeResult(
+                text=parsed["answer"],
+                category=parsed["category"],
+                confidence=parsed["confidence"],
+                brand=parsed["brand"],
+                symptoms=parsed["symptoms"],
+                model=model_id,
+                escalated=i > 0 or detailed,
+                calls=calls,
+                latency_ms=(time.perf_counter() - started) * 1000,
+            )
+
+
+def ai_image_analyze_structured(image_base64: str, detailed: bool = False) -> Analysis:
+    """The reply text plus the device category, brand and symptom tags."""
+    config = CascadeConfig.from_env()
+    if config:
+        result = analyze_with_cascade(image_base64, config, detailed)
+        return Analysis(
+            text=result.text,
+            category=result.category,
+            brand=result.brand,
+            symptoms=result.symptoms,
+        )
+
+    model_response = _invoke(MODEL_ID, _build_request(image_base64))
+    return split_analysis(model_response["output"]["message"]["content"][0]["text"])
+
+
+def ai_image_analyze(image_base64: str, detailed: bool = False) -> str:
+    return ai_image_analyze_structured(image_base64, detailed).text
+
+
+class AnalysisStream:
+    """Iterates the reply text as Nova generates it, holding back the
+    trailing <details> block; ``analysis`` is set once iteration ends."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.analysis: Analysis | None = None
+
+    def __iter__(self):
+        shown, pending, tail = [], "", None
+        for text in self._chunks:
+            if tail is not None:
+                tail += text
+                continue
+            pending += text
+            index = pending.find(DETAILS_TAG)
+            if index >= 0:
+                visible, tail = pending[:index], pending[index:]
+            else:
+                # Keep back anything that could be the start of the tag
+                keep = next(
+                    (n for n in range(min(len(pending), len(DETAILS_TAG) - 1), 0, -1)
+                     if DETAILS_TAG.startswith(pending[-n:])),
+                    0,
+                )
+                visible, pending = pending[: len(pending) - keep], pending[len(pending) - keep:]
+            if visible:
+                shown.append(visible)
+                yield visible
+        if tail is None and pending:
+            shown.append(pending)
+            yield pending
+        self.analysis = split_analysis("".join(shown) + (tail or ""))
+
+
+def _stream_chunks(image_base64: str):
+    selector = get_region_selection()
+    body = json.dumps(_build_request(image_base64))
+
+    started = time.perf_counter()
+    # Only opening the stream is retried (and failed over); a mid-stream
+    # failure surfaces as is
+    response = selector.call(
+        lambda region: region_guard(region, selector).call(
+            get_bedrock_client(region).invoke_model_with_response_stream,
+            modelId=MODEL_ID,
+            body=body,
+        )
+    )
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        chunk_json = json.loads(chunk["bytes"])
+        if "metadata" in chunk_json:
+            _log_usage(chunk_json["metadata"].get("usage", {}), started)
+        text = chunk_json.get("contentBlockDelta", {}).get("delta", {}).get("text")
+        if text:
+            yield text
+
+
+def ai_image_analyze_stream(image_base64: str) -> AnalysisStream:
+    """Yield the analysis text in pieces as Nova generates it.
+
+    Always a single MODEL_ID call: ANALYSIS_CASCADE does not apply here,
+    since the cascade only knows whether to escalate once the first tier's
+    whole reply is in, and by then the streamed text would already be shown.
+    """
+    return AnalysisStream(_stream_chunks(image_base64))
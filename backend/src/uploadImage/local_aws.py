@@ -0,0 +1,239 @@
+"""
+In-process stand-ins for the S3 client and DynamoDB Table the Lambda uses.
+
+They implement only the calls app.py makes, with the same request/response
+shapes, so ``lambda_handler`` can run offline in benchmarks. Scans are paged
+at DynamoDB's 1 MB limit so large tables cost the same number of round trips
+as they would in AWS. Items are copied on the way in and out, as boto3 hands
+back fresh dicts. Presigned URLs are signed by a real botocore client
+(signing is local CPU work, and part of what we want to measure).
+"""
+
+import io
+import json
+import threading
+
+import boto3
+
+SCAN_PAGE_BYTES = 1024 * 1024
+
+
+class LocalS3:
+    def __init__(self):
+        self.objects: dict[tuple[str, str], dict] = {}
+        self.uploads: dict[str, dict] = {}
+        self._signer = boto3.client(
+            "s3",
+            region_name="us-east-1",
+            aws_access_key_id="local",
+            aws_secret_access_key="local",
+        )
+
+    def put_object(self, *, Bucket, Key, Body, ContentType=None, **kwargs):
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        self.objects[(Bucket, Key)] = {"Body": bytes(Body), "ContentType": ContentType}
+        return {"ETag": f'"{len(Body):x}"'}
+
+    def get_object(self, *, Bucket, Key, **kwargs):
+        obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise self._signer.exceptions.NoSuchKey(
+                {"Error": {"Code": "NoSuchKey", "Message": Key}}, "GetObject"
+            )
+        return {
+            "Body": io.BytesIO(obj["Body"]),
+            "ContentLength": len(obj["Body"]),
+            "ContentType": obj["ContentType"],
+        }
+
+    def list_objects_v2(self, *, Bucket, Prefix="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start : start + MaxKeys]
+        result = {
+            "Contents": [
+                {"Key": k, "Size": len(self.objects[(Bucket, k)]["Body"])} for k in page
+            ],
+            "KeyCount": len(page),
+        }
+        if start + MaxKeys < len(keys):
+            result["NextContinuationToken"] = str(start + MaxKeys)
+        return result
+
+    def delete_objects(self, *, Bucket, Delete, **kwargs):
+        for obj in Delete["Objects"]:
+            self.objects.pop((Bucket, obj["Key"]), None)
+        return {}
+
+    def create_multipart_upload(self, *, Bucket, Key, ContentType=None, **kwargs):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {"Key": Key, "ContentType": ContentType, "Parts": {}}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, *, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.uploads[UploadId]["Parts"][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}-{len(Body):x}"'}
+
+    def complete_multipart_upload(self, *, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        upload = self.uploads.pop(UploadId)
+        body = b"".join(upload["Parts"][p["PartNumber"]] for p in MultipartUpload["Parts"])
+        self.objects[(Bucket, Key)] = {"Body": body, "ContentType": upload["ContentType"]}
+        return {"Key": Key}
+
+    def abort_multipart_upload(self, *, Bucket, Key, UploadId, **kwargs):
+        self.uploads.pop(UploadId, None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return self._signer.generate_presigned_url(
+            ClientMethod, Params=Params, ExpiresIn=ExpiresIn
+        )
+
+
+def _matches(item: dict, condition) -> bool:
+    """Evaluate the subset of boto3 condition objects app.py builds."""
+    expression = condition.get_expression()
+    operator, values = expression["operator"], expression["values"]
+    if operator == "AND":
+        return all(_matches(item, v) for v in values)
+    if operator == "OR":
+        return any(_matches(item, v) for v in values)
+    name = values[0].name
+    if operator == "=":
+        return item.get(name) == values[1]
+    if operator == "begins_with":
+        return str(item.get(name, "")).startswith(values[1])
+    if operator == "attribute_exists":
+        return name in item
+    raise NotImplementedError(f"condition {operator!r} is not supported locally")
+
+
+def _projection(expression: str | None, names: dict | None) -> list[str] | None:
+    if not expression:
+        return None
+    names = names or {}
+    return [names.get(part.strip(), part.strip()) for part in expression.split(",")]
+
+
+class LocalTable:
+    """A single-hash-key table (``id``) kept in insertion order.
+
+    ``indexes`` maps a GSI name to its (hash, range) attribute names; like a
+    real GSI it only holds items that carry the hash attribute.
+    """
+
+    def __init__(
+        self,
+        name: str = "local-records",
+        key: str = "id",
+        indexes: dict[str, tuple[str, str | None]] | None = None,
+    ):
+        self.name = name
+        self.key = key
+        self.indexes = indexes or {}
+        self.items: dict[str, dict] = {}
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def put_item(self, *, Item, **kwargs):
+        with self._lock:
+            key = Item[self.key]
+            self.items[key] = dict(Item)
+            self._sizes[key] = len(json.dumps(Item, default=str))
+        return {}
+
+    def get_item(self, *, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        item = self.items.get(Key[self.key])
+        if item is None:
+            return {}
+        return {"Item": self._project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    @staticmethod
+    def _project(item: dict, expression, names) -> dict:
+        fields = _projection(expression, names)
+        if fields is None:
+            return dict(item)
+        return {k: item[k] for k in fields if k in item}
+
+    def scan(
+        self,
+        *,
+        FilterExpression=None,
+        ExclusiveStartKey=None,
+        Limit=None,
+        ProjectionExpression=None,
+        ExpressionAttributeNames=None,
+        **kwargs,
+    ):
+        keys = list(self.items)
+        start = 0
+        if ExclusiveStartKey:
+            start = keys.index(ExclusiveStartKey[self.key]) + 1
+
+        page, read_bytes, last = [], 0, None
+        for index in range(start, len(keys)):
+            key = keys[index]
+            # Like DynamoDB, the page budget counts items read, not returned
+            read_bytes += self._sizes[key]
+            item = self.items[key]
+            if FilterExpression is None or _matches(item, FilterExpression):
+                page.append(
+                    self._project(item, ProjectionExpression, ExpressionAttributeNames)
+                )
+            if read_bytes >= SCAN_PAGE_BYTES or (Limit and index - start + 1 >= Limit):
+                if index + 1 < len(keys):
+                    last = {self.key: key}
+                break
+
+        result = {"Items": page, "Count": len(page)}
+        if last:
+            result["LastEvaluatedKey"] = last
+        return result
+
+    def query(
+        self,
+        *,
+        KeyConditionExpression,
+        IndexName=None,
+        ScanIndexForward=True,
+        ExclusiveStartKey=None,
+        Limit=None,
+        FilterExpression=None,
+        ProjectionExpression=None,
+        ExpressionAttributeNames=None,
+        **kwargs,
+    ):
+        hash_key, range_key = self.indexes[IndexName] if IndexName else (self.key, None)
+        matched = [
+            item
+            for item in self.items.values()
+            if hash_key in item and _matches(item, KeyConditionExpression)
+        ]
+        if range_key:
+            matched.sort(key=lambda item: item.get(range_key, ""), reverse=not ScanIndexForward)
+        start = 0
+        if ExclusiveStartKey:
+            ids = [item[self.key] for item in matched]
+            start = ids.index(ExclusiveStartKey[self.key]) + 1
+
+        page, read_bytes, last = [], 0, None
+        for index in range(start, len(matched)):
+            item = matched[index]
+            read_bytes += self._sizes[item[self.key]]
+            if FilterExpression is None or _matches(item, FilterExpression):
+                page.append(
+                    self._project(item, ProjectionExpression, ExpressionAttributeNames)
+                )
+            if read_bytes >= SCAN_PAGE_BYTES or (Limit and index - start + 1 >= Limit):
+                if index + 1 < len(matched):
+                    last = {self.key: item[self.key]}
+                    for name in (hash_key, range_key):
+                        if name:
+                            last[name] = item[name]
+                break
+
+        result = {"Items": page, "Count": len(page)}
+        if last:
+            result["LastEvaluatedKey"] = last
+        return result
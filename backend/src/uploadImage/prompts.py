@@ -0,0 +1,77 @@
+"""
+Registry for the homeFix system prompts.
+
+Each prompt lives once under prompts/<name>.md, is read once per process and
+carries a content-hash version, so logs can tie token usage to the exact text
+that was sent. Where the model supports Bedrock prompt caching and the
+prompt is long enough to be cached, the system block is followed by a cache
+checkpoint so repeat requests read the prefix from cache instead of paying
+for it as fresh input tokens.
+
+Nova only caches a prefix of at least 1,000 tokens. homefix-image is far
+shorter, so image analyses go without a checkpoint today and token_report
+shows no cached tokens; one is added automatically once the prompt grows
+past the minimum.
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass
+from functools import cache
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+# Text models that accept cachePoint blocks; Nova Sonic's bidirectional
+# stream does not
+_CACHE_CAPABLE_MODELS = ("amazon.nova-micro", "amazon.nova-lite", "amazon.nova-pro", "amazon.nova-premier")
+# Smallest prefix, in tokens, a Nova cache checkpoint takes effect for
+CACHE_MIN_TOKENS = 1000
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    text: str
+    version: str
+
+
+@cache
+def get_prompt(name: str) -> Prompt:
+    with open(os.path.join(PROMPT_DIR, f"{name}.md"), encoding="utf-8") as f:
+        text = f.read().strip()
+    version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    return Prompt(name=name, text=text, version=version)
+
+
+def supports_prompt_cache(model_id: str) -> bool:
+    # Cross-region profiles look like "us.amazon.nova-lite-v1:0"
+    return any(family in model_id for family in _CACHE_CAPABLE_MODELS)
+
+
+def estimated_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English)."""
+    return len(text) // 4
+
+
+def system_blocks(name: str, model_id: str) -> list[dict]:
+    """The ``system`` list for a messages-v1 request, with a cache checkpoint
+    when the model supports one and the prompt reaches CACHE_MIN_TOKENS."""
+    text = get_prompt(name).text
+    blocks = [{"text": text}]
+    if supports_prompt_cache(model_id) and estimated_tokens(text) >= CACHE_MIN_TOKENS:
+        blocks.append({"cachePoint": {"type": "default"}})
+    return blocks
+
+
+def token_report(name: str, usage: dict) -> dict:
+    """Split a response's input tokens into cached and fresh for logging."""
+    cache_read = usage.get("cacheReadInputTokenCount", 0) or 0
+    cache_write = usage.get("cacheWriteInputTokenCount", 0) or 0
+    return {
+        "prompt": name,
+        "promptVersion": get_prompt(name).version,
+        "freshInputTokens": usage.get("inputTokens", 0),
+        "cachedInputTokens": cache_read,
+        "cacheWriteInputTokens": cache_write,
+        "outputTokens": usage.get("outputTokens", 0),
+    }
@@ -0,0 +1,174 @@
+"""
+Per-user quotas keyed by the Cognito identity id.
+
+Two limits are enforced:
+- an upload token bucket (each POST /items costs one Bedrock inference)
+- a cap on concurrent /ws/nova voice sessions
+
+MemoryQuotaBackend serves the long-lived FastAPI process. The Lambda runs many
+short-lived containers, so it uses DynamoQuotaBackend, which keeps the
+buckets in a DynamoDB table with conditional writes.
+"""
+
+import os
+import threading
+import time
+from decimal import Decimal
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, round(retry_after))
+
+
+class MemoryQuotaBackend:
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._slots: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def take_token(self, key: str, rate: float, burst: float) -> float:
+        """Spend one token; 0 on success, else seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+
+    def acquire_slot(self, key: str, limit: int) -> bool:
+        with self._lock:
+            if self._slots.get(key, 0) >= limit:
+                return False
+            self._slots[key] = self._slots.get(key, 0) + 1
+            return True
+
+    def release_slot(self, key: str):
+        with self._lock:
+            remaining = self._slots.get(key, 0) - 1
+            if remaining > 0:
+                self._slots[key] = remaining
+            else:
+                self._slots.pop(key, None)
+
+
+class DynamoQuotaBackend:
+    """Buckets as items ``{id, tokens, updatedAt, expiresAt}`` updated with
+    optimistic concurrency; idle items expire through the table's TTL."""
+
+    _CONTENTION_RETRIES = 3
+
+    def __init__(self, table):
+        self.table = table
+
+    def take_token(self, key: str, rate: float, burst: float) -> float:
+        from botocore.exceptions import ClientError
+
+        for _ in range(self._CONTENTION_RETRIES):
+            now = time.time()
+            item = self.table.get_item(Key={"id": key}, ConsistentRead=True).get("Item")
+            if item:
+                elapsed = now - float(item["updatedAt"])
+                tokens = min(burst, float(item["tokens"]) + elapsed * rate)
+            else:
+                tokens = burst
+            if tokens < 1:
+                return (1 - tokens) / rate
+
+            condition = {"ConditionExpression": "attribute_not_exists(id)"}
+            if item:
+                condition = {
+                    "ConditionExpression": "updatedAt = :prev",
+                    "ExpressionAttributeValues": {":prev": item["updatedAt"]},
+                }
+            try:
+                self.table.put_item(
+                    Item={
+                        "id": key,
+                        "tokens": Decimal(str(round(tokens - 1, 4))),
+                        "updatedAt": Decimal(str(round(now, 4))),
+                        "expiresAt": int(now + burst / rate + 3600),
+                    },
+                    **condition,
+                )
+                return 0.0
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+        # Heavily contended bucket: ask the client to back off for one token
+        return 1 / rate
+
+    def acquire_slot(self, key: str, limit: int) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.table.update_item(
+                Key={"id": key},
+                UpdateExpression="ADD active :one SET expiresAt = :exp",
+                ConditionExpression="attribute_not_exists(active) OR active < :limit",
+                ExpressionAttributeValues={
+                    ":one": 1,
+                    ":limit": limit,
+                    ":exp": int(time.time() + 86400),
+                },
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def release_slot(self, key: str):
+        self.table.update_item(
+            Key={"id": key},
+            UpdateExpression="ADD active :minus",
+            ExpressionAttributeValues={":minus": -1},
+        )
+
+
+class QuotaManager:
+    def __init__(
+        self,
+        backend,
+        *,
+        uploads_per_minute: float = 10,
+        upload_burst: float = 5,
+        max_voice_sessions: int = 2,
+    ):
+        self.backend = backend
+        self.upload_rate = uploads_per_minute / 60
+        self.upload_burst = upload_burst
+        self.max_voice_sessions = max_voice_sessions
+
+    def check_upload(self, user_id: str):
+        retry_after = self.backend.take_token(
+            f"upload#{user_id}", self.upload_rate, self.upload_burst
+        )
+        if retry_after:
+            raise QuotaExceeded("Upload rate limit reached", retry_after)
+
+    def acquire_voice_session(self, user_id: str):
+        if not self.backend.acquire_slot(f"voice#{user_id}", self.max_voice_sessions):
+            raise QuotaExceeded("Too many open voice sessions", retry_after=10)
+
+    def release_voice_session(self, user_id: str):
+        self.backend.release_slot(f"voice#{user_id}")
+
+
+def create_quota_manager(table=None) -> QuotaManager:
+    """Limits from UPLOADS_PER_MINUTE / UPLOAD_BURST / MAX_VOICE_SESSIONS_PER_USER.
+
+    Pass a DynamoDB Table to share buckets across Lambda containers; without
+    one the counters live in this process.
+    """
+    backend = DynamoQuotaBackend(table) if table is not None else MemoryQuotaBackend()
+    return QuotaManager(
+        backend,
+        uploads_per_minute=float(os.getenv("UPLOADS_PER_MINUTE", "10")),
+        upload_burst=float(os.getenv("UPLOAD_BURST", "5")),
+        max_voice_sessions=int(os.getenv("MAX_VOICE_SESSIONS_PER_USER", "2")),
+    )
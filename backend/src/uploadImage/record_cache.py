@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecordCache:
+    """Per-container cache for GET /records/{id}.
+
+    Record items are kept in an LRU with a short TTL (voice records still gain
+    transcript segments after they are created). Presigned URLs are kept until
+    they are within ``reissue_margin`` seconds of expiring, so a user
+    reopening a record gets the same URLs instead of a fresh signature each
+    time. Read units and signing CPU then follow unique records viewed rather
+    than page views.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_items: int = 512,
+        item_ttl: float = 30,
+        max_urls: int = 2048,
+        reissue_margin: float = 900,
+    ):
+        self.max_items = max_items
+        self.item_ttl = item_ttl
+        self.max_urls = max_urls
+        self.reissue_margin = reissue_margin
+
+        # record id -> (expires_at, item)
+        self._items: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        # (bucket, key) -> (expires_at, url)
+        self._urls: OrderedDict[tuple[str, str], tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "itemHits": 0,
+            "itemMisses": 0,
+            "urlHits": 0,
+            "urlMisses": 0,
+        }
+
+    @staticmethod
+    def _remember(entries: OrderedDict, key, value, limit: int):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+    def get_item(self, table, item_id: str) -> dict | None:
+        """The record item (a copy the caller may modify), or None if missing."""
+        now = time.time()
+        with self._lock:
+            entry = self._items.get(item_id)
+            if entry and entry[0] > now:
+                self._items.move_to_end(item_id)
+                self.counters["itemHits"] += 1
+                return dict(entry[1])
+            self.counters["itemMisses"] += 1
+
+        item = table.get_item(Key={"id": item_id}).get("Item")
+        if item is None:
+            # Misses are not cached, so a new record is readable at once
+            return None
+        with self._lock:
+            self._remember(self._items, item_id, (now + self.item_ttl, item), self.max_items)
+        return dict(item)
+
+    def presigned_url(self, s3, bucket: str, key: str, expires_in: int) -> tuple[str, float]:
+        """A GET URL for ``bucket/key`` and the time it expires."""
+        now = time.time()
+        with self._lock:
+            entry = self._urls.get((bucket, key))
+            if entry and entry[0] - now > self.reissue_margin:
+                self._urls.move_to_end((bucket, key))
+                self.counters["urlHits"] += 1
+                return entry[1], entry[0]
+            self.counters["urlMisses"] += 1
+
+        url = s3.generate_presigned_url(
+            "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires_in
+        )
+        expires_at = now + expires_in
+        with self._lock:
+            self._remember(self._urls, (bucket, key), (expires_at, url), self.max_urls)
+        return url, expires_at
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "items": len(self._items), "urls": len(self._urls)}
+
+
+def create_record_cache() -> RecordCache:
+    return RecordCache(
+        max_items=int(os.getenv("RECORD_CACHE_SIZE", "512")),
+        item_ttl=float(os.getenv("RECORD_CACHE_TTL", "30")),
+        max_urls=int(os.getenv("URL_CACHE_SIZE", "2048")),
+        reissue_margin=float(os.getenv("URL_REISSUE_MARGIN", "900")),
+    )
@@ -0,0 +1,57 @@
+import datetime
+
+
+def put_image(s3, bucket: str, file_id: str, ext: str, image_bytes: bytes) -> str:
+    image_key = f"images/{file_id}.{ext}"
+    s3.put_object(
+        Bucket=bucket, Key=image_key, Body=image_bytes, ContentType=f"image/{ext}"
+    )
+    return image_key
+
+
+def category_key(user_id: str, category: str) -> str:
+    """Partition key of the UserCategoryIndex GSI."""
+    return f"{user_id}#{category}"
+
+
+def put_analysis_record(
+    s3,
+    table,
+    bucket: str,
+    file_id: str,
+    image_key: str,
+    analysis: str,
+    user_id: str,
+    details: dict | None = None,
+) -> str:
+    """Store the analysis text and the record item that lists it in GET /records.
+
+    ``details`` (category, brand, symptoms) become item attributes; the
+    category is indexed per user so GET /records?category= is a Query.
+    """
+    analysis_key = f"analysis/{file_id}.txt"
+    s3.put_object(
+        Bucket=bucket,
+        Key=analysis_key,
+        Body=analysis.encode("utf-8"),
+        ContentType="text/plain",
+    )
+
+    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    item = {
+        "id": file_id,
+        "imageKey": image_key,
+        "analysisKey": analysis_key,
+        "createdAt": created_at,
+        "userId": user_id,
+    }
+    if details:
+        item["category"] = details["category"]
+        item["userCategory"] = category_key(user_id, details["category"])
+        if details.get("brand"):
+            item["brand"] = details["brand"]
+        if details.get("symptoms"):
+            item["symptoms"] = details["symptoms"]
+    table.put_item(Item=item)
+    return analysis_key
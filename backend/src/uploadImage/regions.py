@@ -0,0 +1,263 @@
+"""
+Latency-aware choice between Bedrock regions.
+
+With BEDROCK_REGIONS=us-east-1,us-west-2 every image analysis and voice
+session goes to the region with the best recent record: an exponentially
+weighted average of real request latencies, plus a penalty for its recent
+error rate, and a cool-down after a failure. Callers walk ``ranked()`` and
+fail over to the next region when one errors. A small share of traffic is
+sent to the runner-up so its numbers stay current, and optional probes
+(``probe_all``) keep idle regions measured.
+
+BEDROCK_ENDPOINT_URLS=us-east-1=http://127.0.0.1:8001,... points the image
+regions at local fakes (see fake_bedrock.py --regions), NOVA_ENDPOINT_URLS the
+voice ones. Without BEDROCK_REGIONS there is a single region and behaviour is
+unchanged.
+
+Only the standard library is used so the module works in both runtimes.
+"""
+
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Package import from the FastAPI server, flat inside the Lambda bundle.
+# Decided by how this module was loaded, not by what happens to be on
+# sys.path: a second copy of resilience would mean a second guard registry
+# and a CircuitOpenError that except clauses elsewhere do not catch
+if __package__:
+    from .resilience import (
+        NETWORK_ERRORS,
+        RETRYABLE_ERRORS,
+        CircuitOpenError,
+        error_code,
+        get_guard,
+    )
+else:
+    from resilience import (
+        NETWORK_ERRORS,
+        RETRYABLE_ERRORS,
+        CircuitOpenError,
+        error_code,
+        get_guard,
+    )
+
+# Worth trying another region: throttling/outages plus network failures
+FAILOVER_ERRORS = RETRYABLE_ERRORS | NETWORK_ERRORS
+
+
+def should_fail_over(exc: BaseException) -> bool:
+    return isinstance(exc, CircuitOpenError) or error_code(exc) in FAILOVER_ERRORS
+
+
+class RegionStats:
+    def __init__(self):
+        self.latency_ms: float | None = None
+        self.probe_ms: float | None = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.failed_at = 0.0
+
+
+class RegionSelector:
+    def __init__(
+        self,
+        regions: list[str],
+        *,
+        endpoints: dict[str, str] | None = None,
+        alpha: float = 0.2,
+        error_penalty_ms: float = 5000,
+        cooldown: float = 30,
+        explore: float = 0.05,
+    ):
+        self.regions = list(regions)
+        self.endpoints = dict(endpoints or {})
+        self.alpha = alpha
+        self.error_penalty_ms = error_penalty_ms
+        self.cooldown = cooldown
+        self.explore = explore
+        self._stats = {region: RegionStats() for region in self.regions}
+        self._lock = threading.Lock()
+
+    def endpoint(self, region: str) -> str | None:
+        return self.endpoints.get(region)
+
+    def _ewma(self, old: float | None, value: float) -> float:
+        return value if old is None else old + self.alpha * (value - old)
+
+    def record(self, region: str, latency_ms: float, ok: bool):
+        """Feed a real request's outcome; failures count as slow as well as bad."""
+        with self._lock:
+            stats = self._stats[region]
+            stats.requests += 1
+            stats.error_rate = self._ewma(stats.error_rate, 0.0 if ok else 1.0)
+            if ok:
+                stats.latency_ms = self._ewma(stats.latency_ms, latency_ms)
+            else:
+                stats.errors += 1
+                stats.failed_at = time.monotonic()
+
+    def record_probe(self, region: str, latency_ms: float | None):
+        """A probe's round trip, or None when the endpoint was unreachable."""
+        with self._lock:
+            stats = self._stats[region]
+            if latency_ms is None:
+                stats.error_rate = self._ewma(stats.error_rate, 1.0)
+                stats.failed_at = time.monotonic()
+            else:
+                stats.probe_ms = self._ewma(stats.probe_ms, latency_ms)
+
+    def _score(self, stats: RegionStats, now: float) -> float:
+        # A region nobody has used yet is tried early, ordered by its probe
+        latency = stats.latency_ms if stats.latency_ms is not None else (stats.probe_ms or 0.0)
+        score = latency + stats.error_rate * self.error_penalty_ms
+        if now - stats.failed_at < self.cooldown:
+            score += self.error_penalty_ms
+        return score
+
+    def ranked(self) -> list[str]:
+        """Regions best first; the order to try (and fail over) in."""
+        if len(self.regions) == 1:
+            return list(self.regions)
+        now = time.monotonic()
+        with self._lock:
+            order = sorted(self.regions, key=lambda r: self._score(self._stats[r], now))
+            healthy = [r for r in order[1:] if now - self._stats[r].failed_at >= self.cooldown]
+        if healthy and random.random() < self.explore:
+            runner_up = random.choice(healthy)
+            order.remove(runner_up)
+            order.insert(0, runner_up)
+        return order
+
+    def best(self) -> str:
+        return self.ranked()[0]
+
+    def _failed(self, region: str, exc: Exception, started: float, last: bool) -> bool:
+        """Record a failed attempt; True if the next region should be tried."""
+        if not should_fail_over(exc):
+            # The request itself is bad (e.g. validation); another region won't help
+            return False
+        self.record(region, (time.perf_counter() - started) * 1000, ok=False)
+        if not last:
+            print(f"bedrock region {region} failed ({error_code(exc)}), failing over")
+        return not last
+
+    def call(self, fn):
+        """``fn(region)`` in the best region, failing over down the ranking."""
+        regions = self.ranked()
+        for i, region in enumerate(regions):
+            started = time.perf_counter()
+            try:
+                result = fn(region)
+            except Exception as exc:
+                if self._failed(region, exc, started, i == len(regions) - 1):
+                    continue
+                raise
+            self.record(region, (time.perf_counter() - started) * 1000, ok=True)
+            return result
+
+    async def acall(self, fn):
+        """Async twin of ``call`` for coroutine functions (voice bridge)."""
+        regions = self.ranked()
+        for i, region in enumerate(regions):
+            started = time.perf_counter()
+            try:
+                result = await fn(region)
+            except Exception as exc:
+                if self._failed(region, exc, started, i == len(regions) - 1):
+                    continue
+                raise
+            self.record(region, (time.perf_counter() - started) * 1000, ok=True)
+            return result
+
+    def probe_all(self, timeout: float = 2.0):
+        """Time a cheap request to every region (blocking; run it off-loop)."""
+        for region in self.regions:
+            self.record_probe(region, http_probe(self.probe_url(region), timeout))
+
+    def probe_url(self, region: str) -> str:
+        return self.endpoint(region) or f"https://bedrock-runtime.{region}.amazonaws.com/"
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                region: {
+                    "latencyMs": round(s.latency_ms) if s.latency_ms is not None else None,
+                    "probeMs": round(s.probe_ms) if s.probe_ms is not None else None,
+                    "errorRate": round(s.error_rate, 3),
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "score": round(self._score(s, now)),
+                }
+                for region, s in self._stats.items()
+            }
+
+
+def http_probe(url: str, timeout: float = 2.0) -> float | None:
+    """Round trip of an unauthenticated GET in ms; any HTTP answer counts."""
+    started = time.perf_counter()
+    try:
+        urllib.request.urlopen(url, timeout=timeout).close()
+    except urllib.error.HTTPError:
+        pass
+    except (OSError, ValueError):
+        return None
+    return (time.perf_counter() - started) * 1000
+
+
+def _parse_endpoints(raw: str) -> dict[str, str]:
+    """``us-east-1=http://127.0.0.1:8001,us-west-2=...`` into a map."""
+    endpoints = {}
+    for entry in raw.split(","):
+        region, _, url = entry.partition("=")
+        if region.strip() and url.strip():
+            endpoints[region.strip()] = url.strip()
+    return endpoints
+
+
+def region_guard(region: str, selector: RegionSelector):
+    """The shared guard with one region; otherwise one guard per region, so a
+    throttled region opens only its own breaker and fails over quickly."""
+    if len(selector.regions) == 1:
+        return get_guard()
+    return get_guard(
+        f"bedrock:{region}", max_retries=int(os.getenv("BEDROCK_REGION_RETRIES", "1"))
+    )
+
+
+_selectors: dict[str, RegionSelector] = {}
+
+
+def get_region_selector(
+    name: str,
+    default_region: str,
+    *,
+    endpoints_env: str = "BEDROCK_ENDPOINT_URLS",
+    default_endpoint: str | None = None,
+) -> RegionSelector:
+    """Process-wide selector per workload; BEDROCK_REGIONS overrides the region.
+
+    Endpoint overrides come from ``endpoints_env``; ``default_endpoint`` applies
+    to regions it does not name.
+    """
+    selector = _selectors.get(name)
+    if selector is None:
+        regions = [r.strip() for r in os.getenv("BEDROCK_REGIONS", "").split(",") if r.strip()]
+        regions = regions or [default_region]
+        endpoints = _parse_endpoints(os.getenv(endpoints_env, ""))
+        if default_endpoint:
+            for region in regions:
+                endpoints.setdefault(region, default_endpoint)
+        selector = RegionSelector(
+            regions,
+            endpoints=endpoints,
+            cooldown=float(os.getenv("BEDROCK_REGION_COOLDOWN_SECONDS", "30")),
+            explore=float(os.getenv("BEDROCK_REGION_EXPLORE", "0.05")),
+        )
+        _selectors[name] = selector
+    return selector
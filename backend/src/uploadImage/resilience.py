@@ -0,0 +1,315 @@
+"""
+Client-side protection for Bedrock calls, shared by the image Lambda and the
+voice server: token-bucket rate limiting, exponential backoff with full
+jitter on throttling/unavailability errors, and a circuit breaker that fails
+fast while Bedrock is unhealthy.
+
+Only the standard library is used so the module works in both runtimes.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+# Error codes worth retrying — both botocore ClientError codes and the class
+# names raised by the smithy-based bidirectional streaming SDK
+RETRYABLE_ERRORS = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ServiceUnavailable",
+    "ModelNotReadyException",
+    "InternalServerException",
+}
+
+# Bedrock could not be reached at all: not retried here (regions.py fails
+# over instead) but counted against the breaker like an outage
+NETWORK_ERRORS = {
+    "EndpointConnectionError",
+    "ConnectTimeoutError",
+    "ReadTimeoutError",
+    "ConnectionClosedError",
+    "TimeoutError",
+    "ConnectionError",
+    "ConnectionRefusedError",
+    "ConnectionResetError",
+    "gaierror",
+}
+
+# Bedrock answered and rejected the request itself, so it is healthy
+CLIENT_ERRORS = {
+    "ValidationException",
+    "AccessDeniedException",
+    "ResourceNotFoundException",
+    "ServiceQuotaExceededException",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Bedrock while the breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+def error_code(exc: BaseException) -> str:
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        if code:
+            return code
+    return type(exc).__name__
+
+
+def is_retryable(exc: BaseException) -> bool:
+    return error_code(exc) in RETRYABLE_ERRORS
+
+
+def is_client_error(exc: BaseException) -> bool:
+    """A 4xx answer from Bedrock (other than throttling)."""
+    if is_retryable(exc):
+        return False
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if status:
+            return 400 <= int(status) < 500
+    return error_code(exc) in CLIENT_ERRORS
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> float | None:
+        """None if the call may proceed, else seconds until the next probe."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - now
+                if remaining > 0:
+                    return remaining
+                # Let exactly one probe through
+                self.state = self.HALF_OPEN
+                self._probe_started = now
+                return None
+            if self.state == self.HALF_OPEN:
+                remaining = self._probe_started + self.reset_timeout - now
+                if remaining > 0:
+                    return remaining
+                # The probe never reported back; let another one through
+                self._probe_started = now
+                return None
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> bool:
+        """Count an outage-like failure; True if this call opened the breaker."""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                opened = self.state != self.OPEN
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                return opened
+            return False
+
+
+class BedrockGuard:
+    def __init__(
+        self,
+        name: str,
+        *,
+        rate: float = 5.0,
+        burst: float = 10.0,
+        max_retries: int = 4,
+        base_delay: float = 0.2,
+        max_delay: float = 4.0,
+        max_elapsed: float = 20.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 15.0,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Stay well inside the 30 s Lambda timeout
+        self.max_elapsed = max_elapsed
+        self.counters = {
+            "calls": 0,
+            "retries": 0,
+            "throttled": 0,
+            "failures": 0,
+            "rejected": 0,
+            "breakerOpened": 0,
+            "rateLimitedMs": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counters[key] += n
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps a burst of clients from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _admit(self) -> float:
+        retry_after = self.breaker.before_call()
+        if retry_after is not None:
+            self._count("rejected")
+            raise CircuitOpenError(self.name, retry_after)
+        wait = self.bucket.reserve()
+        if wait:
+            self._count("rateLimitedMs", int(wait * 1000))
+        return wait
+
+    def _on_error(self, exc: Exception, attempt: int, started: float) -> float:
+        """Return the delay before retrying, or re-raise."""
+        if not is_retryable(exc):
+            if is_client_error(exc):
+                # Bedrock answered (e.g. a validation error), so it is healthy
+                self.breaker.record_success()
+            elif self.breaker.record_failure():
+                # Unreachable, timed out or failed in an unknown way
+                self._count("breakerOpened")
+            self._count("failures")
+            raise exc
+        self._count("throttled")
+        if self.breaker.record_failure():
+            self._count("breakerOpened")
+        delay = self._backoff(attempt)
+        if (
+            attempt >= self.max_retries
+            or self.breaker.state == CircuitBreaker.OPEN
+            or time.monotonic() - started + delay > self.max_elapsed
+        ):
+            self._count("failures")
+            raise exc
+        self._count("retries")
+        return delay
+
+    def _abandoned(self):
+        """The call was cancelled (client gone) or hit a BaseException.
+
+        Only a half-open probe's outcome matters: count it as failed so the
+        breaker reopens instead of waiting on a result that never comes.
+        """
+        if self.breaker.state == CircuitBreaker.HALF_OPEN and self.breaker.record_failure():
+            self._count("breakerOpened")
+
+    def call(self, fn, *args, **kwargs):
+        """Run a blocking Bedrock call with rate limiting, retries and the breaker."""
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            wait = self._admit()
+            if wait:
+                time.sleep(wait)
+            self._count("calls")
+            reported = False
+            try:
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as exc:
+                    reported = True
+                    delay = self._on_error(exc, attempt, started)
+                else:
+                    reported = True
+                    self.breaker.record_success()
+                    return result
+            finally:
+                if not reported:
+                    self._abandoned()
+            time.sleep(delay)
+
+    async def acall(self, fn, *args, **kwargs):
+        """Async twin of ``call`` for coroutine functions (voice bridge)."""
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            wait = self._admit()
+            if wait:
+                await asyncio.sleep(wait)
+            self._count("calls")
+            reported = False
+            try:
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as exc:
+                    reported = True
+                    delay = self._on_error(exc, attempt, started)
+                else:
+                    reported = True
+                    self.breaker.record_success()
+                    return result
+            finally:
+                if not reported:
+                    self._abandoned()
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"breaker": self.breaker.state, **self.counters}
+
+
+_guards: dict[str, BedrockGuard] = {}
+
+
+def get_guard(name: str = "bedrock", **overrides) -> BedrockGuard:
+    """Process-wide guard per upstream, tuned through BEDROCK_* env vars.
+
+    ``overrides`` (BedrockGuard keyword arguments) apply when the guard is created.
+    """
+    guard = _guards.get(name)
+    if guard is None:
+        settings = {
+            "rate": float(os.getenv("BEDROCK_RATE_PER_SEC", "5")),
+            "burst": float(os.getenv("BEDROCK_BURST", "10")),
+            "max_retries": int(os.getenv("BEDROCK_MAX_RETRIES", "4")),
+            "max_elapsed": float(os.getenv("BEDROCK_MAX_RETRY_SECONDS", "20")),
+            "failure_threshold": int(os.getenv("BEDROCK_BREAKER_THRESHOLD", "5")),
+            "reset_timeout": float(os.getenv("BEDROCK_BREAKER_RESET_SECONDS", "15")),
+        }
+        guard = BedrockGuard(name, **{**settings, **overrides})
+        _guards[name] = guard
+    return guard
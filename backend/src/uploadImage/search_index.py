@@ -0,0 +1,336 @@
+"""
+Incremental full-text index over a user's analyses and voice transcripts.
+
+Every indexed text becomes a small immutable segment under
+``search/<user>/`` (in S3, or a local directory in dev), so adding a document
+never rewrites what is already there. A query merges the user's segments and
+ranks documents with BM25. Because segments never change, a container keeps
+the ones it has read, and a warm query costs one LIST plus any segments added
+since. Once a user has SEARCH_COMPACT_SEGMENTS segments they are merged into
+one, which keeps both the listing and the total index size small.
+"""
+
+import datetime
+import gzip
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import quote
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its my of on "
+    "or so that the this to was were will with you your".split()
+)
+SNIPPET_CHARS = 160
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token
+        for token in _TOKEN.findall(text.lower())
+        if token not in _STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def _user_key(user_id: str) -> str:
+    return quote(user_id, safe="")
+
+
+def build_segment(docs: list[dict]) -> dict:
+    """Compact form: docs as rows, postings as (row, term frequency) pairs.
+
+    Each doc dict has id, recordId, kind, createdAt, category and text.
+    """
+    rows, terms = [], {}
+    for row, doc in enumerate(docs):
+        tokens = tokenize(doc["text"])
+        counts: dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            terms.setdefault(token, []).append([row, tf])
+        rows.append(
+            [
+                doc["id"],
+                doc["recordId"],
+                doc.get("kind", "analysis"),
+                len(tokens),
+                doc.get("createdAt", ""),
+                doc.get("category", ""),
+                doc.get("snippet") or " ".join(doc["text"].split())[:SNIPPET_CHARS],
+            ]
+        )
+    return {"v": 1, "docs": rows, "terms": terms}
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def analysis_document(record_id: str, text: str, details: dict | None = None) -> dict:
+    details = details or {}
+    extra = [details.get("category") or "", details.get("brand") or ""]
+    return {
+        "id": record_id,
+        "recordId": record_id,
+        "kind": "analysis",
+        "createdAt": _now(),
+        "category": details.get("category") or "",
+        "text": " ".join([text, *extra, *details.get("symptoms", [])]),
+        "snippet": " ".join(text.split())[:SNIPPET_CHARS],
+    }
+
+
+def transcript_document(session_id: str, seq: int, lines: list[str]) -> dict:
+    """One flushed transcript batch (JSON lines of {role, content})."""
+    contents = []
+    for line in lines:
+        try:
+            contents.append(json.loads(line).get("content", ""))
+        except (json.JSONDecodeError, AttributeError):
+            continue
+    text = " ".join(contents)
+    return {
+        "id": f"{session_id}:{seq}",
+        "recordId": session_id,
+        "kind": "voice",
+        "createdAt": _now(),
+        "text": text,
+    }
+
+
+class LocalSegmentStore:
+    """Dev backend: ``<dir>/<user>/<segment>.json.gz`` files."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def names(self, user_key: str) -> list[str]:
+        try:
+            names = os.listdir(os.path.join(self.directory, user_key))
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if not name.startswith("."))
+
+    def get(self, user_key: str, name: str) -> bytes:
+        with open(os.path.join(self.directory, user_key, name), "rb") as f:
+            return f.read()
+
+    def put(self, user_key: str, name: str, data: bytes):
+        path = os.path.join(self.directory, user_key)
+        os.makedirs(path, exist_ok=True)
+        # Write then rename so a reader never sees half a segment
+        tmp = os.path.join(path, f".{name}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(path, name))
+
+    def delete(self, user_key: str, names: list[str]):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, user_key, name))
+            except FileNotFoundError:
+                pass
+
+
+class S3SegmentStore:
+    def __init__(self, s3, bucket: str, prefix: str = "search/"):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def names(self, user_key: str) -> list[str]:
+        prefix = f"{self.prefix}{user_key}/"
+        names, token = [], None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+            if token:
+                kwargs["ContinuationToken"] = token
+            response = self.s3.list_objects_v2(**kwargs)
+            names.extend(obj["Key"][len(prefix):] for obj in response.get("Contents", []))
+            token = response.get("NextContinuationToken")
+            if not token:
+                return sorted(names)
+
+    def get(self, user_key: str, name: str) -> bytes:
+        key = f"{self.prefix}{user_key}/{name}"
+        return self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def put(self, user_key: str, name: str, data: bytes):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{user_key}/{name}",
+            Body=data,
+            ContentType="application/gzip",
+        )
+
+    def delete(self, user_key: str, names: list[str]):
+        for start in range(0, len(names), 1000):
+            self.s3.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    "Objects": [
+                        {"Key": f"{self.prefix}{user_key}/{name}"}
+                        for name in names[start : start + 1000]
+                    ],
+                    "Quiet": True,
+                },
+            )
+
+
+class SearchIndex:
+    def __init__(self, store, *, compact_at: int = 8, cache_segments: int = 256):
+        self.store = store
+        self.compact_at = compact_at
+        self.cache_segments = cache_segments
+        self._segments: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, user_key: str, name: str) -> dict:
+        with self._lock:
+            segment = self._segments.get((user_key, name))
+            if segment is not None:
+                self._segments.move_to_end((user_key, name))
+                return segment
+        segment = json.loads(gzip.decompress(self.store.get(user_key, name)))
+        with self._lock:
+            self._segments[(user_key, name)] = segment
+            while len(self._segments) > self.cache_segments:
+                self._segments.popitem(last=False)
+        return segment
+
+    def _write(self, user_key: str, segment: dict) -> str:
+        # Names sort by creation time, so later segments win on duplicate ids
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json.gz"
+        data = gzip.compress(json.dumps(segment, separators=(",", ":")).encode("utf-8"))
+        self.store.put(user_key, name, data)
+        with self._lock:
+            self._segments[(user_key, name)] = segment
+        return name
+
+    def add(self, user_id: str, docs: list[dict]):
+        """Index new documents for ``user_id``; compacts when segments pile up."""
+        user_key = _user_key(user_id)
+        self._write(user_key, build_segment(docs))
+        names = self.store.names(user_key)
+        if len(names) >= self.compact_at:
+            self.compact(user_id, names)
+
+    def _merged(self, user_key: str, names: list[str]) -> tuple[dict, dict]:
+        """doc id -> row, and term -> {doc id: tf}, across segments."""
+        docs, postings = {}, {}
+        for name in names:
+            segment = self._load(user_key, name)
+            rows = segment["docs"]
+            for row in rows:
+                docs[row[0]] = row
+            for term, entries in segment["terms"].items():
+                merged = postings.setdefault(term, {})
+                for row_index, tf in entries:
+                    merged[rows[row_index][0]] = tf
+        return docs, postings
+
+    def compact(self, user_id: str, names: list[str] | None = None):
+        """Merge the given (default: all) segments into one.
+
+        Only segments that were read are deleted, so documents added while
+        compacting survive; two compactions racing merely leave duplicate
+        documents, which queries collapse by id.
+        """
+        user_key = _user_key(user_id)
+        names = names if names is not None else self.store.names(user_key)
+        if len(names) < 2:
+            return
+        docs, postings = self._merged(user_key, names)
+        row_of = {doc_id: i for i, doc_id in enumerate(docs)}
+        segment = {
+            "v": 1,
+            "docs": list(docs.values()),
+            "terms": {
+                term: [[row_of[doc_id], tf] for doc_id, tf in entries.items()]
+                for term, entries in postings.items()
+            },
+        }
+        self._write(user_key, segment)
+        self.store.delete(user_key, names)
+        with self._lock:
+            for name in names:
+                self._segments.pop((user_key, name), None)
+
+    def search(self, user_id: str, query: str, limit: int = 20) -> list[dict]:
+        """Records ranked by their best-matching document (BM25)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        user_key = _user_key(user_id)
+        try:
+            segments = [self._load(user_key, n) for n in self.store.names(user_key)]
+        except Exception:
+            # A compaction removed a listed segment; its merged copy is listed now
+            segments = [self._load(user_key, n) for n in self.store.names(user_key)]
+
+        # Only the query terms' postings are touched, segment by segment; a
+        # document duplicated by a racing compaction keeps its best score
+        n = sum(len(segment["docs"]) for segment in segments)
+        if not n:
+            return []
+        average_length = sum(row[3] for seg in segments for row in seg["docs"]) / n or 1
+        df = {t: sum(len(seg["terms"].get(t, ())) for seg in segments) for t in terms}
+
+        scores: dict[str, float] = {}
+        docs: dict[str, list] = {}
+        for segment in segments:
+            rows = segment["docs"]
+            segment_scores: dict[int, float] = {}
+            for term in terms:
+                entries = segment["terms"].get(term)
+                if not entries:
+                    continue
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                for row_index, tf in entries:
+                    length = rows[row_index][3]
+                    norm = tf + _K1 * (1 - _B + _B * length / average_length)
+                    segment_scores[row_index] = (
+                        segment_scores.get(row_index, 0.0) + idf * tf * (_K1 + 1) / norm
+                    )
+            for row_index, score in segment_scores.items():
+                doc_id = rows[row_index][0]
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+                    docs[doc_id] = rows[row_index]
+
+        best: dict[str, dict] = {}
+        for doc_id, score in scores.items():
+            _, record_id, kind, _, created_at, category, snippet = docs[doc_id]
+            if record_id not in best or score > best[record_id]["score"]:
+                best[record_id] = {
+                    "id": record_id,
+                    "kind": kind,
+                    "score": round(score, 4),
+                    "createdAt": created_at,
+                    "category": category,
+                    "snippet": snippet,
+                }
+        ranked = sorted(best.values(), key=lambda r: (-r["score"], r["createdAt"]))
+        return ranked[:limit]
+
+
+def create_search_index(s3=None, bucket: str | None = None) -> SearchIndex | None:
+    """SEARCH_INDEX_DIR for a local index, else S3 under search/; None without either."""
+    compact_at = int(os.getenv("SEARCH_COMPACT_SEGMENTS", "8"))
+    directory = os.getenv("SEARCH_INDEX_DIR")
+    if directory:
+        return SearchIndex(LocalSegmentStore(directory), compact_at=compact_at)
+    if s3 is not None and bucket:
+        return SearchIndex(S3SegmentStore(s3, bucket), compact_at=compact_at)
+    return None
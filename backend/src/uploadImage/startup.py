@@ -0,0 +1,103 @@
+"""
+Cold-start bookkeeping for the uploadImage Lambda.
+
+Set STARTUP_PROFILE=1 to log per-phase import/init timings on the first
+invocation; the total init time and whether the container was cold are always
+logged once. Warm-up hooks run before a SnapStart snapshot (or eagerly during
+init when WARM_UP_ON_INIT=1) so the work is done once and reused.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+_process_start = time.perf_counter()
+_phases: dict[str, float] = {}
+_warm_up_hooks = []
+_reported = False
+
+PROFILE = os.getenv("STARTUP_PROFILE") == "1"
+
+
+def _install_import_timer():
+    """Time every outermost first-time import made after this module loads."""
+    import builtins
+    import sys
+
+    original_import = builtins.__import__
+    depth = 0
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        nonlocal depth
+        if level or name in sys.modules or depth:
+            return original_import(name, globals, locals, fromlist, level)
+        depth += 1
+        started = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            depth -= 1
+            _phases[f"import {name}"] = round(
+                (time.perf_counter() - started) * 1000, 2
+            )
+
+    builtins.__import__ = timed_import
+
+
+if PROFILE:
+    _install_import_timer()
+
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[phase] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def on_warm_up(fn):
+    """Register ``fn`` to run during warm-up (decorator)."""
+    _warm_up_hooks.append(fn)
+    return fn
+
+
+def warm_up():
+    for fn in _warm_up_hooks:
+        with timed(f"warm_up {fn.__name__}"):
+            fn()
+
+
+def init_done():
+    """Mark the end of module init and run warm-up if this deployment wants it."""
+    try:
+        from snapshot_restore_py import register_before_snapshot
+    except ImportError:
+        register_before_snapshot = None
+
+    if register_before_snapshot:
+        # SnapStart: warm up once, then every restored container reuses it
+        register_before_snapshot(warm_up)
+    elif os.getenv("WARM_UP_ON_INIT") == "1":
+        warm_up()
+    _phases["init total"] = round((time.perf_counter() - _process_start) * 1000, 2)
+
+
+def report_cold_start(invoke_started: float):
+    """Log init timings once, at the end of this container's first invocation,
+    so lazily created clients are included."""
+    global _reported
+    if _reported:
+        return
+    _reported = True
+
+    record = {
+        "coldStart": True,
+        "initMs": _phases.get("init total"),
+        "firstInvokeMs": round((time.perf_counter() - invoke_started) * 1000, 2),
+    }
+    if PROFILE:
+        record["phases"] = dict(_phases)
+    print(json.dumps(record))
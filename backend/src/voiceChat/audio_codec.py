@@ -0,0 +1,180 @@
+import base64
+import binascii
+
+try:
+    import opuslib
+except Exception:  # opuslib or libopus missing — only raw PCM is offered
+    opuslib = None
+
+# Nova Sonic's fixed PCM formats (16-bit mono)
+INPUT_SAMPLE_RATE = 16000
+OUTPUT_SAMPLE_RATE = 24000
+
+# 20 ms Opus frames; the largest legal packet duration is 120 ms
+_FRAME_MS = 20
+_MAX_FRAME_MS = 120
+_OPUS_BITRATE = 24000
+
+CODEC_PCM = "pcm"
+CODEC_OPUS = "opus"
+
+
+def available_codecs() -> list[str]:
+    """Codecs this server can speak, most preferred first."""
+    codecs = [CODEC_PCM]
+    if opuslib is not None:
+        codecs.insert(0, CODEC_OPUS)
+    return codecs
+
+
+def negotiate_codec(requested: list[str] | None) -> str:
+    """Pick the first client-requested codec the server supports, else PCM."""
+    supported = available_codecs()
+    for name in requested or []:
+        if name.strip().lower() in supported:
+            return name.strip().lower()
+    return CODEC_PCM
+
+
+class FrameSplitter:
+    """Cuts a PCM byte stream into fixed-size frames.
+
+    Nova's audio chunks are not frame-aligned, so the tail of one chunk is
+    carried into the next; at the end of a reply it is padded with silence.
+    """
+
+    def __init__(self, frame_bytes: int):
+        self.frame_bytes = frame_bytes
+        self._pending = b""
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def push(self, pcm: bytes) -> list[bytes]:
+        pcm = self._pending + pcm
+        usable = len(pcm) - len(pcm) % self.frame_bytes
+        self._pending = pcm[usable:]
+        return [pcm[i : i + self.frame_bytes] for i in range(0, usable, self.frame_bytes)]
+
+    def flush(self) -> bytes | None:
+        """The carried tail as one silence-padded frame, if there is one."""
+        if not self._pending:
+            return None
+        frame = self._pending + bytes(self.frame_bytes - len(self._pending))
+        self._pending = b""
+        return frame
+
+    def reset(self):
+        """Drop the carried tail (the reply was interrupted)."""
+        self._pending = b""
+
+
+class PcmCodec:
+    """Pass-through transport: base64 LPCM in both directions."""
+
+    name = CODEC_PCM
+    dropped_packets = 0
+
+    def describe(self) -> dict:
+        return {
+            "codec": self.name,
+            "input": {
+                "mediaType": "audio/lpcm",
+                "sampleRateHertz": INPUT_SAMPLE_RATE,
+                "sampleSizeBits": 16,
+                "channelCount": 1,
+            },
+            "output": {
+                "mediaType": "audio/lpcm",
+                "sampleRateHertz": OUTPUT_SAMPLE_RATE,
+                "sampleSizeBits": 16,
+                "channelCount": 1,
+            },
+        }
+
+    def decode_input(self, content: str) -> str:
+        return content
+
+    def encode_output(self, event: dict) -> dict:
+        return event
+
+    def flush(self) -> dict | None:
+        return None
+
+    def reset(self):
+        pass
+
+
+class OpusCodec:
+    """Opus transport: the client sends one base64 Opus packet per
+    ``audio_chunk`` and receives a list of 20 ms packets per ``assistant_audio``.
+    Nova still sees plain LPCM on both sides."""
+
+    name = CODEC_OPUS
+
+    def __init__(self, bitrate: int = _OPUS_BITRATE):
+        if opuslib is None:
+            raise RuntimeError("opuslib is not installed")
+        self._decoder = opuslib.Decoder(INPUT_SAMPLE_RATE, 1)
+        self._encoder = opuslib.Encoder(OUTPUT_SAMPLE_RATE, 1, "voip")
+        self._encoder.bitrate = bitrate
+        self._max_decode_samples = INPUT_SAMPLE_RATE * _MAX_FRAME_MS // 1000
+        self._frame_samples = OUTPUT_SAMPLE_RATE * _FRAME_MS // 1000
+        self._frames = FrameSplitter(self._frame_samples * 2)
+        # Client packets that were not valid Opus (or base64) and were skipped
+        self.dropped_packets = 0
+
+    def describe(self) -> dict:
+        return {
+            "codec": self.name,
+            "input": {
+                "mediaType": "audio/opus",
+                "sampleRateHertz": INPUT_SAMPLE_RATE,
+                "channelCount": 1,
+            },
+            "output": {
+                "mediaType": "audio/opus",
+                "sampleRateHertz": OUTPUT_SAMPLE_RATE,
+                "channelCount": 1,
+                "frameDurationMs": _FRAME_MS,
+            },
+        }
+
+    def decode_input(self, content: str) -> str:
+        """Base64 LPCM, or "" for a packet that cannot be decoded."""
+        try:
+            packet = base64.b64decode(content, validate=True)
+            pcm = self._decoder.decode(packet, self._max_decode_samples)
+        except (binascii.Error, opuslib.OpusError) as e:
+            # One corrupt or oversized packet costs 20 ms of audio, not the session
+            self.dropped_packets += 1
+            if self.dropped_packets == 1 or self.dropped_packets % 100 == 0:
+                print(f"dropped Opus packet ({self.dropped_packets} so far): {e}")
+            return ""
+        return base64.b64encode(pcm).decode("utf-8")
+
+    def _packets(self, frames: list[bytes]) -> dict:
+        packets = [
+            base64.b64encode(self._encoder.encode(frame, self._frame_samples)).decode("utf-8")
+            for frame in frames
+        ]
+        return {**self.describe()["output"], "packets": packets}
+
+    def encode_output(self, event: dict) -> dict:
+        return self._packets(self._frames.push(base64.b64decode(event.get("content", ""))))
+
+    def flush(self) -> dict | None:
+        """The end of the reply: the carried partial frame, padded with silence."""
+        frame = self._frames.flush()
+        return self._packets([frame]) if frame is not None else None
+
+    def reset(self):
+        """Barge-in: the carried audio belongs to a reply nobody will hear."""
+        self._frames.reset()
+
+
+def create_codec(name: str) -> PcmCodec | OpusCodec:
+    if name == CODEC_OPUS:
+        return OpusCodec()
+    return PcmCodec()
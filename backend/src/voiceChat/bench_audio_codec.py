@@ -0,0 +1,111 @@
+"""
+Benchmark the /ws/nova audio transports: server CPU per session vs. wire bytes.
+
+Run from backend/src:  python -m voiceChat.bench_audio_codec [seconds]
+"""
+
+import base64
+import json
+import math
+import struct
+import sys
+import time
+
+from voiceChat.audio_codec import (
+    CODEC_OPUS,
+    INPUT_SAMPLE_RATE,
+    OUTPUT_SAMPLE_RATE,
+    OpusCodec,
+    PcmCodec,
+    available_codecs,
+    opuslib,
+)
+
+# Browser-side chunking: 1024 samples in, Nova sends ~1 s of audio per burst
+INPUT_CHUNK_SAMPLES = 1024
+OUTPUT_CHUNK_SAMPLES = 2400
+
+
+def _voice_like_pcm(sample_rate: int, seconds: float) -> bytes:
+    """A few amplitude-modulated harmonics — closer to speech than a pure tone."""
+    samples = []
+    for n in range(int(sample_rate * seconds)):
+        t = n / sample_rate
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 3 * t)
+        value = sum(
+            math.sin(2 * math.pi * f * t) / (i + 1)
+            for i, f in enumerate((140, 280, 420, 700))
+        )
+        samples.append(int(6000 * envelope * value))
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+def _chunks(pcm: bytes, samples: int) -> list[bytes]:
+    size = samples * 2
+    return [pcm[i : i + size] for i in range(0, len(pcm), size)]
+
+
+def _wire_bytes(message: dict) -> int:
+    return len(json.dumps(message, separators=(",", ":")))
+
+
+def bench(seconds: float) -> dict:
+    mic_pcm = _voice_like_pcm(INPUT_SAMPLE_RATE, seconds)
+    nova_pcm = _voice_like_pcm(OUTPUT_SAMPLE_RATE, seconds)
+    results = {}
+
+    # PCM: the server only relays base64 strings
+    pcm = PcmCodec()
+    inbound = [base64.b64encode(c).decode("utf-8") for c in _chunks(mic_pcm, INPUT_CHUNK_SAMPLES)]
+    outbound = [base64.b64encode(c).decode("utf-8") for c in _chunks(nova_pcm, OUTPUT_CHUNK_SAMPLES)]
+    start = time.process_time()
+    in_bytes = sum(_wire_bytes({"type": "audio_chunk", "content": pcm.decode_input(c)}) for c in inbound)
+    out_bytes = sum(
+        _wire_bytes({"type": "assistant_audio", **pcm.encode_output({"content": c})})
+        for c in outbound
+    )
+    results["pcm"] = (time.process_time() - start, in_bytes, out_bytes)
+
+    if CODEC_OPUS in available_codecs():
+        # Simulate the browser's encoder to produce realistic inbound packets
+        client = opuslib.Encoder(INPUT_SAMPLE_RATE, 1, "voip")
+        frame = INPUT_SAMPLE_RATE // 50
+        packets = [
+            base64.b64encode(client.encode(c, frame)).decode("utf-8")
+            for c in _chunks(mic_pcm, frame)
+            if len(c) == frame * 2
+        ]
+        opus = OpusCodec()
+        start = time.process_time()
+        in_bytes = 0
+        for p in packets:
+            opus.decode_input(p)
+            in_bytes += _wire_bytes({"type": "audio_chunk", "content": p})
+        out_bytes = sum(
+            _wire_bytes({"type": "assistant_audio", **opus.encode_output({"content": c})})
+            for c in outbound
+        )
+        results["opus"] = (time.process_time() - start, in_bytes, out_bytes)
+
+    return results
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    results = bench(seconds)
+    if CODEC_OPUS not in results:
+        print("opuslib not available — only PCM measured")
+
+    print(f"{seconds:.0f} s of audio in each direction\n")
+    print(f"{'codec':<6} {'cpu ms/s':>9} {'core %':>7} {'in KB/s':>8} {'out KB/s':>9} {'sessions/core':>14}")
+    for name, (cpu, in_bytes, out_bytes) in results.items():
+        cpu_per_s = cpu / seconds
+        sessions = 1 / cpu_per_s if cpu_per_s else float("inf")
+        print(
+            f"{name:<6} {cpu_per_s * 1000:>9.2f} {cpu_per_s * 100:>7.2f} "
+            f"{in_bytes / seconds / 1024:>8.1f} {out_bytes / seconds / 1024:>9.1f} {sessions:>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
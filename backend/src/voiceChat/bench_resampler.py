@@ -0,0 +1,95 @@
+"""
+Benchmark server-side input normalization (voiceChat/resampler.py).
+
+Measures the cost of one 20 ms client frame per input format (base64 decode,
+downmix, polyphase resample, int16 encode, base64 encode), then runs many
+sessions side by side, each with its own filter state, to show how many fit
+on one core in real time.
+
+Run from backend/src:  python -m voiceChat.bench_resampler [--sessions 100] [--seconds 10]
+"""
+
+import argparse
+import base64
+import time
+
+import numpy as np
+
+from voiceChat.resampler import SAMPLE_FORMATS, InputNormalizer
+
+FRAME_MS = 20
+FORMATS = [
+    (48000, "f32", 1),
+    (48000, "s16", 1),
+    (44100, "f32", 1),
+    (44100, "s16", 2),
+    (22050, "s16", 1),
+]
+
+
+def _client_audio(sample_rate: int, sample_format: str, channels: int, seconds: float) -> bytes:
+    """Amplitude-modulated harmonics, as the client would capture them."""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 700)))
+    samples = (0.2 * envelope * voice).astype(np.float32)
+    samples = np.repeat(samples[:, None], channels, axis=1).reshape(-1)
+    if sample_format == "s16":
+        samples = (samples * 32767).astype("<i2")
+    return samples.astype(SAMPLE_FORMATS[sample_format]).tobytes()
+
+
+def _frames(sample_rate: int, sample_format: str, channels: int, seconds: float) -> list[str]:
+    audio = _client_audio(sample_rate, sample_format, channels, seconds)
+    size = sample_rate * FRAME_MS // 1000 * SAMPLE_FORMATS[sample_format].itemsize * channels
+    return [base64.b64encode(audio[i : i + size]).decode("ascii") for i in range(0, len(audio), size)]
+
+
+def bench_frames(seconds: float):
+    print(f"per {FRAME_MS} ms frame, single session\n")
+    print(f"{'format':<16} {'us/frame':>9} {'core %':>7} {'sessions/core':>14}")
+    for rate, fmt, channels in FORMATS:
+        frames = _frames(rate, fmt, channels, seconds)
+        normalizer = InputNormalizer(rate, fmt, channels)
+        start = time.process_time()
+        for frame in frames:
+            normalizer.process(frame)
+        per_frame = (time.process_time() - start) / len(frames)
+        share = per_frame / (FRAME_MS / 1000)
+        print(
+            f"{f'{rate} {fmt} x{channels}':<16} {per_frame * 1e6:>9.1f} "
+            f"{share * 100:>7.2f} {1 / share:>14.0f}"
+        )
+
+
+def bench_sessions(sessions: int, seconds: float):
+    """Round-robin over independent sessions, like the event loop would."""
+    formats = [FORMATS[i % len(FORMATS)] for i in range(sessions)]
+    streams = [_frames(*f, seconds) for f in formats]
+    normalizers = [InputNormalizer(*f) for f in formats]
+    count = min(len(s) for s in streams)
+
+    start = time.process_time()
+    for i in range(count):
+        for normalizer, frames in zip(normalizers, streams):
+            normalizer.process(frames[i])
+    cpu = time.process_time() - start
+    audio_seconds = count * FRAME_MS / 1000
+    print(
+        f"\n{sessions} concurrent sessions (mixed formats), {audio_seconds:.0f} s of audio each: "
+        f"{cpu:.2f} s CPU = {cpu / audio_seconds * 100:.1f}% of one core "
+        f"({'fits' if cpu < audio_seconds else 'does NOT fit'} in real time)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+    bench_frames(args.seconds)
+    bench_sessions(args.sessions, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
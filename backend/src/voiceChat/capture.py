@@ -0,0 +1,201 @@
+"""
+Session capture for reproducible voice benchmarks.
+
+With VOICE_CAPTURE_DIR set, every /ws/nova session (or a VOICE_CAPTURE_SAMPLE
+share of them) gets a SessionRecorder. The bridge hands it what the client
+sent and what Nova answered, each stamped with seconds since the session
+started. All of it goes to ``<dir>/<session id>.hfcap``, an append-only
+binary log:
+
+    header  b"HFCAP\\x01\\n\\x00"
+    record  kind u8, 3 pad bytes, t f64, length u32 (little endian), payload
+
+Audio is stored as raw PCM rather than base64 JSON. The client's 16 kHz
+input is sent after codec decoding and resampling, so it is exactly what the
+bridge received. Nova's 24 kHz output keeps only the audio, which is all the
+bridge reads from it. That makes a capture about a quarter smaller than the
+wire traffic. A log cut short by a crash reads up to its last whole record.
+
+CaptureReader maps the file with mmap and yields records without copying;
+voiceChat/replay.py plays a capture back through the bridge. Captures hold
+the user's voice and words, so keep the directory as private as the
+transcripts.
+"""
+
+import base64
+import json
+import mmap
+import os
+import random
+import struct
+import time
+from typing import NamedTuple
+
+MAGIC = b"HFCAP\x01\n\x00"
+_RECORD = struct.Struct("<B3xdI")
+
+META = 0
+CLIENT_START_AUDIO = 1
+CLIENT_AUDIO = 2
+CLIENT_END_AUDIO = 3
+CLIENT_TEXT = 4
+NOVA_EVENT = 5
+NOVA_AUDIO = 6
+
+CLIENT_KINDS = {CLIENT_START_AUDIO, CLIENT_AUDIO, CLIENT_END_AUDIO, CLIENT_TEXT}
+NOVA_KINDS = {NOVA_EVENT, NOVA_AUDIO}
+KIND_NAMES = {
+    META: "meta",
+    CLIENT_START_AUDIO: "start_audio",
+    CLIENT_AUDIO: "audio",
+    CLIENT_END_AUDIO: "end_audio",
+    CLIENT_TEXT: "text",
+    NOVA_EVENT: "nova_event",
+    NOVA_AUDIO: "nova_audio",
+}
+
+
+class SessionRecorder:
+    """Appends one session's traffic to a capture file.
+
+    Writes go through a large userspace buffer, so recording costs the event
+    loop a struct pack and a memory copy per frame; the disk sees a write
+    per megabyte.
+    """
+
+    def __init__(self, path: str, meta: dict | None = None, buffer_size: int = 1 << 20):
+        self.path = path
+        self._file = open(path, "ab", buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._started = time.monotonic()
+        self.records = 0
+        self.bytes = 0
+        if meta is not None:
+            self.record(META, json.dumps(meta).encode("utf-8"))
+
+    def record(self, kind: int, payload: bytes = b""):
+        if self._file.closed:
+            return
+        t = time.monotonic() - self._started
+        self._file.write(_RECORD.pack(kind, t, len(payload)))
+        self._file.write(payload)
+        self.records += 1
+        self.bytes += _RECORD.size + len(payload)
+
+    def client_audio(self, audio_base64: str):
+        self.record(CLIENT_AUDIO, base64.b64decode(audio_base64))
+
+    def client_text(self, content: str):
+        self.record(CLIENT_TEXT, content.encode("utf-8"))
+
+    def nova_event(self, event: dict, raw: bytes):
+        """A decoded Nova output event and the bytes it came from."""
+        audio = event.get("audioOutput")
+        if audio is not None:
+            self.record(NOVA_AUDIO, base64.b64decode(audio.get("content", "")))
+        else:
+            self.record(NOVA_EVENT, raw)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            print(f"capture {self.path}: {self.records} records, {self.bytes} bytes")
+
+
+class Record(NamedTuple):
+    kind: int
+    t: float
+    # A view into the mapped file; copy it (bytes(...)) to keep it past close()
+    payload: memoryview
+
+
+class CaptureReader:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(MAGIC):
+            self._file.close()
+            raise ValueError(f"{path} is not a capture (too short)")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if self._view[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a capture (bad header)")
+
+    def __iter__(self):
+        view, offset, size = self._view, len(MAGIC), len(self._view)
+        while offset + _RECORD.size <= size:
+            kind, t, length = _RECORD.unpack_from(view, offset)
+            start = offset + _RECORD.size
+            if start + length > size:
+                # Torn final record: the process died mid-write
+                break
+            yield Record(kind, t, view[start : start + length])
+            offset = start + length
+
+    def meta(self) -> dict:
+        for record in self:
+            if record.kind == META:
+                return json.loads(bytes(record.payload))
+        return {}
+
+    def summary(self) -> dict:
+        counts: dict[str, int] = {}
+        payload_bytes: dict[str, int] = {}
+        duration = 0.0
+        for record in self:
+            name = KIND_NAMES.get(record.kind, str(record.kind))
+            counts[name] = counts.get(name, 0) + 1
+            payload_bytes[name] = payload_bytes.get(name, 0) + len(record.payload)
+            duration = record.t
+        return {
+            "path": self.path,
+            "meta": self.meta(),
+            "durationSeconds": round(duration, 2),
+            "fileBytes": len(self._view),
+            "records": counts,
+            "payloadBytes": payload_bytes,
+        }
+
+    def close(self):
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            # Records are still referenced; the map closes when they go
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_session_recorder(session_id: str, meta: dict) -> SessionRecorder | None:
+    """A recorder when VOICE_CAPTURE_DIR is set and the session is sampled."""
+    directory = os.getenv("VOICE_CAPTURE_DIR")
+    if not directory:
+        return None
+    if random.random() >= float(os.getenv("VOICE_CAPTURE_SAMPLE", "1")):
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return SessionRecorder(os.path.join(directory, f"{session_id}.hfcap"), meta)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize voice session captures")
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+    for path in args.paths:
+        with CaptureReader(path) as reader:
+            print(json.dumps(reader.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
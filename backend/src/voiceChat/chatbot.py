@@ -1,417 +1,312 @@
-import os
+"""
+Command-line voice client for Nova Sonic, built on NovaSonicBridge.
+
+Run from backend/src:
+    python -m voiceChat.chatbot                      # talk through the microphone
+    python -m voiceChat.chatbot --bench sample.wav   # measure round-trip latency
+"""
+
+import argparse
 import asyncio
 import base64
-import json
-import uuid
-import pyaudio
-from aws_sdk_bedrock_runtime.client import (
-    BedrockRuntimeClient,
-    InvokeModelWithBidirectionalStreamOperationInput,
-)
-from aws_sdk_bedrock_runtime.models import (
-    InvokeModelWithBidirectionalStreamInputChunk,
-    BidirectionalInputPayloadPart,
-)
-from aws_sdk_bedrock_runtime.config import Config
-from smithy_aws_core.identity.environment import EnvironmentCredentialsResolver
+import os
+import threading
+import time
+import wave
+
 from dotenv import load_dotenv
 
+from voiceChat.nova_sonic_bridge import NovaSonicBridge
+from uploadImage.prompts import get_prompt
+
 
 load_dotenv()
 # Audio configuration
 INPUT_SAMPLE_RATE = 16000
 OUTPUT_SAMPLE_RATE = 24000
 CHANNELS = 1
-FORMAT = pyaudio.paInt16
+SAMPLE_WIDTH = 2
 CHUNK_SIZE = 1024
 
+# ~4 s of buffered audio in each direction before the producer starts dropping
+INPUT_RING_BYTES = INPUT_SAMPLE_RATE * SAMPLE_WIDTH * 4
+OUTPUT_RING_BYTES = OUTPUT_SAMPLE_RATE * SAMPLE_WIDTH * 4
+
+
+class RingBuffer:
+    """Single-producer / single-consumer byte ring.
+
+    The producer only advances ``_written`` and the consumer only advances
+    ``_read``, so the audio threads and the event loop never take a lock.
+    """
+
+    def __init__(self, capacity: int):
+        self._buf = bytearray(capacity)
+        self._capacity = capacity
+        self._written = 0
+        self._read = 0
+
+    def available(self) -> int:
+        return self._written - self._read
+
+    def write(self, data: bytes) -> int:
+        """Copy as much of ``data`` as fits; the rest is dropped."""
+        free = self._capacity - self.available()
+        n = min(len(data), free)
+        if n == 0:
+            return 0
+        pos = self._written % self._capacity
+        first = min(n, self._capacity - pos)
+        self._buf[pos : pos + first] = data[:first]
+        self._buf[: n - first] = data[first:n]
+        self._written += n
+        return n
+
+    def read(self, max_bytes: int | None = None) -> bytes:
+        n = self.available()
+        if max_bytes is not None:
+            n = min(n, max_bytes)
+        if n == 0:
+            return b""
+        pos = self._read % self._capacity
+        first = min(n, self._capacity - pos)
+        data = bytes(self._buf[pos : pos + first]) + bytes(self._buf[: n - first])
+        self._read += n
+        return data
+
 
 class SimpleNovaSonic:
     def __init__(self, model_id="amazon.nova-sonic-v1:0", region="us-east-1"):
-        self.model_id = model_id
-        self.region = region
-        self.client: BedrockRuntimeClient = None
-        # live bidirectional connection between your app and Nova Sonic
-        self.stream = None
-        self.response = None
-        self.is_active = False
-        self.prompt_name = str(uuid.uuid4())
-        self.content_name = str(uuid.uuid4())
-        self.audio_content_name = str(uuid.uuid4())
-        self.audio_queue = asyncio.Queue()
-        self.role = None
-        self.display_assistant_text = False
-
-    def _initialize_client(self):
-        """Initialize the Bedrock client."""
-        config = Config(
-            endpoint_uri=f"https://bedrock-runtime.{self.region}.amazonaws.com",
-            region=self.region,
-            aws_credentials_identity_resolver=EnvironmentCredentialsResolver(),
+        self.bridge = NovaSonicBridge(
+            model_id=model_id,
+            region=region,
+            # The CLI keeps the long prompt with worked examples
+            system_prompt=get_prompt("homefix").text,
+            on_text=self._on_text,
+            on_audio=self._on_audio,
+            on_error=self._on_error,
         )
-        self.client = BedrockRuntimeClient(config=config)
-
-    async def send_event(self, event_json):
-        """Send an event to the stream."""
-        event = InvokeModelWithBidirectionalStreamInputChunk(
-            value=BidirectionalInputPayloadPart(bytes_=event_json.encode("utf-8"))
-        )
-        await self.stream.input_stream.send(event)
+        self.input_ring = RingBuffer(INPUT_RING_BYTES)
+        self.output_ring = RingBuffer(OUTPUT_RING_BYTES)
+        self.play_output = True
+
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._input_ready: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        # Timestamps (loop.time()) used by --bench
+        self.first_text_at: float | None = None
+        self.first_audio_at: float | None = None
+        self.last_audio_at: float | None = None
+
+    async def _on_text(self, event: dict):
+        if self.first_text_at is None:
+            self.first_text_at = self._loop.time()
+        print(f"Assistant: {event['content']}")
+
+    async def _on_audio(self, event: dict):
+        now = self._loop.time()
+        if self.first_audio_at is None:
+            self.first_audio_at = now
+        self.last_audio_at = now
+        if self.play_output:
+            self.output_ring.write(base64.b64decode(event["content"]))
+
+    async def _on_error(self, message: str):
+        print(f"Error: {message}")
 
     async def start_session(self):
-        """Start a new session with Nova Sonic."""
-        if not self.client:
-            self._initialize_client()
+        self._loop = asyncio.get_running_loop()
+        self._input_ready = asyncio.Event()
+        await self.bridge.start()
 
-        # Initialize the stream
-        self.stream = await self.client.invoke_model_with_bidirectional_stream(
-            InvokeModelWithBidirectionalStreamOperationInput(model_id=self.model_id)
-        )
-        self.is_active = True
-
-        # Send session start event
-        session_start = """
-        {
-          "event": {
-            "sessionStart": {
-              "inferenceConfiguration": {
-                "maxTokens": 1024,
-                "topP": 0.9,
-                "temperature": 0.7
-              }
-            }
-          }
-        }
-        """
-        await self.send_event(session_start)
-
-        # Send prompt start event
-        prompt_start = f"""
-        {{
-          "event": {{
-            "promptStart": {{
-              "promptName": "{self.prompt_name}",
-              "textOutputConfiguration": {{
-                "mediaType": "text/plain"
-              }},
-              "audioOutputConfiguration": {{
-                "mediaType": "audio/lpcm",
-                "sampleRateHertz": 24000,
-                "sampleSizeBits": 16,
-                "channelCount": 1,
-                "voiceId": "matthew",
-                "encoding": "base64",
-                "audioType": "SPEECH"
-              }}
-            }}
-          }}
-        }}
-        """
-        await self.send_event(prompt_start)
-
-        # Send system prompt
-        text_content_start = f"""
-        {{
-            "event": {{
-                "contentStart": {{
-                    "promptName": "{self.prompt_name}",
-                    "contentName": "{self.content_name}",
-                    "type": "TEXT",
-                    "interactive": false,
-                    "role": "SYSTEM",
-                    "textInputConfiguration": {{
-                        "mediaType": "text/plain"
-                    }}
-                }}
-            }}
-        }}
-        """
-        await self.send_event(text_content_start)
-
-        system_prompt = """You are homeFix, a friendly and practical home maintenance AI assistant. 
-Your job is to help users diagnose and fix problems with home appliances, 
-devices, and household systems — such as Kindle e-readers, TVs, routers, 
-washing machines, microwaves, smart home devices, and more.
-
-When a user describes a problem (by voice or image), you will:
-1. Identify the likely cause of the issue in simple, plain language
-2. Ask one follow-up question if you need more detail before diagnosing
-3. Provide 2-3 clear, step-by-step fixes the user can try themselves
-4. Tell the user honestly if the issue likely requires a professional
-
-Guidelines:
-- Keep responses short and conversational (2-4 sentences max per turn)
-- Avoid technical jargon — speak like a helpful neighbour, not a manual
-- Always prioritize safety first (e.g. unplug before inspecting)
-- If the user shares a photo of an error screen or broken device, 
-  describe what you see and explain what it means
-- If unsure, suggest the most common fix first, then escalate
-
-Examples of problems you handle:
-- Kindle won't turn on or freezes
-- WiFi router keeps dropping connection
-- Washing machine making loud noise
-- Smart TV showing error codes
-- Microwave not heating
-- App login errors on smart devices
-
-You do NOT:
-- Diagnose backend server or cloud service outages
-- Access or request any private user data
-- Handle car, medical, or structural building issues
-
-Always end your first response by asking: 
-"Can you describe what happened just before this issue started?"
-"""
+    def _start_thread(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
 
-        text_input_event = {
-            "event": {
-                "textInput": {
-                    "promptName": self.prompt_name,
-                    "contentName": self.content_name,
-                    "content": system_prompt.strip(),
-                }
-            }
-        }
-        await self.send_event(json.dumps(text_input_event))
-
-        text_content_end = f"""
-        {{
-            "event": {{
-                "contentEnd": {{
-                    "promptName": "{self.prompt_name}",
-                    "contentName": "{self.content_name}"
-                }}
-            }}
-        }}
-        """
-        await self.send_event(text_content_end)
-
-        # Start processing responses
-        self.response = asyncio.create_task(self._process_responses())
-
-    async def start_audio_input(self):
-        """Start audio input stream."""
-        audio_content_start = f"""
-        {{
-            "event": {{
-                "contentStart": {{
-                    "promptName": "{self.prompt_name}",
-                    "contentName": "{self.audio_content_name}",
-                    "type": "AUDIO",
-                    "interactive": true,
-                    "role": "USER",
-                    "audioInputConfiguration": {{
-                        "mediaType": "audio/lpcm",
-                        "sampleRateHertz": 16000,
-                        "sampleSizeBits": 16,
-                        "channelCount": 1,
-                        "audioType": "SPEECH",
-                        "encoding": "base64"
-                    }}
-                }}
-            }}
-        }}
-        """
-        await self.send_event(audio_content_start)
-
-    async def send_audio_chunk(self, audio_bytes):
-        """Send an audio chunk to the stream."""
-        if not self.is_active:
-            return
-
-        blob = base64.b64encode(audio_bytes)
-        audio_event = f"""
-        {{
-            "event": {{
-                "audioInput": {{
-                    "promptName": "{self.prompt_name}",
-                    "contentName": "{self.audio_content_name}",
-                    "content": "{blob.decode('utf-8')}"
-                }}
-            }}
-        }}
-        """
-        await self.send_event(audio_event)
-
-    async def end_audio_input(self):
-        """End audio input stream."""
-        audio_content_end = f"""
-        {{
-            "event": {{
-                "contentEnd": {{
-                    "promptName": "{self.prompt_name}",
-                    "contentName": "{self.audio_content_name}"
-                }}
-            }}
-        }}
-        """
-        await self.send_event(audio_content_end)
-
-    async def end_session(self):
-        """End the session."""
-        if not self.is_active:
-            return
-
-        prompt_end = f"""
-        {{
-            "event": {{
-                "promptEnd": {{
-                    "promptName": "{self.prompt_name}"
-                }}
-            }}
-        }}
-        """
-        await self.send_event(prompt_end)
-
-        session_end = """
-        {
-            "event": {
-                "sessionEnd": {}
-            }
-        }
-        """
-        await self.send_event(session_end)
-        # close the stream
-        await self.stream.input_stream.close()
-
-    async def _process_responses(self):
-        """Process responses from the stream."""
-        try:
-            while self.is_active:
-                output = await self.stream.await_output()
-                result = await output[1].receive()
-
-                if result.value and result.value.bytes_:
-                    response_data = result.value.bytes_.decode("utf-8")
-                    json_data = json.loads(response_data)
-
-                    if "event" in json_data:
-                        # Handle content start event
-                        if "contentStart" in json_data["event"]:
-                            content_start = json_data["event"]["contentStart"]
-                            # set role
-                            self.role = content_start["role"]
-                            # Check for speculative content
-                            if "additionalModelFields" in content_start:
-                                additional_fields = json.loads(
-                                    content_start["additionalModelFields"]
-                                )
-                                if (
-                                    additional_fields.get("generationStage")
-                                    == "SPECULATIVE"
-                                ):
-                                    self.display_assistant_text = True
-                                else:
-                                    self.display_assistant_text = False
-
-                        # Handle text output event
-                        elif "textOutput" in json_data["event"]:
-                            text = json_data["event"]["textOutput"]["content"]
-
-                            if self.role == "ASSISTANT" and self.display_assistant_text:
-                                print(f"Assistant: {text}")
-                            elif self.role == "USER":
-                                print(f"User: {text}")
-
-                        # Handle audio output
-                        elif "audioOutput" in json_data["event"]:
-                            audio_content = json_data["event"]["audioOutput"]["content"]
-                            audio_bytes = base64.b64decode(audio_content)
-                            await self.audio_queue.put(audio_bytes)
-        except Exception as e:
-            print(f"Error processing responses: {e}")
+    def _capture_loop(self):
+        """Microphone thread: blocking reads land in the input ring."""
+        import pyaudio
 
-    async def play_audio(self):
-        """Play audio responses."""
         p = pyaudio.PyAudio()
         stream = p.open(
-            format=FORMAT, channels=CHANNELS, rate=OUTPUT_SAMPLE_RATE, output=True
+            format=pyaudio.paInt16,
+            channels=CHANNELS,
+            rate=INPUT_SAMPLE_RATE,
+            input=True,
+            frames_per_buffer=CHUNK_SIZE,
         )
-
         try:
-            while self.is_active:
-                audio_data = await self.audio_queue.get()
-                stream.write(audio_data)
+            while not self._stop.is_set():
+                data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
+                self.input_ring.write(data)
+                self._loop.call_soon_threadsafe(self._input_ready.set)
         except Exception as e:
-            print(f"Error playing audio: {e}")
+            print(f"Error capturing audio: {e}")
         finally:
             stream.stop_stream()
             stream.close()
             p.terminate()
-            print("Audio playing stopped.")
+            print("Audio capture stopped.")
+
+    def _playback_loop(self):
+        """Speaker thread: drains the output ring with blocking writes."""
+        import pyaudio
 
-    async def capture_audio(self):
-        """Capture audio from microphone and send to Nova Sonic."""
         p = pyaudio.PyAudio()
         stream = p.open(
-            format=FORMAT,
+            format=pyaudio.paInt16,
             channels=CHANNELS,
-            rate=INPUT_SAMPLE_RATE,
-            input=True,
-            frames_per_buffer=CHUNK_SIZE,
+            rate=OUTPUT_SAMPLE_RATE,
+            output=True,
         )
-
-        print("Starting audio capture. Speak into your microphone...")
-        print("Press Enter to stop...")
-
-        await self.start_audio_input()
-
         try:
-            while self.is_active:
-                audio_data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                await self.send_audio_chunk(audio_data)
-                await asyncio.sleep(0.01)
+            while not self._stop.is_set():
+                data = self.output_ring.read(CHUNK_SIZE * SAMPLE_WIDTH)
+                if data:
+                    stream.write(data)
+                else:
+                    self._stop.wait(0.005)
         except Exception as e:
-            print(f"Error capturing audio: {e}")
+            print(f"Error playing audio: {e}")
         finally:
             stream.stop_stream()
             stream.close()
             p.terminate()
-            print("Audio capture stopped.")
-            await self.end_audio_input()
+            print("Audio playing stopped.")
 
+    async def _forward_input(self):
+        """Move captured audio from the ring to Nova without blocking the loop."""
+        await self.bridge.start_audio_input()
+        try:
+            while self.bridge.is_active:
+                await self._input_ready.wait()
+                self._input_ready.clear()
+                data = self.input_ring.read()
+                if data:
+                    await self.bridge.send_audio_base64_chunk(
+                        base64.b64encode(data).decode("utf-8")
+                    )
+        finally:
+            await self.bridge.end_audio_input()
 
-async def main():
-    # Create Nova Sonic client
-    nova_client = SimpleNovaSonic()
+    async def run_microphone(self):
+        print("Starting audio capture. Speak into your microphone...")
+        print("Press Enter to stop...")
 
-    # Start session
-    await nova_client.start_session()
+        self._start_thread(self._playback_loop)
+        self._start_thread(self._capture_loop)
+        forward_task = asyncio.create_task(self._forward_input())
+
+        await self._loop.run_in_executor(None, input)
+
+        forward_task.cancel()
+        await asyncio.gather(forward_task, return_exceptions=True)
 
-    # Start audio playback task
-    playback_task = asyncio.create_task(nova_client.play_audio())
+    async def bench(self, wav_path: str, runs: int = 1, timeout: float = 15.0):
+        """Replay a WAV file as the user's turn and time the assistant's reply.
 
-    # Start audio capture task
-    capture_task = asyncio.create_task(nova_client.capture_audio())
+        Latency is measured from the last sample of the user's speech to the
+        first assistant text and audio events.
+        """
+        with wave.open(wav_path, "rb") as wav:
+            if (
+                wav.getframerate() != INPUT_SAMPLE_RATE
+                or wav.getnchannels() != CHANNELS
+                or wav.getsampwidth() != SAMPLE_WIDTH
+            ):
+                raise ValueError("bench WAV must be 16 kHz, mono, 16-bit PCM")
+            speech = wav.readframes(wav.getnframes())
+
+        self.play_output = False
+        chunk_bytes = CHUNK_SIZE * SAMPLE_WIDTH
+        chunk_seconds = CHUNK_SIZE / INPUT_SAMPLE_RATE
+        silence = bytes(chunk_bytes)
+        results = []
+
+        await self.bridge.start_audio_input()
+        for run in range(1, runs + 1):
+            # Pace the replay in real time so Nova's turn detection behaves
+            # as it would with a live microphone
+            next_at = self._loop.time()
+            for offset in range(0, len(speech), chunk_bytes):
+                chunk = speech[offset : offset + chunk_bytes]
+                await self.bridge.send_audio_base64_chunk(
+                    base64.b64encode(chunk).decode("utf-8")
+                )
+                next_at += chunk_seconds
+                await asyncio.sleep(max(0.0, next_at - self._loop.time()))
+            speech_end = self._loop.time()
+            self.first_text_at = self.first_audio_at = self.last_audio_at = None
+
+            # Keep streaming silence until the reply finishes (or times out)
+            while self._loop.time() - speech_end < timeout:
+                await self.bridge.send_audio_base64_chunk(
+                    base64.b64encode(silence).decode("utf-8")
+                )
+                next_at += chunk_seconds
+                await asyncio.sleep(max(0.0, next_at - self._loop.time()))
+                if self.last_audio_at and self._loop.time() - self.last_audio_at > 1.5:
+                    break
+
+            text_latency = (
+                self.first_text_at - speech_end if self.first_text_at else None
+            )
+            audio_latency = (
+                self.first_audio_at - speech_end if self.first_audio_at else None
+            )
+            results.append((text_latency, audio_latency))
+            print(
+                f"run {run}: first text "
+                f"{_fmt_ms(text_latency)}, first audio {_fmt_ms(audio_latency)}"
+            )
+        await self.bridge.end_audio_input()
+
+        audio = sorted(a for _, a in results if a is not None)
+        if audio:
+            print(
+                f"first audio over {len(audio)} run(s): "
+                f"min {_fmt_ms(audio[0])}, median {_fmt_ms(audio[len(audio) // 2])}, "
+                f"max {_fmt_ms(audio[-1])}"
+            )
+        return results
 
-    # Wait for user to press Enter to stop
-    await asyncio.get_event_loop().run_in_executor(None, input)
+    async def end_session(self):
+        self._stop.set()
+        await self.bridge.close()
+        for thread in self._threads:
+            await self._loop.run_in_executor(None, thread.join, 1.0)
 
-    # First cancel the tasks
-    tasks = []
-    if not playback_task.done():
-        tasks.append(playback_task)
-    if not capture_task.done():
-        tasks.append(capture_task)
-    for task in tasks:
-        task.cancel()
-    if tasks:
-        await asyncio.gather(*tasks, return_exceptions=True)
 
-    # End session
-    await nova_client.end_session()
-    nova_client.is_active = False
+def _fmt_ms(seconds: float | None) -> str:
+    return "n/a" if seconds is None else f"{seconds * 1000:.0f} ms"
 
-    # cancel the response task
-    if nova_client.response and not nova_client.response.done():
-        nova_client.response.cancel()
 
-    print("Session ended")
+async def main():
+    parser = argparse.ArgumentParser(description="Nova Sonic voice client")
+    parser.add_argument(
+        "--bench", metavar="WAV", help="replay a 16 kHz mono WAV and report latency"
+    )
+    parser.add_argument("--runs", type=int, default=1, help="turns to replay in --bench")
+    args = parser.parse_args()
 
+    region = os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION") or "us-east-1"
+    nova_client = SimpleNovaSonic(region=region)
 
-if __name__ == "__main__":
-    # Set AWS credentials if not using environment variables
-    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+    await nova_client.start_session()
+    started = time.perf_counter()
+    try:
+        if args.bench:
+            await nova_client.bench(args.bench, runs=args.runs)
+        else:
+            await nova_client.run_microphone()
+    finally:
+        await nova_client.end_session()
+
+    print(f"Session ended after {time.perf_counter() - started:.1f} s")
 
+
+if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,240 @@
+"""
+Adaptive quality for voice sessions under load.
+
+One controller per process watches three signals:
+
+- event-loop lag: how late a periodic timer fires (CPU saturation),
+- outbound queue depth: messages per session waiting for the WebSocket,
+- Nova latency: from the user's finished utterance to the first reply.
+
+Each signal has a threshold per mode; the worst signal decides the mode and
+every session follows it:
+
+    normal        full-rate audio in and out
+    coarse_audio  assistant audio is sent in larger frames (fewer messages),
+                  clients are asked to send larger input frames
+    text_only     assistant audio is dropped, only text is sent
+    shed          as text_only, and new sessions are refused
+
+The mode rises as soon as a threshold is crossed and falls one step at a
+time after the signals have stayed below it for ``recover_seconds``, so a
+brief dip does not flap every session back to full rate. Changes are sent
+to the clients and logged as JSON metric lines.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass
+
+NORMAL = "normal"
+COARSE_AUDIO = "coarse_audio"
+TEXT_ONLY = "text_only"
+SHED = "shed"
+MODES = [NORMAL, COARSE_AUDIO, TEXT_ONLY, SHED]
+
+# Frame sizes asked of the client / used for assistant audio in coarse_audio
+COARSE_INPUT_FRAME_MS = 100
+COARSE_OUTPUT_FRAME_MS = 400
+
+
+def _thresholds(name: str, default: str) -> tuple[float, float, float]:
+    """``a,b,c``: the values entering coarse_audio, text_only and shed."""
+    values = tuple(float(v) for v in os.getenv(name, default).split(","))
+    if len(values) != 3:
+        raise ValueError(f"{name} needs three comma-separated thresholds")
+    return values
+
+
+@dataclass
+class DegradationConfig:
+    loop_lag_ms: tuple[float, float, float] = (50, 150, 400)
+    queue_depth: tuple[float, float, float] = (10, 40, 120)
+    nova_latency_ms: tuple[float, float, float] = (2500, 5000, 9000)
+    recover_seconds: float = 15
+    sample_interval: float = 0.25
+    # Nova latency older than this no longer counts (no turns, no evidence)
+    latency_ttl: float = 60
+
+    @classmethod
+    def from_env(cls) -> "DegradationConfig":
+        return cls(
+            loop_lag_ms=_thresholds("VOICE_DEGRADE_LOOP_LAG_MS", "50,150,400"),
+            queue_depth=_thresholds("VOICE_DEGRADE_QUEUE_DEPTH", "10,40,120"),
+            nova_latency_ms=_thresholds("VOICE_DEGRADE_NOVA_MS", "2500,5000,9000"),
+            recover_seconds=float(os.getenv("VOICE_DEGRADE_RECOVER_SECONDS", "15")),
+        )
+
+
+def _level(value: float, thresholds: tuple[float, float, float]) -> int:
+    return sum(value >= t for t in thresholds)
+
+
+class DegradationController:
+    def __init__(
+        self,
+        config: DegradationConfig | None = None,
+        *,
+        queue_depth: Callable[[], float] | None = None,
+    ):
+        self.config = config or DegradationConfig()
+        # Mean outbound messages waiting per session
+        self._queue_depth = queue_depth or (lambda: 0.0)
+        self.level = 0
+        self.reason = ""
+        self.loop_lag_ms = 0.0
+        self.nova_latency_ms = 0.0
+        self._nova_latency_at = 0.0
+        self._below_since: float | None = None
+        self._listeners: set[Callable[[str, str], None]] = set()
+        self._task: asyncio.Task | None = None
+        self.transitions: Counter[str] = Counter()
+        self._mode_since = time.monotonic()
+        self.seconds_in_mode: Counter[str] = Counter()
+
+    @property
+    def mode(self) -> str:
+        return MODES[self.level]
+
+    @property
+    def accepting(self) -> bool:
+        return self.mode != SHED
+
+    def subscribe(self, listener: Callable[[str, str], None]):
+        """``listener(mode, reason)`` runs on every change; keep it cheap."""
+        self._listeners.add(listener)
+
+    def unsubscribe(self, listener: Callable[[str, str], None]):
+        self._listeners.discard(listener)
+
+    def record_nova_latency(self, ms: float):
+        fresh = time.monotonic() - self._nova_latency_at < self.config.latency_ttl
+        self.nova_latency_ms = ms if not fresh else self.nova_latency_ms * 0.7 + ms * 0.3
+        self._nova_latency_at = time.monotonic()
+
+    def signals(self) -> dict[str, float]:
+        fresh = time.monotonic() - self._nova_latency_at < self.config.latency_ttl
+        return {
+            "loopLagMs": round(self.loop_lag_ms, 1),
+            "queueDepth": round(self._queue_depth(), 1),
+            "novaLatencyMs": round(self.nova_latency_ms if fresh else 0.0),
+        }
+
+    def evaluate(self, now: float | None = None):
+        """Recompute the mode from the current signals."""
+        now = time.monotonic() if now is None else now
+        signals = self.signals()
+        levels = {
+            "loopLagMs": _level(signals["loopLagMs"], self.config.loop_lag_ms),
+            "queueDepth": _level(signals["queueDepth"], self.config.queue_depth),
+            "novaLatencyMs": _level(signals["novaLatencyMs"], self.config.nova_latency_ms),
+        }
+        worst = max(levels, key=levels.get)
+        target = levels[worst]
+
+        if target > self.level:
+            self._below_since = None
+            self._set(target, f"{worst}={signals[worst]}", signals, now)
+        elif target < self.level:
+            if self._below_since is None:
+                self._below_since = now
+            elif now - self._below_since >= self.config.recover_seconds:
+                self._below_since = now
+                self._set(self.level - 1, "recovered", signals, now)
+        else:
+            self._below_since = None
+
+    def _set(self, level: int, reason: str, signals: dict, now: float):
+        previous = self.mode
+        self.seconds_in_mode[previous] += now - self._mode_since
+        self._mode_since = now
+        self.level = level
+        self.reason = reason
+        self.transitions[f"{previous}->{self.mode}"] += 1
+        print(
+            json.dumps(
+                {
+                    "metric": "voice_mode",
+                    "from": previous,
+                    "to": self.mode,
+                    "reason": reason,
+                    "sessions": len(self._listeners),
+                    **signals,
+                }
+            )
+        )
+        for listener in list(self._listeners):
+            listener(self.mode, reason)
+
+    async def _run(self):
+        interval = self.config.sample_interval
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = max(0.0, (time.monotonic() - started - interval) * 1000)
+            self.loop_lag_ms = self.loop_lag_ms * 0.7 + lag * 0.3
+            self.evaluate()
+
+    def start(self):
+        """Start sampling; call from the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stats(self) -> dict:
+        seconds = Counter(self.seconds_in_mode)
+        seconds[self.mode] += time.monotonic() - self._mode_since
+        return {
+            "mode": self.mode,
+            "reason": self.reason,
+            **self.signals(),
+            "transitions": dict(self.transitions),
+            "secondsInMode": {mode: round(s) for mode, s in seconds.items()},
+        }
+
+
+def describe_mode(mode: str) -> dict:
+    """What a client should do in ``mode``; sent with every mode change."""
+    return {
+        "mode": mode,
+        "assistantAudio": mode in (NORMAL, COARSE_AUDIO),
+        "inputFrameMs": COARSE_INPUT_FRAME_MS if mode != NORMAL else None,
+    }
+
+
+class AudioCoalescer:
+    """Joins assistant PCM chunks into frames of at least ``frame_bytes``."""
+
+    def __init__(self, frame_bytes: int):
+        self.frame_bytes = frame_bytes
+        self._chunks: list[bytes] = []
+        self._size = 0
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._chunks)
+
+    def add(self, pcm: bytes) -> bytes | None:
+        self._chunks.append(pcm)
+        self._size += len(pcm)
+        return self.take() if self._size >= self.frame_bytes else None
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks, self._size = [], 0
+        return data
+
+
+_controller: DegradationController | None = None
+
+
+def get_degradation_controller(queue_depth: Callable[[], float] | None = None):
+    """Process-wide controller configured from VOICE_DEGRADE_* variables."""
+    global _controller
+    if _controller is None:
+        _controller = DegradationController(
+            DegradationConfig.from_env(), queue_depth=queue_depth
+        )
+    return _controller
@@ -0,0 +1,131 @@
+"""
+Verified caller identity for the voice server's WebSockets.
+
+API Gateway hands the Lambda the caller's Cognito identity id; /ws/nova and
+/ws/analyze have no authorizer in front of them, so clients send their
+Cognito ID token (``Authorization: Bearer <token>``, ``/ws/nova?token=...``
+from browsers, or ``"token"`` in the first /ws/analyze message) and the
+server exchanges it for the identity id with cognito-identity GetId. Cognito
+checks the token's signature, issuer and expiry, and the id it returns is the
+one the Lambda keys records and quotas on, so quotas, record ownership and
+similar cases all hang off an identity the client cannot choose.
+
+Verified tokens are cached until they expire, so reconnects cost no call.
+Set COGNITO_IDENTITY_POOL_ID and COGNITO_USER_POOL_ID; for local development
+without Cognito, VOICE_AUTH_DISABLED=1 makes every connection the single
+user "anonymous".
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import NamedTuple
+
+from uploadImage.resilience import error_code
+
+# GetId errors that mean the token itself is no good
+_REJECTED = {"NotAuthorizedException", "InvalidParameterException"}
+
+
+class Unauthenticated(Exception):
+    """The connection carried no valid Cognito ID token."""
+
+
+class Identity(NamedTuple):
+    # Cognito identity id, the same one the Lambda sees
+    user_id: str
+    tenant: str
+
+
+def _claims(token: str) -> dict:
+    """The token's payload, unverified: only trusted once Cognito accepts it."""
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        raise Unauthenticated("malformed token") from None
+
+
+class CognitoIdentityVerifier:
+    def __init__(
+        self,
+        identity_pool_id: str,
+        user_pool_id: str,
+        *,
+        client=None,
+        tenant_claim: str = "custom:tenant",
+        max_entries: int = 4096,
+    ):
+        if client is None:
+            import boto3
+
+            # Pool ids start with their region: "us-east-1:..." / "us-east-1_..."
+            region = identity_pool_id.partition(":")[0]
+            client = boto3.client("cognito-identity", region_name=region)
+        self.client = client
+        self.identity_pool_id = identity_pool_id
+        user_pool_region = user_pool_id.partition("_")[0]
+        self.provider = f"cognito-idp.{user_pool_region}.amazonaws.com/{user_pool_id}"
+        self.tenant_claim = tenant_claim
+        self.max_entries = max_entries
+        # sha256(token) -> (expires at, identity)
+        self._entries: dict[str, tuple[float, Identity]] = {}
+
+    def _get_id(self, token: str) -> str:
+        try:
+            response = self.client.get_id(
+                IdentityPoolId=self.identity_pool_id, Logins={self.provider: token}
+            )
+        except Exception as e:
+            if error_code(e) in _REJECTED:
+                raise Unauthenticated("invalid token") from e
+            raise
+        return response["IdentityId"]
+
+    async def verify(self, token: str | None) -> Identity:
+        if not token:
+            raise Unauthenticated("missing token")
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        claims = _claims(token)
+        expires = float(claims.get("exp", 0))
+        if expires <= now:
+            raise Unauthenticated("token expired")
+        if claims.get("token_use") != "id":
+            raise Unauthenticated("not an ID token")
+        user_id = await asyncio.to_thread(self._get_id, token)
+        identity = Identity(user_id, claims.get(self.tenant_claim) or "default")
+
+        if len(self._entries) >= self.max_entries:
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (expires, identity)
+        return identity
+
+
+class AnonymousVerifier:
+    """VOICE_AUTH_DISABLED=1: local development only, everyone shares one identity."""
+
+    async def verify(self, token: str | None) -> Identity:
+        return Identity("anonymous", "default")
+
+
+def create_identity_verifier() -> CognitoIdentityVerifier | AnonymousVerifier | None:
+    """None when Cognito is not configured; every connection is then refused."""
+    if os.getenv("VOICE_AUTH_DISABLED") == "1":
+        print("VOICE_AUTH_DISABLED=1: voice connections are not authenticated")
+        return AnonymousVerifier()
+    identity_pool_id = os.getenv("COGNITO_IDENTITY_POOL_ID")
+    user_pool_id = os.getenv("COGNITO_USER_POOL_ID")
+    if not (identity_pool_id and user_pool_id):
+        print("COGNITO_IDENTITY_POOL_ID / COGNITO_USER_POOL_ID unset: refusing voice connections")
+        return None
+    return CognitoIdentityVerifier(identity_pool_id, user_pool_id)
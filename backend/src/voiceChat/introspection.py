@@ -0,0 +1,234 @@
+"""
+Per-session resource accounting for /ws/nova and the /debug/sessions view.
+
+Every live session registers a ``describe()`` callable (age, bridge state,
+queue depths, bytes in and out). With VOICE_PROFILE=1 the introspector also
+attributes event-loop work to sessions:
+
+- a task factory wraps every task's coroutine, so each step (one ``send``
+  into the coroutine) is timed: wall time on the loop and thread CPU time;
+- ``attach(session_id)`` puts the id in a context variable; tasks created
+  from the session (bridge response loop, keepalive, case lookups, audio
+  flushes) inherit it, so their steps are charged to the same session;
+- with tracemalloc running (VOICE_PROFILE_FRAMES=1 or more, off by
+  default even under VOICE_PROFILE=1) each step also
+  records the change in traced memory, giving a per-session net allocation
+  figure, and ``top_allocations`` compares a snapshot with the one taken
+  when profiling started.
+
+Work done in threads (``asyncio.to_thread``) and in plain loop callbacks is
+not attributed. Profiling adds a few microseconds per task step and
+tracemalloc slows allocation-heavy code noticeably, so both are off unless
+asked for.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+import tracemalloc
+import weakref
+from collections.abc import Callable, Coroutine
+
+_session_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "voice_session_id", default=None
+)
+
+
+class SessionUsage:
+    def __init__(self):
+        self.loop_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.steps = 0
+        self.slowest_step_ms = 0.0
+        # Net traced memory change over this session's steps
+        self.allocated_bytes = 0
+        self.peak_allocated_bytes = 0
+        self.tasks: weakref.WeakSet[asyncio.Task] = weakref.WeakSet()
+
+    def add(self, wall: float, cpu: float, allocated: int):
+        self.loop_seconds += wall
+        self.cpu_seconds += cpu
+        self.steps += 1
+        self.slowest_step_ms = max(self.slowest_step_ms, wall * 1000)
+        self.allocated_bytes += allocated
+        self.peak_allocated_bytes = max(self.peak_allocated_bytes, self.allocated_bytes)
+
+    def stats(self, age: float) -> dict:
+        return {
+            "loopMs": round(self.loop_seconds * 1000, 1),
+            "cpuMs": round(self.cpu_seconds * 1000, 1),
+            # Share of one core over the session's lifetime
+            "cpuPercent": round(self.cpu_seconds / age * 100, 2) if age > 0 else 0.0,
+            "steps": self.steps,
+            "slowestStepMs": round(self.slowest_step_ms, 2),
+            "allocatedBytes": self.allocated_bytes,
+            "peakAllocatedBytes": self.peak_allocated_bytes,
+            "liveTasks": sum(not t.done() for t in self.tasks),
+        }
+
+
+class _TimedCoroutine(Coroutine):
+    """Coroutine wrapper the task factory hands to Task; times every step."""
+
+    __slots__ = ("_coro", "_introspector")
+
+    def __init__(self, coro, introspector: "SessionIntrospector"):
+        self._coro = coro
+        self._introspector = introspector
+
+    def send(self, value):
+        return self._introspector._step(self._coro.send, value)
+
+    def throw(self, *args):
+        return self._introspector._step(self._coro.throw, *args)
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    def __iter__(self):
+        return self
+
+    # Task.get_stack() and asyncio debug output read these off the coroutine
+    @property
+    def cr_frame(self):
+        return getattr(self._coro, "cr_frame", None)
+
+    @property
+    def cr_running(self):
+        return getattr(self._coro, "cr_running", False)
+
+    @property
+    def cr_code(self):
+        return getattr(self._coro, "cr_code", None)
+
+
+class SessionIntrospector:
+    def __init__(self, *, profile: bool = False, trace_frames: int = 0):
+        self.profile = profile
+        self.trace_frames = trace_frames
+        self._sessions: dict[str, Callable[[], dict]] = {}
+        self._usage: dict[str, SessionUsage] = {}
+        self._baseline: tracemalloc.Snapshot | None = None
+        self._installed = False
+
+    def install(self, loop: asyncio.AbstractEventLoop | None = None):
+        """Hook the running loop's task creation; call once at startup."""
+        if not self.profile or self._installed:
+            return
+        loop = loop or asyncio.get_running_loop()
+        previous = loop.get_task_factory()
+
+        def factory(loop, coro, **kwargs):
+            wrapped = _TimedCoroutine(coro, self)
+            if previous is not None:
+                task = previous(loop, wrapped, **kwargs)
+            else:
+                task = asyncio.Task(wrapped, loop=loop, **kwargs)
+            context = kwargs.get("context")
+            session_id = context.get(_session_id) if context is not None else _session_id.get()
+            usage = self._usage.get(session_id)
+            if usage is not None:
+                usage.tasks.add(task)
+            return task
+
+        loop.set_task_factory(factory)
+        if self.trace_frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self._baseline = tracemalloc.take_snapshot()
+        self._installed = True
+
+    def _step(self, fn, *args):
+        tracing = tracemalloc.is_tracing()
+        memory = tracemalloc.get_traced_memory()[0] if tracing else 0
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            # Read after the step: attach() may have run inside it
+            usage = self._usage.get(_session_id.get())
+            if usage is not None:
+                usage.add(
+                    time.perf_counter() - wall,
+                    time.thread_time() - cpu,
+                    tracemalloc.get_traced_memory()[0] - memory if tracing else 0,
+                )
+
+    def register(self, session_id: str, describe: Callable[[], dict]):
+        """List a live session; ``describe()`` must be cheap and never block."""
+        self._sessions[session_id] = describe
+
+    def attach(self, session_id: str):
+        """Charge the current task, and tasks it creates from now on, to the session."""
+        if not self.profile:
+            return
+        _session_id.set(session_id)
+        usage = self._usage.setdefault(session_id, SessionUsage())
+        task = asyncio.current_task()
+        if task is not None:
+            usage.tasks.add(task)
+
+    def unregister(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._usage.pop(session_id, None)
+
+    def sessions(self) -> list[dict]:
+        listed = []
+        for session_id, describe in list(self._sessions.items()):
+            try:
+                state = describe()
+            except Exception as e:
+                state = {"error": str(e)}
+            usage = self._usage.get(session_id)
+            if usage is not None:
+                state["usage"] = usage.stats(state.get("ageSeconds", 0))
+            listed.append({"sessionId": session_id, **state})
+        listed.sort(key=lambda s: s.get("usage", {}).get("cpuMs", 0), reverse=True)
+        return listed
+
+    def top_allocations(self, limit: int = 15) -> list[dict]:
+        """Allocation sites that grew most since profiling started."""
+        if self._baseline is None or not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        return [
+            {
+                "site": str(stat.traceback),
+                "sizeBytes": stat.size,
+                "growthBytes": stat.size_diff,
+                "count": stat.count,
+            }
+            for stat in snapshot.compare_to(self._baseline, "lineno")[:limit]
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "sessionCount": len(self._sessions),
+            "profiling": self.profile,
+            "tracemalloc": tracemalloc.is_tracing(),
+            "tracedBytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        }
+
+
+_introspector: SessionIntrospector | None = None
+
+
+def get_introspector() -> SessionIntrospector:
+    """Process-wide introspector; VOICE_PROFILE=1 turns on per-session accounting,
+    VOICE_PROFILE_FRAMES=N additionally traces allocations N frames deep."""
+    global _introspector
+    if _introspector is None:
+        _introspector = SessionIntrospector(
+            profile=os.getenv("VOICE_PROFILE", "0") == "1",
+            trace_frames=int(os.getenv("VOICE_PROFILE_FRAMES", "0")),
+        )
+    return _introspector
@@ -1,6 +1,7 @@
 import asyncio
 import base64
 import json
+import time
 import uuid
 from collections.abc import Awaitable, Callable
 
@@ -19,38 +20,19 @@ from aws_sdk_bedrock_runtime.models import (
 from smithy_aws_core.identity.environment import EnvironmentCredentialsResolver
 from dotenv import load_dotenv
 
+from voiceChat.capture import CLIENT_END_AUDIO, CLIENT_START_AUDIO, SessionRecorder
+from voiceChat.transcript_writer import TranscriptWriter
+from uploadImage.prompts import get_prompt
+from uploadImage.resilience import BedrockGuard, get_guard
+
 
 load_dotenv()
-DEFAULT_SYSTEM_PROMPT = """You are homeFix, a friendly and practical home maintenance AI assistant.
-Your job is to help users diagnose and fix problems with home appliances,
-devices, and household systems — such as Kindle e-readers, TVs, routers,
-washing machines, microwaves, smart home devices, and more.
-
-When a user describes a problem (by voice or image), you will:
-1. Identify the likely cause of the issue in simple, plain language
-2. Ask one follow-up question if you need more detail before diagnosing
-3. Provide 2-3 clear, step-by-step fixes the user can try themselves
-4. Tell the user honestly if the issue likely requires a professional
-
-Guidelines:
-- Keep responses short and conversational (2-4 sentences max per turn)
-- Avoid technical jargon — speak like a helpful neighbour, not a manual
-- Always prioritize safety first (e.g. unplug before inspecting)
-- If the user shares a photo of an error screen or broken device,
-  describe what you see and explain what it means
-- If unsure, suggest the most common fix first, then escalate
-
-You do NOT:
-- Diagnose backend server or cloud service outages
-- Access or request any private user data
-- Handle car, medical, or structural building issues
-
-Always end your first response by asking:
-\"Can you describe what happened just before this issue started?\"
-"""
+DEFAULT_SYSTEM_PROMPT = get_prompt("homefix-voice").text
 
 OnEvent = Callable[[dict], Awaitable[None]]
 OnError = Callable[[str], Awaitable[None]]
+# (what the user said, case ids already shown) -> context block or None
+CaseLookup = Callable[[str, set[str]], Awaitable[str | None]]
 
 
 class NovaSonicBridge:
@@ -63,18 +45,52 @@ class NovaSonicBridge:
         voice_id: str = "matthew",
         on_text: OnEvent | None = None,
         on_audio: OnEvent | None = None,
+        on_audio_end: Callable[[str], Awaitable[None]] | None = None,
         on_error: OnError | None = None,
+        client: BedrockRuntimeClient | None = None,
+        transcript: TranscriptWriter | None = None,
+        context_text: str | None = None,
+        case_lookup: CaseLookup | None = None,
+        on_activity: Callable[[], None] | None = None,
+        keepalive_interval: float = 25,
+        guard: BedrockGuard | None = None,
+        on_turn_latency: Callable[[float], None] | None = None,
+        recorder: SessionRecorder | None = None,
     ):
         self.model_id = model_id
         self.region = region
         self.system_prompt = system_prompt
         self.voice_id = voice_id
+        # Prior image analysis the user is asking about, if any
+        self.context_text = context_text
+        # Similar resolved cases (see voiceChat/similar_cases.py)
+        self.case_lookup = case_lookup
+        self._cases_seen: set[str] = set()
+        self._case_tasks: set[asyncio.Task] = set()
 
         self.on_text = on_text
         self.on_audio = on_audio
+        # Called with the stop reason when an assistant audio block ends
+        # (END_TURN or INTERRUPTED), so buffered output can be flushed or dropped
+        self.on_audio_end = on_audio_end
         self.on_error = on_error
-
-        self.client: BedrockRuntimeClient | None = None
+        self.transcript = transcript
+        # Called when Nova hears the user speak (see voiceChat/supervisor.py)
+        self.on_activity = on_activity
+        # Seconds between silent keepalive frames; 0 lets Nova's own idle
+        # timeout end a silent session
+        self.keepalive_interval = keepalive_interval
+        # ms from the user's utterance (ASR final or typed text) to the first
+        # assistant output; feeds voiceChat/degradation.py
+        self.on_turn_latency = on_turn_latency
+        self._turn_started: float | None = None
+        # Client input and Nova output for replay (see voiceChat/capture.py)
+        self.recorder = recorder
+
+        # A shared client (see NovaSessionManager) skips per-session setup
+        self.client: BedrockRuntimeClient | None = client
+        # Per-region guard when the session manager routes between regions
+        self.guard = guard or get_guard()
         self.stream = None
         self.is_active = False
 
@@ -88,6 +104,19 @@ class NovaSonicBridge:
         self._role: str | None = None
         self._generation_stage: str | None = None
 
+    def debug_state(self) -> dict:
+        """Stream state for /debug/sessions (see voiceChat/introspection.py)."""
+        return {
+            "active": self.is_active,
+            "region": self.region,
+            "audioStarted": self._audio_started,
+            "role": self._role,
+            "generationStage": self._generation_stage,
+            "awaitingReply": self._turn_started is not None,
+            "pendingCaseLookups": len(self._case_tasks),
+            "casesShown": len(self._cases_seen),
+        }
+
     def _initialize_client(self):
         cfg = Config(
             endpoint_uri=f"https://bedrock-runtime.{self.region}.amazonaws.com",
@@ -107,8 +136,9 @@ class NovaSonicBridge:
         if not self.client:
             self._initialize_client()
 
-        self.stream = await self.client.invoke_model_with_bidirectional_stream(
-            InvokeModelWithBidirectionalStreamOperationInput(model_id=self.model_id)
+        self.stream = await self.guard.acall(
+            self.client.invoke_model_with_bidirectional_stream,
+            InvokeModelWithBidirectionalStreamOperationInput(model_id=self.model_id),
         )
         self.is_active = True
 
@@ -186,12 +216,82 @@ class NovaSonicBridge:
             }
         )
 
+        if self.context_text:
+            await self._send_background_text(
+                "Here is the analysis of the photo I uploaded earlier:\n"
+                + self.context_text.strip()
+            )
+            # The photo already says what is broken; look it up before the
+            # user's first turn
+            await self._inject_cases(self.context_text)
+
         self._response_task = asyncio.create_task(self._process_responses())
-        self._keepalive_task = asyncio.create_task(self._keepalive())
+        if self.keepalive_interval > 0:
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    async def _send_background_text(self, content: str):
+        """Non-interactive USER text: history the assistant reads but does not
+        answer, e.g. a stored image analysis or similar resolved cases."""
+        content_name = str(uuid.uuid4())
+        await self._send_event(
+            {
+                "event": {
+                    "contentStart": {
+                        "promptName": self.prompt_name,
+                        "contentName": content_name,
+                        "type": "TEXT",
+                        "interactive": False,
+                        "role": "USER",
+                        "textInputConfiguration": {"mediaType": "text/plain"},
+                    }
+                }
+            }
+        )
+        await self._send_event(
+            {
+                "event": {
+                    "textInput": {
+                        "promptName": self.prompt_name,
+                        "contentName": content_name,
+                        "content": content,
+                    }
+                }
+            }
+        )
+        await self._send_event(
+            {
+                "event": {
+                    "contentEnd": {
+                        "promptName": self.prompt_name,
+                        "contentName": content_name,
+                    }
+                }
+            }
+        )
+
+    async def _inject_cases(self, text: str):
+        if not self.case_lookup or not self.is_active:
+            return
+        try:
+            context = await self.case_lookup(text, self._cases_seen)
+            if context and self.is_active:
+                await self._send_background_text(context)
+        except Exception as e:
+            # Retrieval is a hint; the conversation goes on without it
+            print(f"similar case lookup failed: {e}")
+
+    def _schedule_case_lookup(self, text: str):
+        """Look up the user's words without holding up the response loop;
+        the cases reach Nova before the user's next turn at the latest."""
+        task = asyncio.create_task(self._inject_cases(text))
+        self._case_tasks.add(task)
+        task.add_done_callback(self._case_tasks.discard)
 
     async def start_audio_input(self):
         if not self.is_active or self._audio_started:
             return
+        if self.recorder:
+            self.recorder.record(CLIENT_START_AUDIO)
 
         await self._send_event(
             {
@@ -221,6 +321,8 @@ class NovaSonicBridge:
             return
         if not self._audio_started:
             await self.start_audio_input()
+        if self.recorder:
+            self.recorder.client_audio(audio_base64)
 
         await self._send_event(
             {
@@ -237,6 +339,8 @@ class NovaSonicBridge:
     async def end_audio_input(self):
         if not self.is_active or not self._audio_started:
             return
+        if self.recorder:
+            self.recorder.record(CLIENT_END_AUDIO)
 
         await self._send_event(
             {
@@ -254,6 +358,14 @@ class NovaSonicBridge:
     async def send_text_input(self, content: str):
         if not self.is_active:
             return
+        if self.recorder:
+            self.recorder.client_text(content)
+
+        if self.transcript:
+            self.transcript.append("USER", content)
+        # Typed text can wait the few ms so the cases precede the question
+        await self._inject_cases(content)
+        self._turn_started = time.monotonic()
 
         content_name = str(uuid.uuid4())
         await self._send_event(
@@ -304,7 +416,9 @@ class NovaSonicBridge:
         self._keepalive_task = None
 
         tasks_to_cancel = [
-            t for t in (response_task, keepalive_task) if t and not t.done()
+            t
+            for t in (response_task, keepalive_task, *self._case_tasks)
+            if t and not t.done()
         ]
         for t in tasks_to_cancel:
             t.cancel()
@@ -325,11 +439,14 @@ class NovaSonicBridge:
         except Exception:
             pass
 
+        if self.transcript:
+            await self.transcript.close()
+
     async def _keepalive(self) -> None:
-        """Send silent audio every 25 s to prevent Nova Sonic's 59 s idle timeout."""
-        INTERVAL = 25  # seconds between keepalive pings
+        """Send silent audio every ``keepalive_interval`` s to prevent Nova
+        Sonic's 59 s idle timeout."""
         while self.is_active:
-            await asyncio.sleep(INTERVAL)
+            await asyncio.sleep(self.keepalive_interval)
             if not self.is_active:
                 break
             if self._audio_started:
@@ -382,6 +499,14 @@ class NovaSonicBridge:
             except Exception:
                 pass  # stream may be closing; ignore
 
+    def _end_turn_timer(self):
+        if self._turn_started is None or self._role != "ASSISTANT":
+            return
+        latency_ms = (time.monotonic() - self._turn_started) * 1000
+        self._turn_started = None
+        if self.on_turn_latency:
+            self.on_turn_latency(latency_ms)
+
     async def _emit_error(self, message: str):
         if self.on_error:
             await self.on_error(message)
@@ -401,6 +526,8 @@ class NovaSonicBridge:
                 response_data = result.value.bytes_.decode("utf-8")
                 json_data = json.loads(response_data)
                 event = json_data.get("event") or {}
+                if self.recorder:
+                    self.recorder.nova_event(event, result.value.bytes_)
                 print(
                     f"[Nova] event keys: {list(event.keys())}, role={self._role}, stage={self._generation_stage}"
                 )
@@ -420,7 +547,40 @@ class NovaSonicBridge:
                             self._generation_stage = None
                     continue
 
+                if "contentEnd" in event:
+                    stop_reason = event["contentEnd"].get("stopReason")
+                    if stop_reason in ("END_TURN", "INTERRUPTED"):
+                        if self.transcript:
+                            self.transcript.end_turn()
+                        if (
+                            self._role == "ASSISTANT"
+                            and event["contentEnd"].get("type") == "AUDIO"
+                            and self.on_audio_end
+                        ):
+                            await self.on_audio_end(stop_reason)
+                    continue
+
                 if "textOutput" in event:
+                    # Persist what was actually said: user ASR and final assistant text
+                    content = event["textOutput"].get("content", "")
+                    if (
+                        self.transcript
+                        and self._generation_stage != "SPECULATIVE"
+                        and '"interrupted"' not in content
+                    ):
+                        self.transcript.append(self._role, content)
+                    if self._role == "USER":
+                        self._turn_started = time.monotonic()
+                        if self.on_activity:
+                            self.on_activity()
+                    else:
+                        self._end_turn_timer()
+                    if (
+                        self._role == "USER"
+                        and self.case_lookup
+                        and '"interrupted"' not in content
+                    ):
+                        self._schedule_case_lookup(content)
                     if self._role == "ASSISTANT" and self.on_text:
                         await self.on_text(
                             {
@@ -431,6 +591,7 @@ class NovaSonicBridge:
                     continue
 
                 if "audioOutput" in event:
+                    self._end_turn_timer()
                     if self._role == "ASSISTANT" and self.on_audio:
                         await self.on_audio(
                             {
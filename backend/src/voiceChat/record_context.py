@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+
+class RecordContextCache:
+    """Looks up the stored analysis text of an image record for a voice session.
+
+    Analyses are written once by the upload Lambda and never change, so the
+    text is kept in a small LRU with a TTL and a user reopening the same
+    record skips both the DynamoDB read and the S3 GET. Concurrent lookups of
+    the same record share a single fetch.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        table_name: str,
+        region: str = "us-east-1",
+        *,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+    ):
+        import boto3
+
+        self.bucket = bucket
+        self.s3 = boto3.client("s3", region_name=region)
+        self.table = boto3.resource("dynamodb", region_name=region).Table(table_name)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        # record id -> (expires_at, owner user id, analysis text)
+        self._entries: OrderedDict[str, tuple[float, str, str]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fetch(self, record_id: str) -> tuple[str, str] | None:
+        item = self.table.get_item(Key={"id": record_id}).get("Item")
+        if not item or not item.get("analysisKey"):
+            return None
+        obj = self.s3.get_object(Bucket=self.bucket, Key=item["analysisKey"])
+        return item.get("userId", ""), obj["Body"].read().decode("utf-8")
+
+    async def get(self, record_id: str, user_id: str) -> str | None:
+        """Analysis text for ``record_id``, or None if missing or not owned by ``user_id``."""
+        entry = self._entries.get(record_id)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(record_id)
+            self.hits += 1
+            owner, text = entry[1], entry[2]
+        else:
+            self.misses += 1
+            future = self._inflight.get(record_id)
+            if future is None:
+                future = asyncio.ensure_future(asyncio.to_thread(self._fetch, record_id))
+                self._inflight[record_id] = future
+                future.add_done_callback(lambda _: self._inflight.pop(record_id, None))
+            result = await asyncio.shield(future)
+            if result is None:
+                return None
+            owner, text = result
+            self._entries[record_id] = (time.monotonic() + self.ttl_seconds, owner, text)
+            self._entries.move_to_end(record_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        if owner != user_id:
+            return None
+        return text
+
+
+def create_record_context_cache() -> RecordContextCache | None:
+    bucket = os.getenv("S3_BUCKET_NAME")
+    table_name = os.getenv("TABLE_NAME")
+    if not (bucket and table_name):
+        return None
+    region = os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION") or "us-east-1"
+    return RecordContextCache(
+        bucket,
+        table_name,
+        region,
+        max_entries=int(os.getenv("RECORD_CONTEXT_CACHE_SIZE", "512")),
+        ttl_seconds=float(os.getenv("RECORD_CONTEXT_CACHE_TTL", "3600")),
+    )
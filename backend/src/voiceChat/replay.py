@@ -0,0 +1,264 @@
+"""
+Replay a captured voice session through NovaSonicBridge against a fake Nova.
+
+The client side of the capture (start/stop of the mic, PCM chunks, typed
+text) is fed to a real bridge at the recorded pace, divided by --speed
+(0 feeds as fast as possible). The fake Nova answers with the recorded Nova
+events. Each burst of output is released only once the bridge has passed on
+the client input that preceded it, and then after the recorded delay divided
+by --speed. Only the server's own handling of the traffic varies between
+runs.
+
+Reported:
+- first-output latency per burst: from feeding an input to the bridge
+  calling on_text/on_audio for the answer. The overhead is that latency
+  minus the recorded Nova delay, i.e. what the bridge and event loop add.
+- process CPU time for the whole replay, also per second of captured audio.
+
+Results go to JSON. Pass an earlier run as --baseline to print deltas and
+fail (exit 1) when the p95 overhead or the CPU grew by more than
+--tolerance.
+
+Run from backend/src:
+    python -m voiceChat.replay captures/<session>.hfcap --speed 4 --out replay.json
+    python -m voiceChat.replay captures/<session>.hfcap --speed 4 --baseline replay.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from voiceChat.capture import (
+    CLIENT_AUDIO,
+    CLIENT_END_AUDIO,
+    CLIENT_KINDS,
+    CLIENT_START_AUDIO,
+    CLIENT_TEXT,
+    NOVA_AUDIO,
+    NOVA_KINDS,
+    CaptureReader,
+)
+from voiceChat.nova_sonic_bridge import NovaSonicBridge
+from uploadImage.resilience import BedrockGuard
+
+
+def load_capture(path: str):
+    """(meta, inputs, bursts): client inputs, and per input the Nova events
+    that followed it as (delay after the input, raw event bytes).
+
+    bursts[0] holds what Nova sent before the first input; bursts[i + 1]
+    follows inputs[i]. Audio is re-wrapped as the JSON Nova sends, up front,
+    so the fake's own work stays out of the measurement.
+    """
+    with CaptureReader(path) as reader:
+        meta = reader.meta()
+        inputs: list[tuple[int, float, bytes]] = []
+        bursts: list[list[tuple[float, bytes]]] = [[]]
+        for record in reader:
+            if record.kind in CLIENT_KINDS:
+                inputs.append((record.kind, record.t, bytes(record.payload)))
+                bursts.append([])
+            elif record.kind in NOVA_KINDS:
+                since = inputs[-1][1] if inputs else 0.0
+                if record.kind == NOVA_AUDIO:
+                    content = base64.b64encode(record.payload).decode("ascii")
+                    raw = json.dumps({"event": {"audioOutput": {"content": content}}}).encode()
+                else:
+                    raw = bytes(record.payload)
+                bursts[-1].append((record.t - since, raw))
+    return meta, inputs, bursts
+
+
+class FakeNovaStream:
+    """The slice of the bidirectional stream the bridge uses."""
+
+    def __init__(self, bursts, speed: float):
+        self.bursts = bursts
+        self.speed = speed
+        self.events_in = 0
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # Burst and recorded delay of the event the bridge is handling now
+        self.current: tuple[int, float] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.input_stream = SimpleNamespace(send=self._receive, close=self._close)
+
+    async def _receive(self, chunk):
+        self.events_in += 1
+
+    async def _close(self):
+        pass
+
+    async def await_output(self):
+        return None, self
+
+    async def receive(self):
+        burst, delay, raw = await self.queue.get()
+        self.current = (burst, delay)
+        self.queue.task_done()
+        return SimpleNamespace(value=SimpleNamespace(bytes_=raw))
+
+    def release(self, burst: int, fed_at: float):
+        if self.bursts[burst]:
+            self._tasks.append(asyncio.create_task(self._play(burst, fed_at)))
+
+    async def _play(self, burst: int, fed_at: float):
+        for delay, raw in self.bursts[burst]:
+            if self.speed > 0:
+                wait = fed_at + delay / self.speed - time.perf_counter()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await self.queue.put((burst, delay, raw))
+
+    async def drain(self):
+        await asyncio.gather(*self._tasks)
+        await self.queue.join()
+
+
+class FakeNovaClient:
+    def __init__(self, stream: FakeNovaStream):
+        self.stream = stream
+
+    async def invoke_model_with_bidirectional_stream(self, operation_input):
+        return self.stream
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def replay(path: str, speed: float) -> dict:
+    meta, inputs, bursts = load_capture(path)
+    fake = FakeNovaStream(bursts, speed)
+    # burst -> (when the bridge first called back, recorded delay of that event)
+    first_output: dict[int, tuple[float, float]] = {}
+    outputs = 0
+
+    async def on_output(event: dict):
+        nonlocal outputs
+        outputs += 1
+        if fake.current and fake.current[0] not in first_output:
+            burst, delay = fake.current
+            first_output[burst] = (time.perf_counter(), delay)
+
+    async def on_error(message: str):
+        print(f"bridge error: {message}")
+
+    bridge = NovaSonicBridge(
+        client=FakeNovaClient(fake),
+        guard=BedrockGuard("replay", rate=1e9, burst=1e9, max_retries=0),
+        on_text=on_output,
+        on_audio=on_output,
+        on_error=on_error,
+        keepalive_interval=0,
+    )
+
+    cpu = time.process_time()
+    started = time.perf_counter()
+    await bridge.start()
+    fake.release(0, time.perf_counter())
+    fed_at: dict[int, float] = {}
+    for i, (kind, t, payload) in enumerate(inputs, start=1):
+        if speed > 0:
+            wait = started + t / speed - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        fed_at[i] = time.perf_counter()
+        if kind == CLIENT_START_AUDIO:
+            await bridge.start_audio_input()
+        elif kind == CLIENT_AUDIO:
+            await bridge.send_audio_base64_chunk(base64.b64encode(payload).decode("ascii"))
+        elif kind == CLIENT_END_AUDIO:
+            await bridge.end_audio_input()
+        elif kind == CLIENT_TEXT:
+            await bridge.send_text_input(payload.decode("utf-8"))
+        fake.release(i, fed_at[i])
+    await fake.drain()
+    # Let the response loop hand the last event to the callbacks
+    await asyncio.sleep(0)
+    await bridge.close()
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu
+
+    latencies, overheads = [], []
+    for burst, (at, delay) in first_output.items():
+        if burst == 0:
+            continue
+        latency_ms = (at - fed_at[burst]) * 1000
+        recorded_ms = delay * 1000
+        latencies.append(latency_ms)
+        overheads.append(latency_ms - (recorded_ms / speed if speed > 0 else 0.0))
+
+    audio_seconds = inputs[-1][1] if inputs else 0.0
+    return {
+        "capture": path,
+        "sessionId": meta.get("sessionId"),
+        "speed": speed,
+        "inputs": len(inputs),
+        "eventsToNova": fake.events_in,
+        "outputs": outputs,
+        "bursts": len(latencies),
+        "capturedSeconds": round(audio_seconds, 2),
+        "wallSeconds": round(wall, 3),
+        "cpuSeconds": round(cpu, 3),
+        "cpuMsPerCapturedSecond": round(cpu * 1000 / audio_seconds, 2) if audio_seconds else None,
+        "latencyP50Ms": round(_percentile(latencies, 50), 2),
+        "latencyP95Ms": round(_percentile(latencies, 95), 2),
+        "overheadP50Ms": round(_percentile(overheads, 50), 2),
+        "overheadP95Ms": round(_percentile(overheads, 95), 2),
+        "overheadMaxMs": round(max(overheads, default=0.0), 2),
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print deltas against an earlier run; return the regressions."""
+    regressions = []
+    for key in ("latencyP50Ms", "overheadP50Ms", "overheadP95Ms", "cpuSeconds"):
+        old, new = baseline.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{key:<24} {old:>10.2f} -> {new:>10.2f}  ({change})")
+    # Overheads of a millisecond or two are noise; only flag real growth
+    if result["overheadP95Ms"] > max(baseline["overheadP95Ms"] * (1 + tolerance), 2.0):
+        regressions.append(
+            f"p95 overhead {baseline['overheadP95Ms']:.2f} -> {result['overheadP95Ms']:.2f} ms"
+        )
+    if result["cpuSeconds"] > baseline["cpuSeconds"] * (1 + tolerance):
+        regressions.append(f"CPU {baseline['cpuSeconds']:.3f} -> {result['cpuSeconds']:.3f} s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a voice session capture")
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="pace multiplier, 0 = unpaced")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    result = asyncio.run(replay(args.capture, args.speed))
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Server-side conversion of the client's native microphone format to Nova's.
+
+A /ws/nova client may send audio exactly as its capture pipeline produces it
+(e.g. 48 kHz float32 from an AudioWorklet) and declare the format in the
+handshake: ``/ws/nova?sampleRate=48000&sampleFormat=f32&channels=2``. Each
+session gets an InputNormalizer that downmixes, resamples with a windowed-sinc
+polyphase filter and converts to the 16 kHz / 16-bit / mono LPCM Nova expects.
+Filter state carries over between chunks, so chunk boundaries are seamless
+and chunks need not be frame-aligned.
+
+Benchmark:  python -m voiceChat.bench_resampler
+"""
+
+import base64
+import math
+
+import numpy as np
+
+from voiceChat.audio_codec import INPUT_SAMPLE_RATE
+
+SAMPLE_FORMATS = {"s16": np.dtype("<i2"), "f32": np.dtype("<f4")}
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+MAX_CHANNELS = 8
+
+
+class PolyphaseResampler:
+    """Streaming rational resampler (``up``/``down`` after reduction).
+
+    The prototype low-pass is a Kaiser-windowed sinc at the upsampled rate,
+    split into ``up`` phases of ``taps`` coefficients. Only the phase needed
+    for each output sample is evaluated, so the work is ``taps`` multiply-adds
+    per output sample whatever the ratio.
+    """
+
+    def __init__(
+        self, from_rate: int, to_rate: int, *, taps_per_output: int = 16, beta: float = 8.0
+    ):
+        g = math.gcd(from_rate, to_rate)
+        self.up = to_rate // g
+        self.down = from_rate // g
+        # The filter spans the same time whatever the input rate: decimating
+        # by 3 needs three times the input samples per output
+        self.taps = taps = taps_per_output * max(1, -(-self.down // self.up))
+
+        # Cut off just below the lower Nyquist frequency of the two rates
+        length = taps * self.up
+        cutoff = 0.95 / max(self.up, self.down)
+        n = np.arange(length) - (length - 1) / 2
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(length, beta) * self.up
+        # phases[p] holds h[p], h[p + up], ... reversed, so a phase dots
+        # directly with an ascending window of input samples
+        self._phases = h.reshape(taps, self.up).T[:, ::-1].astype(np.float32).copy()
+
+        self._history = np.zeros(taps - 1, dtype=np.float32)
+        # Position of the next output sample, in upsampled units from the
+        # start of the next chunk
+        self._pos = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.up == self.down == 1:
+            return samples
+        buf = np.concatenate([self._history, samples.astype(np.float32, copy=False)])
+        total = len(samples) * self.up
+        count = max(0, -(-(total - self._pos) // self.down))
+        if count == 0 or len(buf) < self.taps:
+            # Too little input for an output sample; keep it for the next chunk
+            self._pos -= total
+            self._history = buf[len(buf) - (self.taps - 1) :]
+            return np.zeros(0, dtype=np.float32)
+        pos = self._pos + np.arange(count, dtype=np.int64) * self.down
+
+        windows = np.lib.stride_tricks.sliding_window_view(buf, self.taps)
+        out = np.einsum(
+            "ij,ij->i", windows[pos // self.up], self._phases[pos % self.up]
+        )
+
+        self._pos += count * self.down - total
+        self._history = buf[len(buf) - (self.taps - 1) :]
+        return out
+
+
+class InputNormalizer:
+    """Client LPCM (any rate, s16/f32, interleaved channels) -> Nova's input."""
+
+    def __init__(self, sample_rate: int, sample_format: str = "s16", channels: int = 1):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"sampleFormat must be one of {', '.join(SAMPLE_FORMATS)}")
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(
+                f"sampleRate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}"
+            )
+        if not 1 <= channels <= MAX_CHANNELS:
+            raise ValueError(f"channels must be between 1 and {MAX_CHANNELS}")
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+        self.channels = channels
+        self._dtype = SAMPLE_FORMATS[sample_format]
+        self._frame_bytes = self._dtype.itemsize * channels
+        self._resampler = PolyphaseResampler(sample_rate, INPUT_SAMPLE_RATE)
+        # A chunk may end mid-frame; the tail waits for the next one
+        self._pending = b""
+
+    def describe(self) -> dict:
+        return {
+            "mediaType": "audio/lpcm",
+            "sampleRateHertz": self.sample_rate,
+            "sampleFormat": self.sample_format,
+            "channelCount": self.channels,
+            "resampledTo": INPUT_SAMPLE_RATE,
+        }
+
+    def process_bytes(self, data: bytes) -> bytes:
+        data = self._pending + data
+        usable = len(data) - len(data) % self._frame_bytes
+        self._pending = data[usable:]
+
+        samples = np.frombuffer(data[:usable], dtype=self._dtype)
+        if self.sample_format == "s16":
+            samples = samples.astype(np.float32) * (1 / 32768)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        out = self._resampler.process(samples)
+        return (np.clip(out, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+    def process(self, content: str) -> str:
+        """Base64 client audio in, base64 Nova LPCM out."""
+        pcm = self.process_bytes(base64.b64decode(content))
+        return base64.b64encode(pcm).decode("utf-8")
+
+
+def create_input_normalizer(params) -> InputNormalizer | None:
+    """From the handshake's sampleRate/sampleFormat/channels; None when the
+    client already sends Nova's format. Raises ValueError on a bad format."""
+    try:
+        sample_rate = int(params.get("sampleRate") or INPUT_SAMPLE_RATE)
+        channels = int(params.get("channels") or 1)
+    except ValueError:
+        raise ValueError("sampleRate and channels must be integers") from None
+    sample_format = (params.get("sampleFormat") or "s16").lower()
+    if (sample_rate, sample_format, channels) == (INPUT_SAMPLE_RATE, "s16", 1):
+        return None
+    return InputNormalizer(sample_rate, sample_format, channels)
@@ -0,0 +1,166 @@
+import os
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aws_sdk_bedrock_runtime.client import BedrockRuntimeClient
+from aws_sdk_bedrock_runtime.config import Config
+from smithy_aws_core.identity.environment import EnvironmentCredentialsResolver
+
+from voiceChat.nova_sonic_bridge import NovaSonicBridge
+from uploadImage.regions import get_region_selector, region_guard
+
+
+class SessionLimitExceeded(Exception):
+    """Raised when a new voice session would exceed a global or tenant cap."""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class SessionHandle:
+    tenant_id: str
+    session_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    started_at: float = field(default_factory=time.monotonic)
+
+
+def _parse_quotas(raw: str) -> dict[str, int]:
+    """Parse ``tenantA=5,tenantB=2`` into a quota map."""
+    quotas = {}
+    for entry in raw.split(","):
+        tenant, _, limit = entry.partition("=")
+        if tenant.strip() and limit.strip().isdigit():
+            quotas[tenant.strip()] = int(limit)
+    return quotas
+
+
+class NovaSessionManager:
+    """Owns the process-wide Bedrock clients and hands out session slots.
+
+    Every bridge created here shares its region's ``BedrockRuntimeClient`` —
+    one connection pool and one credential resolver — instead of building its
+    own. With several BEDROCK_REGIONS, sessions start in the region with the
+    best recent latency and fail over when it cannot open a stream.
+    """
+
+    def __init__(
+        self,
+        *,
+        region: str = "us-east-1",
+        max_sessions: int = 100,
+        max_sessions_per_tenant: int = 10,
+        tenant_quotas: dict[str, int] | None = None,
+    ):
+        self.region = region
+        self.max_sessions = max_sessions
+        self.max_sessions_per_tenant = max_sessions_per_tenant
+        self.tenant_quotas = dict(tenant_quotas or {})
+
+        self.selector = get_region_selector(
+            "voice", region, endpoints_env="NOVA_ENDPOINT_URLS"
+        )
+        self._clients: dict[str, BedrockRuntimeClient] = {}
+        self._sessions: dict[str, SessionHandle] = {}
+        self._per_tenant: Counter[str] = Counter()
+        self._rejected = 0
+
+    def client_for(self, region: str) -> BedrockRuntimeClient:
+        client = self._clients.get(region)
+        if client is None:
+            cfg = Config(
+                endpoint_uri=self.selector.endpoint(region)
+                or f"https://bedrock-runtime.{region}.amazonaws.com",
+                region=region,
+                aws_credentials_identity_resolver=EnvironmentCredentialsResolver(),
+            )
+            client = self._clients[region] = BedrockRuntimeClient(cfg)
+        return client
+
+    @property
+    def client(self) -> BedrockRuntimeClient:
+        return self.client_for(self.selector.regions[0])
+
+    def quota_for(self, tenant_id: str) -> int:
+        return self.tenant_quotas.get(tenant_id, self.max_sessions_per_tenant)
+
+    def set_tenant_quota(self, tenant_id: str, limit: int):
+        self.tenant_quotas[tenant_id] = limit
+
+    def acquire(self, tenant_id: str) -> SessionHandle:
+        # Single-threaded event loop: the check and the increment cannot interleave
+        if len(self._sessions) >= self.max_sessions:
+            self._rejected += 1
+            raise SessionLimitExceeded("Voice server is at capacity")
+        if self._per_tenant[tenant_id] >= self.quota_for(tenant_id):
+            self._rejected += 1
+            raise SessionLimitExceeded(
+                f"Too many concurrent voice sessions for tenant {tenant_id}"
+            )
+
+        handle = SessionHandle(tenant_id=tenant_id)
+        self._sessions[handle.session_id] = handle
+        self._per_tenant[tenant_id] += 1
+        return handle
+
+    def release(self, handle: SessionHandle):
+        if self._sessions.pop(handle.session_id, None) is None:
+            return
+        self._per_tenant[handle.tenant_id] -= 1
+        if self._per_tenant[handle.tenant_id] <= 0:
+            del self._per_tenant[handle.tenant_id]
+
+    def _target(self, bridge: NovaSonicBridge, region: str):
+        bridge.region = region
+        bridge.client = self.client_for(region)
+        bridge.guard = region_guard(region, self.selector)
+
+    def create_bridge(self, **kwargs) -> NovaSonicBridge:
+        bridge = NovaSonicBridge(**kwargs)
+        self._target(bridge, self.selector.regions[0])
+        return bridge
+
+    async def start_bridge(self, bridge: NovaSonicBridge):
+        """Open the bridge's stream in the best region, failing over on errors."""
+
+        async def attempt(region: str):
+            self._target(bridge, region)
+            try:
+                await bridge.start()
+            except Exception:
+                # Opened but failed mid-setup: drop the half-built stream
+                await bridge.close()
+                raise
+
+        await self.selector.acall(attempt)
+
+    def stats(self) -> dict:
+        return {
+            "activeSessions": len(self._sessions),
+            "maxSessions": self.max_sessions,
+            "perTenant": dict(self._per_tenant),
+            "rejected": self._rejected,
+            "regions": self.selector.stats(),
+        }
+
+
+_manager: NovaSessionManager | None = None
+
+
+def get_session_manager() -> NovaSessionManager:
+    """Process-wide manager configured from the environment."""
+    global _manager
+    if _manager is None:
+        _manager = NovaSessionManager(
+            region=os.getenv("AWS_DEFAULT_REGION")
+            or os.getenv("AWS_REGION")
+            or "us-east-1",
+            max_sessions=int(os.getenv("NOVA_MAX_SESSIONS", "100")),
+            max_sessions_per_tenant=int(
+                os.getenv("NOVA_MAX_SESSIONS_PER_TENANT", "10")
+            ),
+            tenant_quotas=_parse_quotas(os.getenv("NOVA_TENANT_QUOTAS", "")),
+        )
+    return _manager
@@ -0,0 +1,402 @@
+"""
+Similar past cases for voice sessions.
+
+Stored analyses and finished voice conversations are embedded into an
+in-memory matrix; a user's question is embedded the same way and the
+nearest cases (cosine similarity, one matrix-vector product) are handed to
+Nova Sonic as context, so a problem the user already worked through starts
+from the known fix instead of being re-diagnosed over several turns.
+
+Every case carries the userId it came from and searches only ever score the
+caller's own rows: analyses and transcripts are private, so one user's
+cases are never read back to another. Cases without an owner are kept but
+never returned.
+
+The index lives in CASE_INDEX_DIR as two append-only files, cases.jsonl and
+vectors.f32 (raw float32 rows), and every new case is appended as it is
+added, so a crash or redeploy loses nothing.
+
+Only this server adds cases as they happen: /ws/analyze analyses and voice
+conversations. Images analysed by the Lambda (POST /items) are not indexed
+live; they reach the index when ``build`` is re-run over S3/DynamoDB and the
+server restarted on its output.
+
+Embeddings are pluggable: HashingEmbedder is deterministic and local (tests,
+dev, no Bedrock calls); TitanEmbedder uses Titan Text Embeddings v2. Pick one
+with CASE_EMBEDDINGS=hashing|titan.
+
+Bootstrap the index from S3/DynamoDB, then time queries:
+    python -m voiceChat.similar_cases build --out cases
+    python -m voiceChat.similar_cases bench --entries 100000
+
+bench exits 1 when the p50 misses --target-ms (10 ms). A query over 100k
+cases reads the whole 100 MB matrix, so it is memory-bandwidth bound: about
+10 ms on one core, which is at or just over the target; the matmul is already
+a single float32 BLAS call, and extra cores (OpenBLAS threads) are what
+bring it under.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from uploadImage.search_index import tokenize
+
+SUMMARY_CHARS = 400
+TARGET_P50_MS = 10.0
+
+
+class HashingEmbedder:
+    """Feature-hashed unigrams and bigrams, L2-normalised."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # blake2b rather than hash(): stable across processes
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                out[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-9)
+
+
+class TitanEmbedder:
+    def __init__(self, dim: int = 256, model_id: str = "amazon.titan-embed-text-v2:0"):
+        self.dim = dim
+        self.model_id = model_id
+        self._client = None
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        import boto3
+
+        from uploadImage.resilience import get_guard
+
+        if self._client is None:
+            region = os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION") or "us-east-1"
+            self._client = boto3.client("bedrock-runtime", region_name=region)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            response = get_guard().call(
+                self._client.invoke_model,
+                modelId=self.model_id,
+                body=json.dumps(
+                    {"inputText": text[:8000], "dimensions": self.dim, "normalize": True}
+                ),
+            )
+            out[row] = json.loads(response["body"].read())["embedding"]
+        return out
+
+
+def create_embedder():
+    dim = int(os.getenv("CASE_EMBEDDING_DIM", "256"))
+    if os.getenv("CASE_EMBEDDINGS") == "titan":
+        return TitanEmbedder(dim)
+    return HashingEmbedder(dim)
+
+
+class CaseIndex:
+    """Brute-force cosine search over a preallocated float32 matrix.
+
+    100k cases x 256 dims is ~100 MB and one query is a single BLAS
+    matrix-vector product (over the caller's rows) plus an argpartition.
+    With ``path`` set, new cases are appended to the files in that directory.
+    """
+
+    def __init__(self, embedder, *, capacity: int = 1024, path: str | None = None):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.path = path
+        self._vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._cases: list[dict] = []
+        self._ids: set[str] = set()
+        # userId -> row numbers of that user's cases
+        self._rows: dict[str, list[int]] = {}
+        # The same as index arrays, built on first search after a change;
+        # converting a 100k-entry list costs ~3 ms per query otherwise
+        self._row_arrays: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cases)
+
+    def add(self, case_id: str, text: str, summary: str | None = None, *, user_id: str, **meta):
+        self.add_vectors(
+            self.embedder([text]),
+            [
+                {
+                    "id": case_id,
+                    "userId": user_id,
+                    "summary": (summary or text)[:SUMMARY_CHARS],
+                    **meta,
+                }
+            ],
+        )
+
+    def add_vectors(self, vectors: np.ndarray, cases: list[dict], *, persist: bool = True):
+        with self._lock:
+            fresh = [i for i, case in enumerate(cases) if case["id"] not in self._ids]
+            if not fresh:
+                return
+            needed = len(self._cases) + len(fresh)
+            if needed > len(self._vectors):
+                grown = np.zeros((max(needed, len(self._vectors) * 2), self.dim), np.float32)
+                grown[: len(self._cases)] = self._vectors[: len(self._cases)]
+                # Searches already running keep the old array
+                self._vectors = grown
+            for i in fresh:
+                row = len(self._cases)
+                self._vectors[row] = vectors[i]
+                self._cases.append(cases[i])
+                self._ids.add(cases[i]["id"])
+                owner = cases[i].get("userId")
+                if owner:
+                    self._rows.setdefault(owner, []).append(row)
+                    self._row_arrays.pop(owner, None)
+            if persist and self.path:
+                self._append(vectors[fresh], [cases[i] for i in fresh])
+
+    def _append(self, vectors: np.ndarray, cases: list[dict]):
+        os.makedirs(self.path, exist_ok=True)
+        # Cases first: load() drops a case whose vector never made it
+        with open(os.path.join(self.path, "cases.jsonl"), "a", encoding="utf-8") as f:
+            for case in cases:
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+        with open(os.path.join(self.path, "vectors.f32"), "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+
+    def search_vector(
+        self, query: np.ndarray, k: int = 3, min_score: float = 0.0, *, user_id: str
+    ) -> list[dict]:
+        """The user's own closest cases, best first."""
+        with self._lock:
+            rows = self._row_arrays.get(user_id)
+            if rows is None:
+                rows = np.array(self._rows.get(user_id, ()), dtype=np.intp)
+                if len(rows):
+                    self._row_arrays[user_id] = rows
+            n = len(self._cases)
+            vectors, cases = self._vectors, self._cases
+        if not len(rows):
+            return []
+        if len(rows) * 4 < n:
+            # Gathering a few rows is cheaper than scoring everyone's
+            scores = vectors[rows] @ query
+        elif len(rows) == n:
+            # The only user: rows is 0..n-1, skip the extra copy
+            scores = vectors[:n] @ query
+        else:
+            scores = (vectors[:n] @ query)[rows]
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**cases[rows[i]], "score": float(scores[i])} for i in top if scores[i] >= min_score
+        ]
+
+    def search(self, text: str, k: int = 3, min_score: float = 0.0, *, user_id: str) -> list[dict]:
+        return self.search_vector(self.embedder([text])[0], k, min_score, user_id=user_id)
+
+    def save(self, path: str):
+        """Write the whole index to ``path``, replacing what is there."""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            n = len(self._cases)
+            with open(os.path.join(path, "vectors.f32"), "wb") as f:
+                f.write(self._vectors[:n].astype("<f4").tobytes())
+            with open(os.path.join(path, "cases.jsonl"), "w", encoding="utf-8") as f:
+                for case in self._cases:
+                    f.write(json.dumps(case, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, path: str, embedder) -> "CaseIndex":
+        """Open the index in ``path``; cases added later are appended there."""
+        index = cls(embedder, path=path)
+        try:
+            raw = np.fromfile(os.path.join(path, "vectors.f32"), dtype="<f4")
+            with open(os.path.join(path, "cases.jsonl"), encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        except FileNotFoundError:
+            return index
+        if len(raw) % index.dim:
+            print(f"case index at {path} does not match the embedder; starting over")
+            index.save(path)
+            return index
+        vectors = raw.reshape(-1, index.dim)
+        cases = []
+        # The last line may be torn if the process died mid-append
+        for line in lines[: len(vectors)]:
+            try:
+                cases.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+        index.add_vectors(vectors[: len(cases)], cases, persist=False)
+        if len(cases) != len(vectors) or len(lines) > len(cases) + 1:
+            # Drop the torn tail so later appends stay aligned
+            index.save(path)
+        return index
+
+
+class CaseRetriever:
+    """Turns a user's words into a context block of their own similar cases.
+
+    Searches run in a worker thread so the session's event loop keeps
+    streaming audio. Each session injects a case at most once.
+    """
+
+    def __init__(self, index: CaseIndex, *, k: int = 3, min_score: float = 0.35):
+        self.index = index
+        self.k = k
+        self.min_score = min_score
+
+    async def lookup(self, text: str, seen: set[str], user_id: str) -> str | None:
+        if len(tokenize(text)) < 3:
+            return None
+        started = time.perf_counter()
+        cases = await asyncio.to_thread(
+            self.index.search, text, self.k, self.min_score, user_id=user_id
+        )
+        cases = [case for case in cases if case["id"] not in seen]
+        print(
+            f"similar cases: {len(cases)} of {len(self.index)} in "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        if not cases:
+            return None
+        seen.update(case["id"] for case in cases)
+        lines = [f"{i}. {case['summary']}" for i, case in enumerate(cases, 1)]
+        return (
+            "For reference, similar problems I asked about before "
+            "(use them only if they fit what I describe):\n" + "\n".join(lines)
+        )
+
+
+def transcript_case_text(lines: list[str]) -> tuple[str, str]:
+    """(text to embed, summary to inject) for a conversation's JSON lines.
+
+    Only the assistant's side goes into the summary: it carries the fix,
+    and keeps the injected context short.
+    """
+    spoken, answers = [], []
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        spoken.append(entry.get("content", ""))
+        if entry.get("role") == "ASSISTANT":
+            answers.append(entry.get("content", ""))
+    return " ".join(spoken), " ".join(" ".join(answers).split())[:SUMMARY_CHARS]
+
+
+def create_case_index() -> CaseIndex:
+    """Backed by CASE_INDEX_DIR (default ``cases``), loaded when it exists."""
+    return CaseIndex.load(os.getenv("CASE_INDEX_DIR", "cases"), create_embedder())
+
+
+def build_from_storage(index: CaseIndex, s3, table, bucket: str):
+    """Add every stored analysis and voice transcript to ``index``."""
+    scan_kwargs = {}
+    while True:
+        page = table.scan(**scan_kwargs)
+        for item in page.get("Items", []):
+            if item.get("analysisKey"):
+                body = s3.get_object(Bucket=bucket, Key=item["analysisKey"])["Body"]
+                text = body.read().decode("utf-8")
+                index.add(
+                    item["id"],
+                    text,
+                    user_id=item.get("userId", ""),
+                    kind="analysis",
+                    category=item.get("category", ""),
+                )
+            elif item.get("transcriptPrefix"):
+                lines = []
+                for seq in range(int(item.get("transcriptSegments", 0))):
+                    key = f"{item['transcriptPrefix']}{seq:05d}.jsonl"
+                    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+                    lines.extend(body.read().decode("utf-8").splitlines())
+                text, summary = transcript_case_text(lines)
+                if summary:
+                    index.add(item["id"], text, summary, user_id=item.get("userId", ""), kind="voice")
+        if "LastEvaluatedKey" not in page:
+            return
+        scan_kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def bench(entries: int, queries: int = 200, target_ms: float = TARGET_P50_MS) -> bool:
+    """Print query timings; False when the p50 misses ``target_ms``."""
+    rng = np.random.default_rng(0)
+    embedder = HashingEmbedder()
+    index = CaseIndex(embedder, capacity=entries)
+    vectors = rng.standard_normal((entries, embedder.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # One heavy user owning every case is the worst case for a search
+    index.add_vectors(
+        vectors, [{"id": str(i), "userId": "bench", "summary": ""} for i in range(entries)]
+    )
+
+    texts = ["my wifi router keeps dropping the connection every evening"] * queries
+    timings = []
+    for text in texts:
+        started = time.perf_counter()
+        index.search(text, k=3, user_id="bench")
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    print(
+        f"{entries} entries x {embedder.dim} dims: "
+        f"p50 {p50:.2f} ms, "
+        f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms per query (embed + search)"
+    )
+    if p50 > target_ms:
+        print(f"MISSED: p50 {p50:.2f} ms is over the {target_ms:g} ms target")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Similar-case index tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="index stored analyses and transcripts")
+    build.add_argument("--out", default=os.getenv("CASE_INDEX_DIR", "cases"))
+    timing = sub.add_parser("bench", help="time queries on a synthetic index")
+    timing.add_argument("--entries", type=int, default=100_000)
+    timing.add_argument("--target-ms", type=float, default=TARGET_P50_MS)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        if not bench(args.entries, target_ms=args.target_ms):
+            sys.exit(1)
+        return
+
+    import boto3
+
+    region = os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION") or "us-east-1"
+    index = CaseIndex(create_embedder())
+    build_from_storage(
+        index,
+        boto3.client("s3", region_name=region),
+        boto3.resource("dynamodb", region_name=region).Table(os.environ["TABLE_NAME"]),
+        os.environ["S3_BUCKET_NAME"],
+    )
+    index.save(args.out)
+    print(f"indexed {len(index)} cases into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
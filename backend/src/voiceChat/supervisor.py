@@ -0,0 +1,188 @@
+"""
+Reclaims voice sessions nobody is using any more.
+
+The bridge's keepalive holds a Nova stream open through silence, so without
+a supervisor an abandoned browser tab keeps a Bedrock stream, its tasks and a
+session slot forever. Every /ws/nova session registers a SessionActivity; a
+background sweep closes sessions that have been idle too long, have run past
+the duration cap, or are buffering more than their budget (a client that
+stopped reading), and counts what it reclaimed for /health.
+
+Limits come from the environment (see ``get_supervisor``).
+"""
+
+import asyncio
+import os
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+# Reclaim reasons, reported to the client and counted in stats()
+IDLE = "idle"
+MAX_DURATION = "max_duration"
+BACKPRESSURE = "backpressure"
+MEMORY = "memory"
+
+# Reclaim(reason, websocket close code)
+Reclaim = Callable[[str, int], Awaitable[None]]
+
+
+@dataclass
+class SupervisorConfig:
+    idle_seconds: float = 120
+    max_duration_seconds: float = 1800
+    # Outbound messages waiting for a slow client, or one send taking this
+    # long (the bridge waits on each send, so a stuck client stalls it)
+    max_pending_sends: int = 200
+    max_send_stall_seconds: float = 30
+    # Outbound payloads plus registered buffers (transcript, audio tails)
+    max_buffered_bytes: int = 8 * 1024 * 1024
+    check_interval: float = 5
+
+    @classmethod
+    def from_env(cls) -> "SupervisorConfig":
+        defaults = cls()
+        return cls(
+            idle_seconds=float(os.getenv("VOICE_IDLE_SECONDS", str(defaults.idle_seconds))),
+            max_duration_seconds=float(
+                os.getenv("VOICE_MAX_SESSION_SECONDS", str(defaults.max_duration_seconds))
+            ),
+            max_pending_sends=int(
+                os.getenv("VOICE_MAX_PENDING_SENDS", str(defaults.max_pending_sends))
+            ),
+            max_send_stall_seconds=float(
+                os.getenv("VOICE_MAX_SEND_STALL_SECONDS", str(defaults.max_send_stall_seconds))
+            ),
+            max_buffered_bytes=int(
+                os.getenv("VOICE_MAX_BUFFERED_BYTES", str(defaults.max_buffered_bytes))
+            ),
+            check_interval=float(
+                os.getenv("VOICE_SUPERVISOR_INTERVAL", str(defaults.check_interval))
+            ),
+        )
+
+
+class SessionActivity:
+    """What the supervisor knows about one session.
+
+    ``touch`` marks real user activity (speech Nova transcribed, typed text,
+    mic start/stop); silent audio and pings do not count.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.started_at = time.monotonic()
+        self.last_activity = self.started_at
+        self.pending_sends = 0
+        self.pending_bytes = 0
+        # When the send currently on the wire started, if any
+        self.sending_since: float | None = None
+        # Client traffic, for /debug/sessions
+        self.messages_in = 0
+        self.bytes_in = 0
+        self.messages_out = 0
+        self.bytes_out = 0
+        self._probes: list[Callable[[], int]] = []
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def add_probe(self, probe: Callable[[], int]):
+        """Register a callable returning bytes a session component holds."""
+        self._probes.append(probe)
+
+    def buffered_bytes(self) -> int:
+        return self.pending_bytes + sum(probe() for probe in self._probes)
+
+    def debug_state(self) -> dict:
+        now = time.monotonic()
+        return {
+            "ageSeconds": round(now - self.started_at, 1),
+            "idleSeconds": round(now - self.last_activity, 1),
+            "pendingSends": self.pending_sends,
+            "pendingBytes": self.pending_bytes,
+            "bufferedBytes": self.buffered_bytes(),
+            "messagesIn": self.messages_in,
+            "bytesIn": self.bytes_in,
+            "messagesOut": self.messages_out,
+            "bytesOut": self.bytes_out,
+        }
+
+
+class SessionSupervisor:
+    def __init__(self, config: SupervisorConfig | None = None):
+        self.config = config or SupervisorConfig()
+        self._sessions: dict[str, tuple[SessionActivity, Reclaim]] = {}
+        self._task: asyncio.Task | None = None
+        self.reclaimed: Counter[str] = Counter()
+
+    def register(self, activity: SessionActivity, reclaim: Reclaim):
+        self._sessions[activity.session_id] = (activity, reclaim)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def unregister(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def mean_pending_sends(self) -> float:
+        """Outbound messages waiting per session, a host-wide load signal."""
+        if not self._sessions:
+            return 0.0
+        return sum(a.pending_sends for a, _ in self._sessions.values()) / len(self._sessions)
+
+    def verdict(self, activity: SessionActivity, now: float) -> tuple[str, int] | None:
+        """(reason, close code) if the session should be reclaimed."""
+        config = self.config
+        if now - activity.started_at > config.max_duration_seconds:
+            return MAX_DURATION, 1000
+        if now - activity.last_activity > config.idle_seconds:
+            return IDLE, 1000
+        # 1008: policy violation
+        stalled = activity.sending_since is not None and (
+            now - activity.sending_since > config.max_send_stall_seconds
+        )
+        if stalled or activity.pending_sends > config.max_pending_sends:
+            return BACKPRESSURE, 1008
+        if activity.buffered_bytes() > config.max_buffered_bytes:
+            return MEMORY, 1008
+        return None
+
+    async def sweep(self):
+        now = time.monotonic()
+        for session_id, (activity, reclaim) in list(self._sessions.items()):
+            verdict = self.verdict(activity, now)
+            if verdict is None:
+                continue
+            reason, code = verdict
+            self.unregister(session_id)
+            self.reclaimed[reason] += 1
+            print(f"reclaiming voice session {session_id}: {reason}")
+            try:
+                await reclaim(reason, code)
+            except Exception as e:
+                print(f"reclaiming {session_id} failed: {e}")
+
+    async def _run(self):
+        while self._sessions:
+            await asyncio.sleep(self.config.check_interval)
+            await self.sweep()
+
+    def stats(self) -> dict:
+        return {
+            "supervised": len(self._sessions),
+            "reclaimed": dict(self.reclaimed),
+            "idleSeconds": self.config.idle_seconds,
+            "maxSessionSeconds": self.config.max_duration_seconds,
+        }
+
+
+_supervisor: SessionSupervisor | None = None
+
+
+def get_supervisor() -> SessionSupervisor:
+    """Process-wide supervisor configured from VOICE_* variables."""
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = SessionSupervisor(SupervisorConfig.from_env())
+    return _supervisor
@@ -0,0 +1,170 @@
+import asyncio
+import datetime
+import json
+import os
+import time
+from collections import deque
+
+from uploadImage.search_index import create_search_index, transcript_document
+
+
+def index_batch(search_index, session_id: str, user_id: str, seq: int, lines: list[str]):
+    if search_index is None:
+        return
+    try:
+        search_index.add(user_id, [transcript_document(session_id, seq, lines)])
+    except Exception as e:
+        # The batch itself is stored; search just misses it
+        print(f"search index update failed for {session_id}/{seq}: {e}")
+
+
+class LocalTranscriptSink:
+    """Dev backend: one JSON-lines file per session."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Only indexed when SEARCH_INDEX_DIR is set
+        self.search_index = create_search_index()
+
+    def write_batch(self, session_id: str, user_id: str, seq: int, lines: list[str]):
+        path = os.path.join(self.directory, f"{session_id}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        index_batch(self.search_index, session_id, user_id, seq, lines)
+
+
+class S3TranscriptSink:
+    """Writes each batch as an S3 segment and tracks it on the records table.
+
+    Segments are immutable (``transcripts/<id>/00000.jsonl``, ``00001.jsonl``…),
+    so a flush never rewrites earlier text. The record item sits next to the
+    image records and is what ``GET /records`` lists; each batch is also added
+    to the user's search index.
+    """
+
+    def __init__(self, bucket: str, table_name: str, region: str = "us-east-1"):
+        import boto3
+
+        self.bucket = bucket
+        self.s3 = boto3.client("s3", region_name=region)
+        self.table = boto3.resource("dynamodb", region_name=region).Table(table_name)
+        self.search_index = create_search_index(self.s3, bucket)
+
+    def write_batch(self, session_id: str, user_id: str, seq: int, lines: list[str]):
+        prefix = f"transcripts/{session_id}/"
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{prefix}{seq:05d}.jsonl",
+            Body=("\n".join(lines) + "\n").encode("utf-8"),
+            ContentType="application/x-ndjson",
+        )
+
+        if seq == 0:
+            self.table.put_item(
+                Item={
+                    "id": session_id,
+                    "recordType": "voice",
+                    "transcriptPrefix": prefix,
+                    "transcriptSegments": 1,
+                    "createdAt": datetime.datetime.now(
+                        datetime.timezone.utc
+                    ).isoformat(),
+                    "userId": user_id,
+                }
+            )
+        else:
+            self.table.update_item(
+                Key={"id": session_id},
+                UpdateExpression="SET transcriptSegments = :n",
+                ExpressionAttributeValues={":n": seq + 1},
+            )
+        index_batch(self.search_index, session_id, user_id, seq, lines)
+
+
+def create_transcript_sink():
+    """S3/DynamoDB when the deployment provides them, a local directory otherwise."""
+    bucket = os.getenv("S3_BUCKET_NAME")
+    table_name = os.getenv("TABLE_NAME")
+    if bucket and table_name:
+        region = os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION") or "us-east-1"
+        return S3TranscriptSink(bucket, table_name, region)
+    return LocalTranscriptSink(os.getenv("TRANSCRIPT_DIR", "transcripts"))
+
+
+class TranscriptWriter:
+    """Buffers transcript segments and flushes them in batches.
+
+    ``append`` only touches an in-memory list, so it is safe to call from the
+    response loop. Flushes happen on turn boundaries or when the buffer grows
+    past ``max_bytes``, run in a worker thread, and are serialised so segments
+    land in order.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        user_id: str,
+        sink,
+        *,
+        max_bytes: int = 16_384,
+        keep_lines: int = 200,
+    ):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.sink = sink
+        self.max_bytes = max_bytes
+
+        self._buffer: list[str] = []
+        # The last lines of the conversation, kept after flushing so the
+        # session can be indexed as a case when it ends
+        self.history: deque[str] = deque(maxlen=keep_lines)
+        self._buffer_bytes = 0
+        self._seq = 0
+        self._lock = asyncio.Lock()
+        self._pending: set[asyncio.Task] = set()
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._buffer_bytes
+
+    def append(self, role: str, content: str):
+        if not content:
+            return
+        line = json.dumps(
+            {"role": role, "content": content, "ts": round(time.time(), 3)},
+            ensure_ascii=False,
+        )
+        self._buffer.append(line)
+        self.history.append(line)
+        self._buffer_bytes += len(line)
+        if self._buffer_bytes >= self.max_bytes:
+            self._schedule_flush()
+
+    def end_turn(self):
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self._buffer:
+            return
+        lines, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        task = asyncio.create_task(self._flush(lines))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _flush(self, lines: list[str]):
+        async with self._lock:
+            seq = self._seq
+            try:
+                await asyncio.to_thread(
+                    self.sink.write_batch, self.session_id, self.user_id, seq, lines
+                )
+                self._seq += 1
+            except Exception as e:
+                # Losing a transcript batch must never take the call down
+                print(f"transcript flush failed for {self.session_id}: {e}")
+
+    async def close(self):
+        self._schedule_flush()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# Tests import modules the way the voice server does (voiceChat.x, uploadImage.x)
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+sys.path.insert(0, SRC)
+
+UPLOAD_IMAGE_DIR = os.path.abspath(os.path.join(SRC, "uploadImage"))
+
+
+@pytest.fixture
+def lambda_app(monkeypatch):
+    """uploadImage/app.py loaded the way the Lambda runtime loads it (flat
+    imports from its own directory), backed by the local_aws stand-ins.
+
+    The flat modules are dropped again afterwards, so they never sit next to
+    the uploadImage.* copies the other tests use.
+    """
+    monkeypatch.setenv("S3_BUCKET_NAME", "test-bucket")
+    monkeypatch.setenv("TABLE_NAME", "test-records")
+    monkeypatch.delenv("SEARCH_INDEX_DIR", raising=False)
+    monkeypatch.delenv("EXPORT_JOB_FUNCTION", raising=False)
+    monkeypatch.syspath_prepend(UPLOAD_IMAGE_DIR)
+    import app
+    from local_aws import LocalS3, LocalTable
+
+    app._s3 = LocalS3()
+    app._table = LocalTable(indexes={"UserCategoryIndex": ("userCategory", "createdAt")})
+    try:
+        yield app
+    finally:
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None)
+            flat = name.partition(".")[0] != "uploadImage"
+            if flat and path and os.path.dirname(os.path.abspath(path)) == UPLOAD_IMAGE_DIR:
+                del sys.modules[name]
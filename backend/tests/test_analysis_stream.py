@@ -0,0 +1,67 @@
+import pytest
+
+from uploadImage.imageAnalyzeBot import AnalysisStream, split_analysis
+from uploadImage.local_aws import LocalS3, LocalTable
+from uploadImage.records import put_analysis_record
+
+DETAILS = '<details>{"category": "Kettle", "brand": "Bosch", "symptoms": ["no power"]}</details>'
+
+
+def _stream(chunks):
+    stream = AnalysisStream(iter(chunks))
+    return stream, list(stream)
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        ["The kettle has no power. ", "Check the fuse.\n", DETAILS],
+        # The tag split across chunks is held back, never shown
+        ["The kettle has no power. Check the fuse.\n<det", "ails>", DETAILS[9:]],
+        ["The kettle has no power. Check the fuse.\n<", "d", "etails>{", DETAILS[10:]],
+        # One chunk with prose and details
+        ["The kettle has no power. Check the fuse.\n" + DETAILS],
+    ],
+)
+def test_details_block_is_never_shown(chunks):
+    stream, shown = _stream(chunks)
+    assert "".join(shown) == "The kettle has no power. Check the fuse.\n"
+    assert all("<" not in piece for piece in shown)
+    assert stream.analysis.text == "The kettle has no power. Check the fuse."
+    assert stream.analysis.details() == {
+        "category": "kettle",
+        "brand": "Bosch",
+        "symptoms": ["no power"],
+    }
+
+
+def test_text_that_only_looks_like_the_tag_is_released():
+    stream, shown = _stream(["Use a <d", "ifferent> plug", " <"])
+    assert "".join(shown) == "Use a <different> plug <"
+    assert stream.analysis.category == "unknown"
+
+
+def test_analysis_is_set_only_after_iteration():
+    stream = AnalysisStream(iter(["text"]))
+    assert stream.analysis is None
+    list(stream)
+    assert stream.analysis.text == "text"
+
+
+def test_split_analysis_tolerates_bad_details():
+    analysis = split_analysis("Looks like a router.\n<details>{not json")
+    assert analysis.text == "Looks like a router."
+    assert analysis.details() == {"category": "unknown", "brand": None, "symptoms": []}
+
+
+def test_streamed_analysis_is_stored_like_an_uploaded_one():
+    s3, table = LocalS3(), LocalTable()
+    details = {"category": "kettle", "brand": None, "symptoms": ["no power"]}
+    key = put_analysis_record(
+        s3, table, "bucket", "f1", "images/f1.jpg", "Check the fuse.", "alice", details
+    )
+    assert s3.get_object(Bucket="bucket", Key=key)["Body"].read() == b"Check the fuse."
+    item = table.get_item(Key={"id": "f1"})["Item"]
+    assert item["userCategory"] == "alice#kettle"
+    assert item["symptoms"] == ["no power"]
+    assert "brand" not in item
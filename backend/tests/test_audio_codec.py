@@ -0,0 +1,109 @@
+import base64
+import math
+import struct
+
+import pytest
+
+from voiceChat.audio_codec import (
+    CODEC_OPUS,
+    CODEC_PCM,
+    FrameSplitter,
+    OpusCodec,
+    PcmCodec,
+    available_codecs,
+    create_codec,
+    negotiate_codec,
+    opuslib,
+)
+
+needs_opus = pytest.mark.skipif(opuslib is None, reason="libopus is not installed")
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("utf-8")
+
+
+def _tone(samples: int, rate: int) -> bytes:
+    return struct.pack(
+        f"<{samples}h", *(int(8000 * math.sin(2 * math.pi * 440 * i / rate)) for i in range(samples))
+    )
+
+
+def test_pcm_is_always_available_and_the_fallback():
+    assert CODEC_PCM in available_codecs()
+    assert negotiate_codec([]) == CODEC_PCM
+    assert negotiate_codec(["flac", ""]) == CODEC_PCM
+    assert negotiate_codec([" PCM "]) == CODEC_PCM
+
+
+def test_opus_is_chosen_only_when_available():
+    expected = CODEC_OPUS if opuslib is not None else CODEC_PCM
+    assert negotiate_codec(["opus", "pcm"]) == expected
+    assert negotiate_codec(["pcm", "opus"]) == CODEC_PCM
+
+
+def test_pcm_codec_passes_audio_through():
+    codec = create_codec(CODEC_PCM)
+    assert isinstance(codec, PcmCodec)
+    event = {"content": _b64(b"\x01\x02" * 10), "sampleRateHertz": 24000}
+    assert codec.decode_input(event["content"]) == event["content"]
+    assert codec.encode_output(event) is event
+    assert codec.flush() is None
+
+
+def test_frame_splitter_carries_the_tail():
+    frames = FrameSplitter(4)
+    assert frames.push(b"abc") == []
+    assert frames.push(b"defghij") == [b"abcd", b"efgh"]
+    assert frames.pending == 2
+    assert frames.push(b"kl") == [b"ijkl"]
+    assert frames.pending == 0
+    assert frames.flush() is None
+
+
+def test_frame_splitter_pads_the_last_frame_with_silence():
+    frames = FrameSplitter(4)
+    frames.push(b"abcdef")
+    assert frames.flush() == b"ef\x00\x00"
+    assert frames.pending == 0
+
+
+def test_frame_splitter_reset_drops_the_tail():
+    frames = FrameSplitter(4)
+    frames.push(b"abcdef")
+    frames.reset()
+    assert frames.flush() is None
+    assert frames.push(b"wxyz") == [b"wxyz"]
+
+
+@needs_opus
+def test_opus_round_trip_keeps_frame_alignment():
+    codec = OpusCodec()
+    # 50 ms: two whole 20 ms frames plus 10 ms carried over
+    out = codec.encode_output({"content": _b64(_tone(1200, 24000))})
+    assert out["mediaType"] == "audio/opus"
+    assert len(out["packets"]) == 2
+    tail = codec.flush()
+    assert len(tail["packets"]) == 1
+    assert codec.flush() is None
+
+    # Input is 16 kHz: a 20 ms packet decodes to 320 samples
+    encoder = opuslib.Encoder(16000, 1, "voip")
+    packet = encoder.encode(_tone(320, 16000), 320)
+    assert len(base64.b64decode(codec.decode_input(_b64(packet)))) == 640
+
+
+@needs_opus
+def test_interrupted_reply_is_not_flushed():
+    codec = OpusCodec()
+    codec.encode_output({"content": _b64(_tone(600, 24000))})
+    codec.reset()
+    assert codec.flush() is None
+
+
+@needs_opus
+@pytest.mark.parametrize("content", ["not base64!", _b64(b"\xff" * 2000)])
+def test_bad_opus_packets_are_dropped_and_counted(content):
+    codec = OpusCodec()
+    assert codec.decode_input(content) == ""
+    assert codec.dropped_packets == 1
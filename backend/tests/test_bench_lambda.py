@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from boto3.dynamodb.conditions import Attr, Key
+
+from uploadImage import local_aws
+from uploadImage.local_aws import LocalS3, LocalTable
+
+UPLOAD_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "src", "uploadImage")
+
+
+def _bench(tmp_path, *extra):
+    out = tmp_path / "bench.json"
+    result = subprocess.run(
+        [
+            sys.executable,
+            "bench_lambda.py",
+            "--quick",
+            "--iterations", "5",
+            "--rows", "10",
+            "--image-sizes", "64",
+            "--out", str(out),
+            *extra,
+        ],
+        cwd=UPLOAD_IMAGE_DIR,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    return result, out
+
+
+@pytest.mark.parametrize("regressed", [False, True])
+def test_quick_bench_runs_every_route_and_checks_the_baseline(tmp_path, regressed):
+    result, out = _bench(tmp_path)
+    assert result.returncode == 0, result.stderr
+    results = json.loads(out.read_text())
+    scenarios = {r["scenario"] for r in results["scenarios"]}
+    assert {"POST /items", "GET /records/search", "GET /records/{id}"} <= scenarios
+    assert "GET /records?category (10 rows)" in scenarios
+    assert results["memory"][0]["imageKB"] == 64
+
+    if regressed:
+        # A baseline faster than anything achievable: every scenario regressed
+        for r in results["scenarios"]:
+            r["p95Ms"] = 1e-6
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(results))
+    result, _ = _bench(tmp_path, "--baseline", str(baseline), "--tolerance", "100")
+    assert result.returncode == (1 if regressed else 0), result.stdout
+
+
+def test_scan_pages_at_the_dynamodb_limit(monkeypatch):
+    monkeypatch.setattr(local_aws, "SCAN_PAGE_BYTES", 2000)
+    table = LocalTable()
+    for i in range(30):
+        table.put_item(Item={"id": f"r{i:02d}", "userId": "alice" if i % 3 else "bob", "pad": "x" * 200})
+
+    pages, start = [], None
+    while True:
+        kwargs = {"ExclusiveStartKey": start} if start else {}
+        page = table.scan(FilterExpression=Attr("userId").eq("bob"), **kwargs)
+        pages.append(page["Items"])
+        start = page.get("LastEvaluatedKey")
+        if not start:
+            break
+    assert len(pages) > 1
+    assert [item["id"] for page in pages for item in page] == [f"r{i:02d}" for i in range(0, 30, 3)]
+
+
+def test_query_reads_a_gsi_newest_first():
+    table = LocalTable(indexes={"UserCategoryIndex": ("userCategory", "createdAt")})
+    table.put_item(Item={"id": "a", "userCategory": "alice#router", "createdAt": "2024-01-01"})
+    table.put_item(Item={"id": "b", "userCategory": "alice#router", "createdAt": "2024-03-01"})
+    table.put_item(Item={"id": "c", "userCategory": "alice#kettle", "createdAt": "2024-02-01"})
+    table.put_item(Item={"id": "voice", "createdAt": "2024-04-01"})
+    result = table.query(
+        IndexName="UserCategoryIndex",
+        KeyConditionExpression=Key("userCategory").eq("alice#router"),
+        ScanIndexForward=False,
+    )
+    assert [item["id"] for item in result["Items"]] == ["b", "a"]
+
+
+def test_local_s3_lists_in_pages_and_completes_multipart_uploads():
+    s3 = LocalS3()
+    for i in range(5):
+        s3.put_object(Bucket="b", Key=f"k/{i}", Body=b"x")
+    first = s3.list_objects_v2(Bucket="b", Prefix="k/", MaxKeys=3)
+    rest = s3.list_objects_v2(Bucket="b", Prefix="k/", ContinuationToken=first["NextContinuationToken"])
+    assert [o["Key"] for o in first["Contents"] + rest["Contents"]] == [f"k/{i}" for i in range(5)]
+
+    upload = s3.create_multipart_upload(Bucket="b", Key="big")["UploadId"]
+    etags = [
+        s3.upload_part(Bucket="b", Key="big", UploadId=upload, PartNumber=n, Body=body)["ETag"]
+        for n, body in ((1, b"ab"), (2, b"cd"))
+    ]
+    s3.complete_multipart_upload(
+        Bucket="b",
+        Key="big",
+        UploadId=upload,
+        MultipartUpload={"Parts": [{"PartNumber": n, "ETag": e} for n, e in zip((1, 2), etags)]},
+    )
+    assert s3.get_object(Bucket="b", Key="big")["Body"].read() == b"abcd"
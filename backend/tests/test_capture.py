@@ -0,0 +1,101 @@
+import base64
+import json
+
+import pytest
+
+from voiceChat import capture
+from voiceChat.capture import CaptureReader, SessionRecorder, create_session_recorder
+
+
+def _records(path):
+    with CaptureReader(path) as reader:
+        return [(record.kind, bytes(record.payload)) for record in reader]
+
+
+def _record_session(path):
+    recorder = SessionRecorder(str(path), {"sessionId": "s1", "codec": "pcm"})
+    recorder.record(capture.CLIENT_START_AUDIO)
+    recorder.client_audio(base64.b64encode(b"\x01\x02" * 160).decode())
+    recorder.client_text("my router is blinking")
+    recorder.nova_event({"audioOutput": {"content": base64.b64encode(b"\x03\x04").decode()}}, b"{}")
+    recorder.nova_event({"textOutput": {"content": "Try a restart"}}, b'{"textOutput": 1}')
+    recorder.record(capture.CLIENT_END_AUDIO)
+    recorder.close()
+    return recorder
+
+
+def test_recorded_session_reads_back_record_for_record(tmp_path):
+    path = tmp_path / "s1.hfcap"
+    recorder = _record_session(path)
+    assert recorder.records == 7
+    assert path.stat().st_size == len(capture.MAGIC) + recorder.bytes
+
+    assert _records(path) == [
+        (capture.META, json.dumps({"sessionId": "s1", "codec": "pcm"}).encode()),
+        (capture.CLIENT_START_AUDIO, b""),
+        # Audio is stored decoded, not as base64
+        (capture.CLIENT_AUDIO, b"\x01\x02" * 160),
+        (capture.CLIENT_TEXT, b"my router is blinking"),
+        (capture.NOVA_AUDIO, b"\x03\x04"),
+        (capture.NOVA_EVENT, b'{"textOutput": 1}'),
+        (capture.CLIENT_END_AUDIO, b""),
+    ]
+    # Records after close() are ignored
+    recorder.client_text("late")
+    assert len(_records(path)) == 7
+
+
+def test_times_are_seconds_since_the_session_started(tmp_path, monkeypatch):
+    now = [50.0]
+    monkeypatch.setattr(capture.time, "monotonic", lambda: now[0])
+    recorder = SessionRecorder(str(tmp_path / "s.hfcap"))
+    now[0] += 1.5
+    recorder.client_text("hello")
+    recorder.close()
+    with CaptureReader(recorder.path) as reader:
+        assert [record.t for record in reader] == [1.5]
+
+
+def test_torn_final_record_is_dropped(tmp_path):
+    path = tmp_path / "s1.hfcap"
+    _record_session(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:-1])
+    assert [kind for kind, _ in _records(path)][-1] == capture.NOVA_EVENT
+    # Half a record header reads the same
+    path.write_bytes(data + b"\x02\x00")
+    assert len(_records(path)) == 7
+
+
+def test_summary_counts_records_and_payload(tmp_path):
+    path = tmp_path / "s1.hfcap"
+    _record_session(path)
+    with CaptureReader(str(path)) as reader:
+        summary = reader.summary()
+    assert summary["meta"] == {"sessionId": "s1", "codec": "pcm"}
+    assert summary["records"]["audio"] == 1
+    assert summary["payloadBytes"]["audio"] == 320
+    assert summary["fileBytes"] == path.stat().st_size
+
+
+@pytest.mark.parametrize("data", [b"HF", b"NOTACAPTURE"])
+def test_other_files_are_rejected(tmp_path, data):
+    path = tmp_path / "bad.hfcap"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        CaptureReader(str(path))
+
+
+def test_recorders_only_exist_when_capture_is_enabled(tmp_path, monkeypatch):
+    monkeypatch.delenv("VOICE_CAPTURE_DIR", raising=False)
+    assert create_session_recorder("s1", {}) is None
+
+    monkeypatch.setenv("VOICE_CAPTURE_DIR", str(tmp_path / "captures"))
+    monkeypatch.setenv("VOICE_CAPTURE_SAMPLE", "0")
+    assert create_session_recorder("s1", {}) is None
+
+    monkeypatch.setenv("VOICE_CAPTURE_SAMPLE", "1")
+    recorder = create_session_recorder("s1", {"sessionId": "s1"})
+    recorder.close()
+    assert recorder.path == str(tmp_path / "captures" / "s1.hfcap")
+    assert _records(recorder.path)[0][0] == capture.META
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from uploadImage import imageAnalyzeBot
+from uploadImage.imageAnalyzeBot import CascadeConfig, _parse_cascade_reply, analyze_with_cascade
+
+CONFIG = CascadeConfig(first_model="lite", escalation_model="pro", threshold=0.7)
+
+
+def _reply(confidence: float, answer: str = "Unplug it for 30 seconds.", **extra) -> dict:
+    data = {
+        "confidence": confidence,
+        "category": "Router",
+        "brand": "null",
+        "symptoms": ["No Internet", "no internet"],
+        "answer": answer,
+        **extra,
+    }
+    return {
+        "output": {"message": {"content": [{"text": json.dumps(data)}]}},
+        "stopReason": "end_turn",
+        "usage": {"inputTokens": 10, "outputTokens": 5},
+    }
+
+
+@pytest.fixture
+def invoke(monkeypatch):
+    """Replaces Bedrock: queue one reply per model id."""
+    replies: dict[str, dict] = {}
+    calls: list[str] = []
+
+    def fake_invoke(model_id, native_request):
+        calls.append(model_id)
+        assert native_request["inferenceConfig"]["maxTokens"] in (
+            CONFIG.first_max_tokens,
+            CONFIG.escalation_max_tokens,
+        )
+        return replies[model_id]
+
+    monkeypatch.setattr(imageAnalyzeBot, "_invoke", fake_invoke)
+    return replies, calls
+
+
+def test_confident_first_tier_is_not_escalated(invoke):
+    replies, calls = invoke
+    replies["lite"] = _reply(0.9)
+    result = analyze_with_cascade("aW1n", CONFIG)
+    assert calls == ["lite"]
+    assert not result.escalated
+    assert result.model == "lite"
+    assert result.text == "Unplug it for 30 seconds."
+    assert (result.category, result.brand, result.symptoms) == ("router", None, ["no internet"])
+
+
+def test_unsure_first_tier_is_escalated(invoke):
+    replies, calls = invoke
+    replies["lite"] = _reply(0.4, "Maybe a modem?")
+    replies["pro"] = _reply(0.95, "Reset the router.")
+    result = analyze_with_cascade("aW1n", CONFIG)
+    assert calls == ["lite", "pro"]
+    assert result.escalated
+    assert result.text == "Reset the router."
+    assert [model for model, _ in result.calls] == ["lite", "pro"]
+
+
+def test_detailed_requests_go_straight_to_the_escalation_model(invoke):
+    replies, calls = invoke
+    replies["pro"] = _reply(0.2)
+    result = analyze_with_cascade("aW1n", CONFIG, detailed=True)
+    assert calls == ["pro"]
+    assert result.escalated
+    # The last tier's answer is used whatever its confidence
+    assert result.confidence == 0.2
+
+
+def test_truncated_first_tier_escalates_even_when_confident(invoke):
+    replies, calls = invoke
+    cut = '{"confidence": 0.9, "category": "kettle", "brand": null, "symptoms": ["no power"], "answer": "Check the fu'
+    replies["lite"] = {
+        "output": {"message": {"content": [{"text": cut}]}},
+        "stopReason": "max_tokens",
+        "usage": {},
+    }
+    replies["pro"] = _reply(0.8, "Check the fuse in the plug.")
+    result = analyze_with_cascade("aW1n", CONFIG)
+    assert calls == ["lite", "pro"]
+    assert result.text == "Check the fuse in the plug."
+
+
+def test_cut_off_reply_keeps_its_leading_fields():
+    parsed = _parse_cascade_reply(
+        '{"confidence": 0.85, "category": "Washing Machine", "brand": "Bosch", '
+        '"symptoms": ["leaking", "noisy"], "answer": "The door seal \\"gasket\\" is wo'
+    )
+    assert parsed["truncated"]
+    assert parsed["confidence"] == 0.85
+    assert parsed["category"] == "washing machine"
+    assert parsed["brand"] == "Bosch"
+    assert parsed["symptoms"] == ["leaking", "noisy"]
+    assert parsed["answer"] == 'The door seal "gasket" is wo'
+
+
+def test_unparseable_reply_has_no_confidence():
+    parsed = _parse_cascade_reply("I cannot tell what this is.")
+    assert parsed["confidence"] == 0.0
+    assert parsed["category"] == "unknown"
+    assert parsed["answer"] == "I cannot tell what this is."
+    assert not parsed["truncated"]
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+# chatbot.py pulls in the Nova Sonic bridge and its Bedrock SDK
+pytest.importorskip("aws_sdk_bedrock_runtime")
+
+from voiceChat.chatbot import RingBuffer  # noqa: E402
+
+
+def test_ring_reads_back_in_order_across_the_wrap():
+    ring = RingBuffer(8)
+    assert ring.write(b"abcdef") == 6
+    assert ring.read(4) == b"abcd"
+    # Wraps: 2 bytes at the end of the buffer, 4 at the start
+    assert ring.write(b"ghijkl") == 6
+    assert ring.available() == 8
+    assert ring.read() == b"efghijkl"
+    assert ring.read() == b""
+
+
+def test_full_ring_drops_what_does_not_fit():
+    ring = RingBuffer(4)
+    assert ring.write(b"abc") == 3
+    assert ring.write(b"def") == 1
+    assert ring.write(b"x") == 0
+    assert ring.read() == b"abcd"
+
+
+def test_one_producer_and_one_consumer_see_every_byte():
+    ring = RingBuffer(64)
+    data = bytes(range(256)) * 40
+    received = bytearray()
+
+    def produce():
+        sent = 0
+        while sent < len(data):
+            sent += ring.write(data[sent : sent + 37])
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    while len(received) < len(data):
+        received += ring.read(29)
+    producer.join()
+    assert bytes(received) == data
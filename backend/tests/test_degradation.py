@@ -0,0 +1,126 @@
+import pytest
+
+from voiceChat import degradation
+from voiceChat.degradation import (
+    COARSE_AUDIO,
+    NORMAL,
+    SHED,
+    TEXT_ONLY,
+    AudioCoalescer,
+    DegradationConfig,
+    DegradationController,
+    describe_mode,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(degradation.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def depth():
+    return [0.0]
+
+
+@pytest.fixture
+def changes():
+    return []
+
+
+@pytest.fixture
+def controller(clock, depth, changes):
+    controller = DegradationController(DegradationConfig(), queue_depth=lambda: depth[0])
+    controller.subscribe(lambda mode, reason: changes.append((mode, reason)))
+    return controller
+
+
+def test_mode_rises_straight_to_the_worst_signal(controller, clock, depth, changes):
+    controller.evaluate(clock[0])
+    assert controller.mode == NORMAL
+
+    depth[0] = 45
+    controller.evaluate(clock[0])
+    assert controller.mode == TEXT_ONLY
+    assert changes == [(TEXT_ONLY, "queueDepth=45")]
+
+    controller.loop_lag_ms = 500
+    controller.evaluate(clock[0])
+    assert controller.mode == SHED
+    assert not controller.accepting
+
+
+def test_mode_falls_one_step_per_quiet_period(controller, clock, changes):
+    controller.loop_lag_ms = 500
+    controller.evaluate(clock[0])
+    controller.loop_lag_ms = 0
+
+    # A dip shorter than recover_seconds keeps the mode
+    controller.evaluate(clock[0] + 1)
+    controller.evaluate(clock[0] + 10)
+    assert controller.mode == SHED
+    controller.evaluate(clock[0] + 16)
+    assert controller.mode == TEXT_ONLY
+    controller.evaluate(clock[0] + 31)
+    assert controller.mode == COARSE_AUDIO
+    controller.evaluate(clock[0] + 46)
+    assert controller.mode == NORMAL
+    assert [reason for _, reason in changes[1:]] == ["recovered"] * 3
+
+
+def test_a_relapse_restarts_the_recovery_wait(controller, clock):
+    controller.loop_lag_ms = 60
+    controller.evaluate(clock[0])
+    assert controller.mode == COARSE_AUDIO
+
+    controller.loop_lag_ms = 0
+    controller.evaluate(clock[0] + 1)
+    controller.loop_lag_ms = 60
+    controller.evaluate(clock[0] + 10)
+    controller.loop_lag_ms = 0
+    controller.evaluate(clock[0] + 17)
+    assert controller.mode == COARSE_AUDIO
+    controller.evaluate(clock[0] + 32)
+    assert controller.mode == NORMAL
+    assert controller.transitions == {"normal->coarse_audio": 1, "coarse_audio->normal": 1}
+
+
+def test_nova_latency_is_smoothed_and_expires(controller, clock):
+    controller.record_nova_latency(6000)
+    controller.evaluate(clock[0])
+    assert controller.mode == TEXT_ONLY
+
+    controller.record_nova_latency(1000)
+    assert controller.nova_latency_ms == pytest.approx(4500)
+
+    clock[0] += 61
+    assert controller.signals()["novaLatencyMs"] == 0
+    controller.record_nova_latency(1000)
+    assert controller.nova_latency_ms == 1000
+
+
+def test_clients_are_told_what_each_mode_means():
+    assert describe_mode(NORMAL) == {"mode": NORMAL, "assistantAudio": True, "inputFrameMs": None}
+    assert describe_mode(COARSE_AUDIO)["inputFrameMs"] == degradation.COARSE_INPUT_FRAME_MS
+    assert describe_mode(TEXT_ONLY)["assistantAudio"] is False
+
+
+def test_thresholds_from_the_environment(monkeypatch):
+    monkeypatch.setenv("VOICE_DEGRADE_QUEUE_DEPTH", "1,2,3")
+    assert DegradationConfig.from_env().queue_depth == (1, 2, 3)
+    monkeypatch.setenv("VOICE_DEGRADE_QUEUE_DEPTH", "1,2")
+    with pytest.raises(ValueError):
+        DegradationConfig.from_env()
+
+
+def test_coalescer_emits_frames_of_at_least_frame_bytes():
+    coalescer = AudioCoalescer(frame_bytes=10)
+    assert coalescer.add(b"abcd") is None
+    assert coalescer.pending
+    assert coalescer.add(b"efghijk") == b"abcdefghijk"
+    assert not coalescer.pending
+    coalescer.add(b"xy")
+    assert coalescer.take() == b"xy"
+    assert coalescer.take() == b""
@@ -0,0 +1,114 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from uploadImage import export
+from uploadImage.local_aws import LocalS3
+
+BUCKET = "bucket"
+
+
+@pytest.fixture
+def s3():
+    s3 = LocalS3()
+    for i in range(3):
+        s3.put_object(Bucket=BUCKET, Key=f"images/{i}.jpg", Body=bytes([i]) * 2000)
+        s3.put_object(Bucket=BUCKET, Key=f"analyses/{i}.txt", Body=f"analysis {i} " * 50)
+    s3.put_object(Bucket=BUCKET, Key="t/r0/00000.jsonl", Body='{"role": "USER", "content": "hi"}\n')
+    return s3
+
+
+def _items():
+    items = [
+        {
+            "id": f"r{i}",
+            "createdAt": "2024-05-01T10:00:00",
+            "imageKey": f"images/{i}.jpg",
+            "analysisKey": f"analyses/{i}.txt",
+        }
+        for i in range(3)
+    ]
+    items[0].update(transcriptPrefix="t/r0/", transcriptSegments=1)
+    # Points at an object that is gone
+    items[2]["analysisKey"] = "analyses/missing.txt"
+    return items
+
+
+def test_zip_streams_one_chunk_per_record_plus_the_directory(s3):
+    records = list(export.fetch_records(s3, BUCKET, _items(), prefetch=2))
+    chunks = list(export.zip_chunks(records))
+    assert len(chunks) == len(records) + 1
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    names = archive.namelist()
+    assert "records/r0/transcript/00000.jsonl" in names
+    assert "records/r2/analysis.txt" not in names
+    assert archive.read("records/r1/image.jpg") == bytes([1]) * 2000
+    assert archive.getinfo("records/r1/image.jpg").compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo("records/r1/analysis.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert json.loads(archive.read("records/r1/record.json"))["id"] == "r1"
+    assert archive.getinfo("records/r1/record.json").date_time == (2024, 5, 1, 10, 0, 0)
+
+
+def test_ndjson_has_one_line_per_record(s3):
+    lines = b"".join(export.archive_chunks(s3, BUCKET, _items(), "ndjson")).splitlines()
+    first = json.loads(lines[0])
+    assert len(lines) == 3
+    assert first["transcript"] == [{"role": "USER", "content": "hi"}]
+    assert first["image"]["extension"] == "jpg"
+
+
+def test_build_inline_returns_an_archive_under_the_limit(s3):
+    body = export.build_inline(export.archive_chunks(s3, BUCKET, _items(), "zip"), limit=1 << 20)
+    assert len(zipfile.ZipFile(io.BytesIO(body)).namelist()) == 9
+
+
+def test_export_over_the_inline_limit_falls_back_to_a_job(s3):
+    chunks = export.archive_chunks(s3, BUCKET, _items(), "zip")
+    with pytest.raises(export.ExportTooLarge):
+        export.build_inline(chunks, limit=3000)
+    # The half-read archive is closed, not left holding prefetched objects
+    with pytest.raises(StopIteration):
+        next(chunks)
+
+    export.start_job_status(s3, BUCKET, "u1", "job1", "zip")
+    assert export.job_status(s3, BUCKET, "u1", "job1")["status"] == "running"
+    export.run_export_job(s3, BUCKET, "u1", "job1", "zip", _items())
+    status = export.job_status(s3, BUCKET, "u1", "job1")
+    assert status["status"] == "done"
+    assert status["url"].startswith("https://")
+    body = s3.get_object(Bucket=BUCKET, Key=status["key"])["Body"].read()
+    assert len(zipfile.ZipFile(io.BytesIO(body)).namelist()) == 9
+    # Another user's id does not find the job
+    assert export.job_status(s3, BUCKET, "u2", "job1") is None
+
+
+def test_multipart_writer_uploads_whole_parts():
+    s3 = LocalS3()
+    writer = export.S3MultipartWriter(s3, BUCKET, "out.zip", "application/zip", part_size=4)
+    for chunk in (b"abc", b"defgh", b"ij"):
+        writer.write(chunk)
+    (upload,) = s3.uploads.values()
+    assert list(upload["Parts"].values()) == [b"abcd", b"efgh"]
+    writer.close()
+    assert s3.get_object(Bucket=BUCKET, Key="out.zip")["Body"].read() == b"abcdefghij"
+
+
+def test_small_archive_is_a_single_put():
+    s3 = LocalS3()
+    writer = export.S3MultipartWriter(s3, BUCKET, "out.zip", "application/zip", part_size=64)
+    writer.write(b"tiny")
+    writer.close()
+    assert s3.uploads == {}
+    assert s3.get_object(Bucket=BUCKET, Key="out.zip")["Body"].read() == b"tiny"
+
+
+def test_failed_job_aborts_its_upload():
+    s3 = LocalS3()
+    writer = export.S3MultipartWriter(s3, BUCKET, "out.zip", "application/zip", part_size=4)
+    writer.write(b"abcdefgh")
+    writer.abort()
+    assert s3.uploads == {}
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from uploadImage import idempotency
+from uploadImage.idempotency import (
+    IdempotencyConflict,
+    IdempotencyManager,
+    MemoryIdempotencyStore,
+    fingerprint,
+)
+
+RESPONSE = {"statusCode": 200, "body": '{"id": "abc"}'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(idempotency.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def manager(clock):
+    return IdempotencyManager(MemoryIdempotencyStore(), lock_seconds=35, retry_after=2)
+
+
+def test_completed_request_is_replayed(manager):
+    assert manager.begin("k", fingerprint("body"), "first") is None
+    manager.complete("k", "first", RESPONSE)
+    assert manager.begin("k", fingerprint("body"), "retry") == RESPONSE
+
+
+def test_key_reused_for_another_body_is_rejected(manager):
+    manager.begin("k", fingerprint("body"), "first")
+    with pytest.raises(IdempotencyConflict) as e:
+        manager.begin("k", fingerprint("other body"), "second")
+    assert e.value.status_code == 422
+
+
+def test_duplicate_in_flight_gets_409_without_waiting(manager):
+    manager.begin("k", fingerprint("body"), "first")
+    with pytest.raises(IdempotencyConflict) as e:
+        manager.begin("k", fingerprint("body"), "second")
+    assert e.value.status_code == 409
+    assert e.value.retry_after == 2
+
+
+def test_released_key_runs_again(manager):
+    manager.begin("k", fingerprint("body"), "first")
+    manager.release("k", "first")
+    assert manager.begin("k", fingerprint("body"), "retry") is None
+
+
+def test_crashed_owner_is_taken_over_after_the_lease(manager, clock):
+    manager.begin("k", fingerprint("body"), "crashed")
+    clock[0] += 30
+    with pytest.raises(IdempotencyConflict):
+        manager.begin("k", fingerprint("body"), "early")
+    clock[0] += 6
+    assert manager.begin("k", fingerprint("body"), "retry") is None
+
+    # The first owner turning up late changes nothing
+    manager.complete("k", "crashed", {"statusCode": 200, "body": "stale"})
+    manager.release("k", "crashed")
+    manager.complete("k", "retry", RESPONSE)
+    assert manager.begin("k", fingerprint("body"), "again") == RESPONSE
+
+
+def test_only_one_concurrent_request_claims_the_key():
+    manager = IdempotencyManager(MemoryIdempotencyStore())
+    barrier = threading.Barrier(8)
+    outcomes = []
+
+    def attempt(owner):
+        barrier.wait()
+        try:
+            outcomes.append(manager.begin("k", fingerprint("body"), owner))
+        except IdempotencyConflict as e:
+            outcomes.append(e.status_code)
+
+    threads = [threading.Thread(target=attempt, args=(str(i),)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(outcomes, key=str) == [409] * 7 + [None]
@@ -0,0 +1,96 @@
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+
+from voiceChat.identity import CognitoIdentityVerifier, Identity, Unauthenticated
+
+
+class NotAuthorizedException(Exception):
+    pass
+
+
+class FakeCognitoIdentity:
+    def __init__(self):
+        self.calls = []
+
+    def get_id(self, IdentityPoolId, Logins):
+        self.calls.append((IdentityPoolId, Logins))
+        (token,) = Logins.values()
+        if token.endswith(".forged"):
+            raise NotAuthorizedException("Invalid login token")
+        return {"IdentityId": f"us-east-1:{_payload(token)['sub']}"}
+
+
+def _payload(token: str) -> dict:
+    part = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(part + "=" * (-len(part) % 4)))
+
+
+def _token(signature: str = "sig", **claims) -> str:
+    claims = {"sub": "u1", "token_use": "id", "exp": time.time() + 3600, **claims}
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"header.{payload}.{signature}"
+
+
+@pytest.fixture
+def cognito():
+    return FakeCognitoIdentity()
+
+
+@pytest.fixture
+def verifier(cognito):
+    return CognitoIdentityVerifier("us-east-1:pool", "eu-west-1_users", client=cognito)
+
+
+def test_token_is_exchanged_for_the_identity_id(verifier, cognito):
+    identity = asyncio.run(verifier.verify(_token(**{"custom:tenant": "acme"})))
+    assert identity == Identity("us-east-1:u1", "acme")
+    pool, logins = cognito.calls[0]
+    assert pool == "us-east-1:pool"
+    assert list(logins) == ["cognito-idp.eu-west-1.amazonaws.com/eu-west-1_users"]
+
+
+def test_verified_tokens_are_cached(verifier, cognito):
+    token = _token()
+    assert asyncio.run(verifier.verify(token)) == asyncio.run(verifier.verify(token))
+    assert len(cognito.calls) == 1
+    assert asyncio.run(verifier.verify(_token(sub="u2"))).tenant == "default"
+    assert len(cognito.calls) == 2
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        None,
+        "",
+        "not-a-jwt",
+        _token(exp=time.time() - 1),
+        _token(token_use="access"),
+        _token(signature="forged"),
+    ],
+)
+def test_bad_tokens_are_rejected(verifier, token):
+    with pytest.raises(Unauthenticated):
+        asyncio.run(verifier.verify(token))
+
+
+def test_cognito_outage_is_not_reported_as_bad_token(cognito):
+    def unavailable(**kwargs):
+        raise ConnectionError("cognito unreachable")
+
+    cognito.get_id = unavailable
+    verifier = CognitoIdentityVerifier("us-east-1:pool", "us-east-1_users", client=cognito)
+    with pytest.raises(ConnectionError):
+        asyncio.run(verifier.verify(_token()))
+
+
+def test_cache_stays_bounded(cognito):
+    verifier = CognitoIdentityVerifier(
+        "us-east-1:pool", "us-east-1_users", client=cognito, max_entries=2
+    )
+    for sub in ("a", "b", "c"):
+        asyncio.run(verifier.verify(_token(sub=sub)))
+    assert len(verifier._entries) == 2
@@ -0,0 +1,62 @@
+import pytest
+
+from uploadImage import prompts
+from uploadImage.prompts import CACHE_MIN_TOKENS, get_prompt, system_blocks, token_report
+
+
+@pytest.fixture
+def prompt_dir(tmp_path, monkeypatch):
+    (tmp_path / "short.md").write_text("You are homeFix.\n", encoding="utf-8")
+    (tmp_path / "long.md").write_text("Check the fuse first. " * CACHE_MIN_TOKENS, encoding="utf-8")
+    monkeypatch.setattr(prompts, "PROMPT_DIR", str(tmp_path))
+    get_prompt.cache_clear()
+    yield tmp_path
+    get_prompt.cache_clear()
+
+
+def test_long_prompt_gets_a_cache_checkpoint_on_nova_text_models(prompt_dir):
+    blocks = system_blocks("long", "us.amazon.nova-lite-v1:0")
+    assert blocks[0]["text"].startswith("Check the fuse first.")
+    assert blocks[1] == {"cachePoint": {"type": "default"}}
+
+
+def test_short_prompt_has_no_checkpoint(prompt_dir):
+    assert system_blocks("short", "amazon.nova-pro-v1:0") == [{"text": "You are homeFix."}]
+
+
+def test_models_without_prompt_caching_have_no_checkpoint(prompt_dir):
+    assert len(system_blocks("long", "amazon.nova-sonic-v1:0")) == 1
+
+
+def test_shipped_image_prompt_is_below_the_cache_minimum():
+    # Documented in prompts.py: no checkpoint is sent for image analyses today
+    get_prompt.cache_clear()
+    assert len(system_blocks("homefix-image", "us.amazon.nova-lite-v1:0")) == 1
+
+
+def test_version_follows_the_text(prompt_dir):
+    version = get_prompt("short").version
+    (prompt_dir / "short.md").write_text("You are homeFix, v2.\n", encoding="utf-8")
+    get_prompt.cache_clear()
+    assert get_prompt("short").version != version
+
+
+def test_token_report_splits_cached_and_fresh_input(prompt_dir):
+    report = token_report(
+        "short",
+        {
+            "inputTokens": 40,
+            "outputTokens": 12,
+            "cacheReadInputTokenCount": 1200,
+            "cacheWriteInputTokenCount": None,
+        },
+    )
+    assert report == {
+        "prompt": "short",
+        "promptVersion": get_prompt("short").version,
+        "freshInputTokens": 40,
+        "cachedInputTokens": 1200,
+        "cacheWriteInputTokens": 0,
+        "outputTokens": 12,
+    }
+    assert token_report("short", {})["freshInputTokens"] == 0
@@ -0,0 +1,105 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from uploadImage import quotas
+from uploadImage.quotas import (
+    DynamoQuotaBackend,
+    MemoryQuotaBackend,
+    QuotaExceeded,
+    QuotaManager,
+)
+
+
+class FakeQuotaTable:
+    """Just the conditional writes DynamoQuotaBackend makes."""
+
+    def __init__(self):
+        self.items = {}
+
+    @staticmethod
+    def _failed():
+        return ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "Write")
+
+    def get_item(self, Key, ConsistentRead=False):
+        item = self.items.get(Key["id"])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeValues=None):
+        current = self.items.get(Item["id"])
+        if ConditionExpression == "attribute_not_exists(id)":
+            ok = current is None
+        else:
+            ok = current is not None and current["updatedAt"] == ExpressionAttributeValues[":prev"]
+        if not ok:
+            raise self._failed()
+        self.items[Item["id"]] = dict(Item)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None):
+        item = self.items.setdefault(Key["id"], {"id": Key["id"]})
+        if ConditionExpression and item.get("active", 0) >= ExpressionAttributeValues[":limit"]:
+            raise self._failed()
+        delta = ExpressionAttributeValues.get(":one", ExpressionAttributeValues.get(":minus"))
+        item["active"] = item.get("active", 0) + delta
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(quotas.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(quotas.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "dynamo"])
+def backend(request):
+    return MemoryQuotaBackend() if request.param == "memory" else DynamoQuotaBackend(FakeQuotaTable())
+
+
+def test_burst_then_refill_at_the_rate(backend, clock):
+    manager = QuotaManager(backend, uploads_per_minute=6, upload_burst=2)
+    manager.check_upload("alice")
+    manager.check_upload("alice")
+    with pytest.raises(QuotaExceeded) as e:
+        manager.check_upload("alice")
+    # One token every 10 s
+    assert e.value.retry_after == 10
+    # Other users have their own bucket
+    manager.check_upload("bob")
+
+    clock[0] += 10
+    manager.check_upload("alice")
+    with pytest.raises(QuotaExceeded):
+        manager.check_upload("alice")
+
+
+def test_idle_bucket_refills_only_to_the_burst(backend, clock):
+    manager = QuotaManager(backend, uploads_per_minute=60, upload_burst=2)
+    manager.check_upload("alice")
+    clock[0] += 3600
+    manager.check_upload("alice")
+    manager.check_upload("alice")
+    with pytest.raises(QuotaExceeded):
+        manager.check_upload("alice")
+
+
+def test_voice_sessions_are_capped_per_user(backend):
+    manager = QuotaManager(backend, max_voice_sessions=2)
+    manager.acquire_voice_session("alice")
+    manager.acquire_voice_session("alice")
+    with pytest.raises(QuotaExceeded) as e:
+        manager.acquire_voice_session("alice")
+    assert e.value.retry_after == 10
+    manager.acquire_voice_session("bob")
+
+    manager.release_voice_session("alice")
+    manager.acquire_voice_session("alice")
+
+
+def test_contended_dynamo_bucket_asks_for_a_back_off(clock):
+    table = FakeQuotaTable()
+
+    def always_raced(**kwargs):
+        raise FakeQuotaTable._failed()
+
+    table.put_item = always_raced
+    assert DynamoQuotaBackend(table).take_token("upload#alice", rate=0.5, burst=5) == 2
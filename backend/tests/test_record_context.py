@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from uploadImage.local_aws import LocalS3, LocalTable
+from voiceChat.record_context import RecordContextCache
+
+
+class CountingTable(LocalTable):
+    def __init__(self, delay: float = 0):
+        super().__init__()
+        self.delay = delay
+        self.reads = 0
+        self._reads_lock = threading.Lock()
+
+    def get_item(self, **kwargs):
+        with self._reads_lock:
+            self.reads += 1
+        time.sleep(self.delay)
+        return super().get_item(**kwargs)
+
+
+@pytest.fixture
+def cache():
+    cache = RecordContextCache("bucket", "records", max_entries=2)
+    cache.s3 = LocalS3()
+    cache.table = CountingTable(delay=0.05)
+    for record_id, owner in (("r1", "alice"), ("r2", "alice"), ("r3", "bob")):
+        key = f"analyses/{record_id}.txt"
+        cache.s3.put_object(Bucket="bucket", Key=key, Body=f"analysis of {record_id}")
+        cache.table.put_item(Item={"id": record_id, "userId": owner, "analysisKey": key})
+    cache.table.put_item(Item={"id": "voice", "userId": "alice", "transcriptPrefix": "t/"})
+    return cache
+
+
+def test_concurrent_lookups_share_one_fetch(cache):
+    async def scenario():
+        return await asyncio.gather(*(cache.get("r1", "alice") for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["analysis of r1"] * 5
+    assert cache.table.reads == 1
+    assert cache._inflight == {}
+
+
+def test_repeat_lookup_is_served_from_the_cache(cache):
+    assert asyncio.run(cache.get("r1", "alice")) == "analysis of r1"
+    assert asyncio.run(cache.get("r1", "alice")) == "analysis of r1"
+    assert cache.table.reads == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_other_users_never_get_the_text(cache):
+    assert asyncio.run(cache.get("r3", "alice")) is None
+    # Not even once bob's lookup has cached it
+    assert asyncio.run(cache.get("r3", "bob")) == "analysis of r3"
+    assert asyncio.run(cache.get("r3", "alice")) is None
+
+
+def test_records_without_an_analysis_are_not_cached(cache):
+    assert asyncio.run(cache.get("voice", "alice")) is None
+    assert asyncio.run(cache.get("missing", "alice")) is None
+    assert asyncio.run(cache.get("missing", "alice")) is None
+    assert cache.table.reads == 3
+
+
+def test_cache_is_bounded(cache):
+    for record_id in ("r1", "r2", "r3"):
+        asyncio.run(cache.get(record_id, "alice"))
+    assert list(cache._entries) == ["r2", "r3"]
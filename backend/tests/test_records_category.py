@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+
+def _get(app, user, category=None, **headers):
+    event = {
+        "httpMethod": "GET",
+        "resource": "/records",
+        "requestContext": {"identity": {"cognitoIdentityId": user}},
+        "queryStringParameters": {"category": category} if category is not None else None,
+        "headers": headers,
+    }
+    return app.route(event)
+
+
+@pytest.fixture
+def seeded(lambda_app):
+    rows = [
+        ("r1", "alice", "router", "2024-01-01T00:00:00"),
+        ("r2", "alice", "router", "2024-03-01T00:00:00"),
+        ("k1", "alice", "kettle", "2024-02-01T00:00:00"),
+        ("b1", "bob", "router", "2024-04-01T00:00:00"),
+    ]
+    for file_id, user, category, created_at in rows:
+        lambda_app._table.put_item(
+            Item={
+                "id": file_id,
+                "userId": user,
+                "createdAt": created_at,
+                "category": category,
+                "userCategory": lambda_app.category_key(user, category),
+            }
+        )
+    # Voice sessions have no category and only show up in the unfiltered list
+    lambda_app._table.put_item(
+        Item={"id": "v1", "userId": "alice", "createdAt": "2024-05-01T00:00:00"}
+    )
+    return lambda_app
+
+
+@pytest.mark.parametrize("category", ["router", "Router", "  ROUTER "])
+def test_category_lists_the_users_records_newest_first(seeded, category):
+    response = _get(seeded, "alice", category)
+    assert response["statusCode"] == 200
+    assert [item["id"] for item in json.loads(response["body"])] == ["r2", "r1"]
+
+
+def test_category_is_read_from_the_index_not_a_scan(seeded, monkeypatch):
+    def no_scan(**kwargs):
+        raise AssertionError("GET /records?category= must not scan")
+
+    monkeypatch.setattr(seeded._table, "scan", no_scan)
+    assert [item["id"] for item in json.loads(_get(seeded, "bob", "router")["body"])] == ["b1"]
+    assert json.loads(_get(seeded, "bob", "kettle")["body"]) == []
+
+
+def test_without_a_category_every_record_of_the_user_is_listed(seeded):
+    items = json.loads(_get(seeded, "alice")["body"])
+    assert {item["id"] for item in items} == {"r1", "r2", "k1", "v1"}
+
+
+def test_unchanged_category_revalidates_to_304(seeded):
+    etag = _get(seeded, "alice", "router")["headers"]["ETag"]
+    assert _get(seeded, "alice", "router", **{"If-None-Match": etag})["statusCode"] == 304
+    # The unfiltered list and other categories have their own ETags
+    assert _get(seeded, "alice", None, **{"If-None-Match": etag})["statusCode"] == 200
+    assert _get(seeded, "alice", "kettle", **{"If-None-Match": etag})["statusCode"] == 200
+
+    seeded._table.put_item(
+        Item={
+            "id": "r3",
+            "userId": "alice",
+            "createdAt": "2024-06-01T00:00:00",
+            "category": "router",
+            "userCategory": seeded.category_key("alice", "router"),
+        }
+    )
+    response = _get(seeded, "alice", "router", **{"If-None-Match": etag})
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])[0]["id"] == "r3"
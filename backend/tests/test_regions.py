@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import pytest
+
+from uploadImage.regions import RegionSelector, _parse_endpoints, region_guard, should_fail_over
+from uploadImage.resilience import CircuitOpenError, get_guard
+
+
+class FakeClientError(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class EndpointConnectionError(Exception):
+    pass
+
+
+def _selector(regions=("us-east-1", "us-west-2", "eu-west-1"), **overrides) -> RegionSelector:
+    return RegionSelector(list(regions), **{"explore": 0, **overrides})
+
+
+def test_latency_is_an_ewma():
+    selector = _selector(alpha=0.5)
+    selector.record("us-east-1", 100, ok=True)
+    selector.record("us-east-1", 200, ok=True)
+    selector.record("us-east-1", 400, ok=True)
+    stats = selector.stats()["us-east-1"]
+    # 100 -> 150 -> 275
+    assert stats["latencyMs"] == 275
+    assert stats["requests"] == 3
+    assert stats["errorRate"] == 0
+
+
+def test_fastest_region_ranks_first():
+    selector = _selector()
+    for region, ms in (("us-east-1", 300), ("us-west-2", 80), ("eu-west-1", 150)):
+        selector.record(region, ms, ok=True)
+    assert selector.ranked() == ["us-west-2", "eu-west-1", "us-east-1"]
+    assert selector.best() == "us-west-2"
+
+
+def test_unused_regions_are_ordered_by_probe():
+    selector = _selector()
+    selector.record_probe("us-east-1", 120)
+    selector.record_probe("us-west-2", 40)
+    selector.record_probe("eu-west-1", None)
+    assert selector.ranked() == ["us-west-2", "us-east-1", "eu-west-1"]
+
+
+def test_failure_penalises_a_region_until_the_cooldown_passes():
+    selector = _selector(regions=("a", "b"), cooldown=0.05, error_penalty_ms=1000, alpha=0.5)
+    selector.record("a", 50, ok=True)
+    selector.record("b", 200, ok=True)
+    selector.record("a", 50, ok=False)
+    assert selector.ranked() == ["b", "a"]
+    # Error rate 0.5 still costs 500 ms after the cooldown
+    time.sleep(0.06)
+    assert selector.ranked() == ["b", "a"]
+    for _ in range(5):
+        selector.record("a", 50, ok=True)
+    assert selector.ranked() == ["a", "b"]
+
+
+def test_exploration_only_promotes_healthy_regions(monkeypatch):
+    selector = _selector(regions=("a", "b", "c"), explore=1.0)
+    selector.record("a", 10, ok=True)
+    selector.record("b", 20, ok=True)
+    selector.record("c", 5, ok=False)
+    monkeypatch.setattr("uploadImage.regions.random.choice", lambda options: options[-1])
+    assert selector.ranked()[0] == "b"
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        FakeClientError("ThrottlingException"),
+        EndpointConnectionError("unreachable"),
+        CircuitOpenError("bedrock:us-east-1", 10),
+    ],
+)
+def test_fails_over_to_the_next_region(exc):
+    selector = _selector(regions=("us-east-1", "us-west-2"))
+    selector.record("us-east-1", 10, ok=True)
+    selector.record("us-west-2", 50, ok=True)
+    tried = []
+
+    def invoke(region):
+        tried.append(region)
+        if region == "us-east-1":
+            raise exc
+        return region
+
+    assert selector.call(invoke) == "us-west-2"
+    assert tried == ["us-east-1", "us-west-2"]
+    assert selector.stats()["us-east-1"]["errors"] == 1
+    # The failed region now ranks last
+    assert selector.best() == "us-west-2"
+
+
+def test_client_errors_do_not_fail_over():
+    selector = _selector(regions=("a", "b"))
+    tried = []
+
+    def invoke(region):
+        tried.append(region)
+        raise FakeClientError("ValidationException")
+
+    with pytest.raises(FakeClientError):
+        selector.call(invoke)
+    assert len(tried) == 1
+    assert all(s["errors"] == 0 for s in selector.stats().values())
+
+
+def test_last_region_failure_is_raised():
+    selector = _selector(regions=("a", "b"))
+
+    def invoke(region):
+        raise FakeClientError("ServiceUnavailableException")
+
+    with pytest.raises(FakeClientError):
+        selector.call(invoke)
+    assert all(s["errors"] == 1 for s in selector.stats().values())
+
+
+def test_acall_fails_over():
+    selector = _selector(regions=("a", "b"))
+    selector.record("a", 10, ok=True)
+
+    async def invoke(region):
+        if region == "a":
+            raise TimeoutError()
+        return region
+
+    assert asyncio.run(selector.acall(invoke)) == "b"
+
+
+def test_should_fail_over():
+    assert should_fail_over(FakeClientError("ThrottlingException"))
+    assert should_fail_over(EndpointConnectionError())
+    assert not should_fail_over(FakeClientError("ValidationException"))
+    assert not should_fail_over(ValueError())
+
+
+def test_parse_endpoints():
+    assert _parse_endpoints(" us-east-1=http://127.0.0.1:8001, bad ,us-west-2=http://x ") == {
+        "us-east-1": "http://127.0.0.1:8001",
+        "us-west-2": "http://x",
+    }
+
+
+def test_each_region_gets_its_own_guard():
+    multi = _selector(regions=("us-east-1", "us-west-2"))
+    east, west = region_guard("us-east-1", multi), region_guard("us-west-2", multi)
+    assert east is not west
+    assert east.breaker is not west.breaker
+    assert region_guard("us-east-1", _selector(regions=("us-east-1",))) is get_guard()
@@ -0,0 +1,76 @@
+import base64
+
+import numpy as np
+import pytest
+
+from voiceChat.resampler import InputNormalizer, PolyphaseResampler, create_input_normalizer
+
+
+def _tone(rate: int, seconds: float = 0.5) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+@pytest.mark.parametrize("content", ["", "AAA=", "AAAA"])
+def test_empty_or_sub_frame_chunk_yields_nothing(content):
+    normalizer = InputNormalizer(48000, "f32", 1)
+    assert normalizer.process(content) == ""
+
+
+def test_empty_chunk_does_not_disturb_the_stream():
+    audio = _tone(48000).tobytes()
+    whole = InputNormalizer(48000, "f32", 1).process_bytes(audio)
+
+    normalizer = InputNormalizer(48000, "f32", 1)
+    out = normalizer.process_bytes(b"") + normalizer.process_bytes(audio[:4])
+    out += normalizer.process_bytes(b"") + normalizer.process_bytes(audio[4:])
+    assert out == whole
+
+
+@pytest.mark.parametrize(
+    "rate,fmt,channels", [(48000, "f32", 1), (44100, "s16", 2), (22050, "s16", 1), (96000, "f32", 1)]
+)
+def test_chunking_does_not_change_the_output(rate, fmt, channels):
+    samples = np.repeat(_tone(rate)[:, None], channels, axis=1).reshape(-1)
+    if fmt == "s16":
+        samples = (samples * 32767).astype("<i2")
+    audio = samples.tobytes()
+    whole = InputNormalizer(rate, fmt, channels).process_bytes(audio)
+
+    # Uneven chunks, splitting frames and shorter than the filter
+    rng = np.random.default_rng(1)
+    normalizer = InputNormalizer(rate, fmt, channels)
+    out, offset = b"", 0
+    while offset < len(audio):
+        size = int(rng.integers(0, 700))
+        out += normalizer.process_bytes(audio[offset : offset + size])
+        offset += size
+    assert out == whole
+
+
+def test_output_rate_and_level():
+    out = PolyphaseResampler(48000, 16000).process(_tone(48000, 1.0))
+    assert abs(len(out) - 16000) <= 1
+    # Past the filter's warm-up the tone keeps its amplitude
+    assert np.max(np.abs(out[200:])) == pytest.approx(0.5, abs=0.01)
+
+
+def test_native_format_needs_no_normalizer():
+    assert create_input_normalizer({}) is None
+    assert create_input_normalizer({"sampleRate": "16000", "sampleFormat": "s16"}) is None
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"sampleRate": "abc"}, {"sampleRate": "1000"}, {"sampleFormat": "u8"}, {"channels": "9"}],
+)
+def test_bad_formats_are_rejected(params):
+    with pytest.raises(ValueError):
+        create_input_normalizer(params)
+
+
+def test_base64_roundtrip():
+    normalizer = InputNormalizer(32000, "s16", 1)
+    content = base64.b64encode((_tone(32000) * 32767).astype("<i2").tobytes()).decode()
+    out = base64.b64decode(normalizer.process(content))
+    assert len(out) % 2 == 0 and len(out) > 0
@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+import pytest
+
+from uploadImage.resilience import BedrockGuard, CircuitBreaker, CircuitOpenError
+
+
+class FakeClientError(Exception):
+    """Shaped like botocore's ClientError."""
+
+    def __init__(self, code: str, status: int):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+
+
+class EndpointConnectionError(Exception):
+    pass
+
+
+def _guard(**overrides) -> BedrockGuard:
+    settings = {
+        "rate": 1e9,
+        "burst": 1e9,
+        "max_retries": 3,
+        "base_delay": 0,
+        "max_delay": 0,
+        "failure_threshold": 2,
+        "reset_timeout": 0.05,
+    }
+    return BedrockGuard("test", **{**settings, **overrides})
+
+
+def _raise(exc):
+    def fn():
+        raise exc
+
+    return fn
+
+
+def test_breaker_opens_at_threshold_and_probes_after_timeout():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert breaker.before_call() is None
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is True
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.before_call() > 0
+
+    time.sleep(0.06)
+    assert breaker.before_call() is None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert breaker.before_call() > 0
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is None
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() is None
+    assert breaker.record_failure() is True
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_probe_that_never_reports_back_is_replaced():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() is None
+    assert breaker.before_call() > 0
+    time.sleep(0.06)
+    assert breaker.before_call() is None
+
+
+def test_retries_throttling_then_succeeds():
+    guard = _guard()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise FakeClientError("ThrottlingException", 429)
+        return "ok"
+
+    assert guard.call(flaky) == "ok"
+    assert guard.counters["throttled"] == 1
+    assert guard.counters["retries"] == 1
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_error_is_not_retried_and_keeps_breaker_closed():
+    guard = _guard(failure_threshold=1)
+    with pytest.raises(FakeClientError):
+        guard.call(_raise(FakeClientError("ValidationException", 400)))
+    assert guard.counters["calls"] == 1
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        EndpointConnectionError("could not connect"),
+        TimeoutError("read timed out"),
+        FakeClientError("InternalFailure", 500),
+    ],
+)
+def test_unreachable_bedrock_opens_the_breaker(exc):
+    guard = _guard()
+    for _ in range(2):
+        with pytest.raises(type(exc)):
+            guard.call(_raise(exc))
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    assert guard.counters["breakerOpened"] == 1
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda: "never called")
+    assert guard.counters["rejected"] == 1
+
+
+def test_cancelled_probe_reopens_the_breaker():
+    guard = _guard(failure_threshold=1)
+    with pytest.raises(EndpointConnectionError):
+        guard.call(_raise(EndpointConnectionError()))
+    time.sleep(0.06)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        probe = asyncio.create_task(guard.acall(hang))
+        await asyncio.sleep(0.01)
+        assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert asyncio.run(guard.acall(asyncio.sleep, 0, "ok")) == "ok"
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_call_while_closed_is_not_a_failure():
+    guard = _guard(failure_threshold=1)
+
+    async def scenario():
+        call = asyncio.create_task(guard.acall(asyncio.sleep, 10))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,94 @@
+import pytest
+
+from uploadImage.local_aws import LocalS3
+from uploadImage.search_index import (
+    LocalSegmentStore,
+    S3SegmentStore,
+    SearchIndex,
+    analysis_document,
+    tokenize,
+    transcript_document,
+)
+
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return LocalSegmentStore(str(tmp_path))
+    return S3SegmentStore(LocalS3(), "bucket")
+
+
+def _doc(record_id, text, **extra):
+    return {"id": record_id, "recordId": record_id, "text": text, **extra}
+
+
+def _ids(results):
+    return [r["id"] for r in results]
+
+
+def test_tokenize_drops_stopwords_and_single_letters():
+    assert tokenize("The Router's LED is off, error 7") == ["router", "led", "off", "error", "7"]
+
+
+def test_bm25_ranks_rarer_and_more_frequent_terms_higher(store):
+    index = SearchIndex(store)
+    index.add("alice", [_doc("r1", "router blinking red light")])
+    index.add("alice", [_doc("r2", "kettle does not heat, kettle switch broken")])
+    index.add("alice", [_doc("r3", "router fine, kettle light on")])
+
+    assert _ids(index.search("alice", "router")) == ["r1", "r3"]
+    # r2 mentions kettle twice in a short text
+    assert _ids(index.search("alice", "kettle"))[0] == "r2"
+    # Both terms beat either one alone
+    assert _ids(index.search("alice", "router kettle"))[0] == "r3"
+    assert index.search("alice", "the and") == []
+    assert index.search("alice", "dishwasher") == []
+
+
+def test_users_only_search_their_own_documents(store):
+    index = SearchIndex(store)
+    index.add("alice", [_doc("r1", "router reboot")])
+    index.add("bob/../alice", [_doc("r2", "router reset")])
+    assert _ids(index.search("alice", "router")) == ["r1"]
+    assert _ids(index.search("bob/../alice", "router")) == ["r2"]
+    assert index.search("carol", "router") == []
+
+
+def test_segments_are_compacted_at_the_threshold(store):
+    index = SearchIndex(store, compact_at=3)
+    index.add("alice", [_doc("r1", "router")])
+    index.add("alice", [_doc("r2", "router kettle")])
+    assert len(store.names("alice")) == 2
+    index.add("alice", [_doc("r3", "kettle")])
+    assert len(store.names("alice")) == 1
+
+    # A fresh container reads the merged segment and ranks the same
+    cold = SearchIndex(store, compact_at=3)
+    assert sorted(_ids(cold.search("alice", "router"))) == ["r1", "r2"]
+    assert sorted(_ids(cold.search("alice", "kettle"))) == ["r2", "r3"]
+
+
+def test_duplicates_left_by_racing_compactions_collapse(store):
+    index = SearchIndex(store, compact_at=10)
+    index.add("alice", [_doc("r1", "router reboot"), _doc("r2", "router")])
+    index.add("alice", [_doc("r1", "router reboot")])
+    assert sorted(_ids(index.search("alice", "router"))) == ["r1", "r2"]
+
+    index.compact("alice")
+    assert len(store.names("alice")) == 1
+    # Scores shift once the duplicate no longer counts in the corpus statistics
+    assert sorted(_ids(index.search("alice", "router"))) == ["r1", "r2"]
+
+
+def test_voice_batches_collapse_into_their_session(store):
+    index = SearchIndex(store)
+    lines = ['{"role": "USER", "content": "my router keeps dropping"}', "not json"]
+    index.add("alice", [transcript_document("s1", 0, lines)])
+    index.add("alice", [transcript_document("s1", 1, ['{"role": "ASSISTANT", "content": "restart the router"}'])])
+    index.add("alice", [analysis_document("r1", "A router.", {"category": "router", "symptoms": ["dropping"]})])
+
+    results = index.search("alice", "router dropping")
+    assert sorted(_ids(results)) == ["r1", "s1"]
+    kinds = {r["id"]: r["kind"] for r in results}
+    assert kinds == {"s1": "voice", "r1": "analysis"}
+    assert next(r for r in results if r["id"] == "r1")["category"] == "router"
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+from voiceChat.similar_cases import CaseIndex, CaseRetriever, HashingEmbedder
+
+WIFI = "my wifi router keeps dropping the connection every evening"
+SINK = "the kitchen sink drains slowly and smells bad"
+
+
+@pytest.fixture
+def index():
+    index = CaseIndex(HashingEmbedder(), capacity=2)
+    index.add("wifi", WIFI, "Moved the router off the microwave shelf.", user_id="alice")
+    index.add("sink", SINK, "Cleared the P-trap.", user_id="alice")
+    index.add("bob-wifi", WIFI, "Replaced the router.", user_id="bob")
+    return index
+
+
+def test_embeddings_are_normalised_and_stable():
+    embedder = HashingEmbedder()
+    vectors = embedder([WIFI, SINK, ""])
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0, atol=1e-5)
+    assert not vectors[2].any()
+    assert np.array_equal(vectors, HashingEmbedder()([WIFI, SINK, ""]))
+
+
+def test_search_ranks_by_cosine_and_applies_min_score(index):
+    results = index.search("wifi keeps dropping in the evening", k=3, user_id="alice")
+    assert [case["id"] for case in results] == ["wifi", "sink"]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0]["score"] <= 1.0 + 1e-6
+
+    exact = index.search(WIFI, k=3, min_score=0.99, user_id="alice")
+    assert [case["id"] for case in exact] == ["wifi"]
+
+
+def test_search_only_sees_the_callers_cases(index):
+    assert [case["id"] for case in index.search(WIFI, user_id="bob")] == ["bob-wifi"]
+    assert index.search(WIFI, user_id="carol") == []
+    assert all(case["userId"] == "alice" for case in index.search(WIFI, user_id="alice"))
+
+
+def test_unowned_cases_are_never_returned():
+    index = CaseIndex(HashingEmbedder())
+    index.add_vectors(HashingEmbedder()([WIFI]), [{"id": "legacy", "summary": "x"}])
+    assert index.search(WIFI, user_id="") == []
+
+
+def test_duplicate_ids_are_ignored(index):
+    index.add("wifi", SINK, "changed", user_id="alice")
+    assert len(index) == 3
+    assert index.search(WIFI, k=1, user_id="alice")[0]["summary"].startswith("Moved")
+
+
+def test_cases_are_appended_as_they_are_added(tmp_path):
+    path = str(tmp_path)
+    index = CaseIndex.load(path, HashingEmbedder())
+    index.add("wifi", WIFI, user_id="alice")
+    index.add("sink", SINK, user_id="alice")
+
+    reloaded = CaseIndex.load(path, HashingEmbedder())
+    assert len(reloaded) == 2
+    assert reloaded.search(WIFI, k=1, user_id="alice")[0]["id"] == "wifi"
+
+
+def test_torn_append_is_dropped_and_appends_stay_aligned(tmp_path):
+    path = str(tmp_path)
+    index = CaseIndex.load(path, HashingEmbedder())
+    index.add("wifi", WIFI, user_id="alice")
+    # Died after writing the case but before its vector
+    with open(os.path.join(path, "cases.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "torn", "userId": "alice", "summary": ""}) + "\n")
+
+    index = CaseIndex.load(path, HashingEmbedder())
+    assert len(index) == 1
+    index.add("sink", SINK, user_id="alice")
+    reloaded = CaseIndex.load(path, HashingEmbedder())
+    assert [case["id"] for case in reloaded.search(SINK, k=2, user_id="alice")] == ["sink", "wifi"]
+
+
+def test_index_built_with_another_dimension_starts_over(tmp_path):
+    path = str(tmp_path)
+    CaseIndex.load(path, HashingEmbedder(dim=64)).add("wifi", WIFI, user_id="alice")
+    assert len(CaseIndex.load(path, HashingEmbedder(dim=100))) == 0
+
+
+def test_retriever_injects_each_case_once(index):
+    retriever = CaseRetriever(index, k=3, min_score=0.5)
+    seen: set[str] = set()
+
+    context = asyncio.run(retriever.lookup(WIFI, seen, "alice"))
+    assert "Moved the router off the microwave shelf." in context
+    assert "Replaced the router." not in context
+    assert "P-trap" not in context
+    assert seen == {"wifi"}
+    assert asyncio.run(retriever.lookup(WIFI, seen, "alice")) is None
+
+
+def test_retriever_skips_short_utterances(index):
+    assert asyncio.run(CaseRetriever(index).lookup("wifi router", set(), "alice")) is None
@@ -0,0 +1,68 @@
+import json
+import sys
+import time
+import types
+
+import pytest
+
+from uploadImage import startup
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(startup, "_phases", {})
+    monkeypatch.setattr(startup, "_warm_up_hooks", [])
+    monkeypatch.setattr(startup, "_reported", False)
+    monkeypatch.delenv("WARM_UP_ON_INIT", raising=False)
+
+
+@pytest.fixture
+def hook():
+    calls = []
+
+    @startup.on_warm_up
+    def create_clients():
+        calls.append(1)
+
+    return calls
+
+
+def test_timed_records_the_phase_even_when_it_fails():
+    with pytest.raises(ValueError):
+        with startup.timed("init s3"):
+            raise ValueError()
+    assert startup._phases["init s3"] >= 0
+
+
+def test_warm_up_runs_hooks_on_init_when_asked(monkeypatch, hook):
+    startup.init_done()
+    assert hook == []
+    monkeypatch.setenv("WARM_UP_ON_INIT", "1")
+    startup.init_done()
+    assert hook == [1]
+    assert "warm_up create_clients" in startup._phases
+    assert startup._phases["init total"] > 0
+
+
+def test_snapstart_defers_warm_up_to_the_snapshot(monkeypatch, hook):
+    registered = []
+    runtime = types.ModuleType("snapshot_restore_py")
+    runtime.register_before_snapshot = registered.append
+    monkeypatch.setitem(sys.modules, "snapshot_restore_py", runtime)
+    monkeypatch.setenv("WARM_UP_ON_INIT", "1")
+
+    startup.init_done()
+    assert hook == []
+    registered[0]()
+    assert hook == [1]
+
+
+def test_cold_start_is_reported_once(capsys):
+    startup._phases["init total"] = 120.0
+    startup.report_cold_start(time.perf_counter())
+    startup.report_cold_start(time.perf_counter())
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record["coldStart"] is True
+    assert record["initMs"] == 120.0
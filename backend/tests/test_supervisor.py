@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from voiceChat import supervisor
+from voiceChat.supervisor import SessionActivity, SessionSupervisor, SupervisorConfig
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(supervisor.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _supervise(activities, **config):
+    """Register the sessions and sweep once; returns the supervisor and reclaims."""
+    # A long interval keeps the background loop out of the way of sweep()
+    sup = SessionSupervisor(SupervisorConfig(check_interval=3600, **config))
+    closed = []
+
+    def reclaimer(session_id):
+        async def reclaim(reason, code):
+            closed.append((session_id, reason, code))
+
+        return reclaim
+
+    async def run():
+        for activity in activities:
+            sup.register(activity, reclaimer(activity.session_id))
+        await sup.sweep()
+
+    asyncio.run(run())
+    return sup, closed
+
+
+def test_idle_sessions_are_reclaimed_and_active_ones_kept(clock):
+    idle, active = SessionActivity("idle"), SessionActivity("active")
+    clock[0] += 100
+    active.touch()
+    clock[0] += 30
+
+    sup, closed = _supervise([idle, active], idle_seconds=120)
+    assert closed == [("idle", supervisor.IDLE, 1000)]
+    assert sup.stats()["supervised"] == 1
+    assert sup.stats()["reclaimed"] == {supervisor.IDLE: 1}
+
+
+def test_duration_cap_applies_to_busy_sessions(clock):
+    activity = SessionActivity("s")
+    clock[0] += 1801
+    activity.touch()
+    _, closed = _supervise([activity], max_duration_seconds=1800)
+    assert closed == [("s", supervisor.MAX_DURATION, 1000)]
+
+
+def test_slow_clients_are_reclaimed_for_backpressure(clock):
+    queued, stalled = SessionActivity("queued"), SessionActivity("stalled")
+    queued.pending_sends = 201
+    stalled.sending_since = clock[0]
+    clock[0] += 31
+    queued.touch()
+    stalled.touch()
+
+    _, closed = _supervise([queued, stalled])
+    assert sorted(closed) == [
+        ("queued", supervisor.BACKPRESSURE, 1008),
+        ("stalled", supervisor.BACKPRESSURE, 1008),
+    ]
+
+
+def test_memory_sweep_counts_registered_buffers(clock):
+    activity = SessionActivity("s")
+    activity.pending_bytes = 600
+    held = [300]
+    activity.add_probe(lambda: held[0])
+
+    _, closed = _supervise([activity], max_buffered_bytes=1000)
+    assert closed == []
+    held[0] = 401
+    _, closed = _supervise([activity], max_buffered_bytes=1000)
+    assert closed == [("s", supervisor.MEMORY, 1008)]
+
+
+def test_a_failing_reclaim_does_not_stop_the_sweep(clock):
+    first, second = SessionActivity("first"), SessionActivity("second")
+    clock[0] += 200
+    sup = SessionSupervisor(SupervisorConfig(check_interval=3600))
+    closed = []
+
+    async def broken(reason, code):
+        raise RuntimeError("socket already gone")
+
+    async def reclaim(reason, code):
+        closed.append(reason)
+
+    async def run():
+        sup.register(first, broken)
+        sup.register(second, reclaim)
+        await sup.sweep()
+
+    asyncio.run(run())
+    assert closed == [supervisor.IDLE]
+    assert sup.stats()["reclaimed"] == {supervisor.IDLE: 2}
+
+
+def test_background_loop_sweeps_until_no_session_is_left(clock):
+    sup = SessionSupervisor(SupervisorConfig(check_interval=0, idle_seconds=10))
+    closed = []
+
+    async def reclaim(reason, code):
+        closed.append(reason)
+
+    async def run():
+        sup.register(SessionActivity("s"), reclaim)
+        clock[0] += 11
+        await asyncio.wait_for(sup._task, 1)
+
+    asyncio.run(run())
+    assert closed == [supervisor.IDLE]
+    assert sup.mean_pending_sends() == 0.0
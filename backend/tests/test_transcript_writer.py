@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from voiceChat.transcript_writer import LocalTranscriptSink, TranscriptWriter
+
+
+class FakeSink:
+    def __init__(self, fail_first: int = 0):
+        self.batches = []
+        self.fail_first = fail_first
+
+    def write_batch(self, session_id, user_id, seq, lines):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise ConnectionError("s3 unavailable")
+        self.batches.append((session_id, user_id, seq, [json.loads(line) for line in lines]))
+
+
+def _contents(batch):
+    return [(line["role"], line["content"]) for line in batch[3]]
+
+
+def test_turn_end_flushes_the_turn_as_one_batch():
+    sink = FakeSink()
+
+    async def scenario():
+        writer = TranscriptWriter("s1", "alice", sink)
+        writer.append("USER", "the sink is leaking")
+        writer.append("ASSISTANT", "Tighten the slip nut.")
+        writer.append("ASSISTANT", "")
+        assert sink.batches == []
+        assert writer.buffered_bytes > 0
+        writer.end_turn()
+        assert writer.buffered_bytes == 0
+        writer.append("USER", "that worked")
+        writer.end_turn()
+        # Nothing buffered: no empty batch
+        writer.end_turn()
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert [batch[2] for batch in sink.batches] == [0, 1]
+    assert sink.batches[0][:2] == ("s1", "alice")
+    assert _contents(sink.batches[0]) == [
+        ("USER", "the sink is leaking"),
+        ("ASSISTANT", "Tighten the slip nut."),
+    ]
+    assert len(writer.history) == 3
+
+
+def test_large_buffer_is_flushed_mid_turn():
+    sink = FakeSink()
+
+    async def scenario():
+        writer = TranscriptWriter("s1", "alice", sink, max_bytes=100)
+        writer.append("ASSISTANT", "x" * 120)
+        writer.append("ASSISTANT", "tail")
+        await asyncio.sleep(0.05)
+        assert len(sink.batches) == 1
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert [_contents(batch) for batch in sink.batches] == [
+        [("ASSISTANT", "x" * 120)],
+        [("ASSISTANT", "tail")],
+    ]
+
+
+def test_failed_batch_does_not_leave_a_gap_in_the_segment_numbers():
+    sink = FakeSink(fail_first=1)
+
+    async def scenario():
+        writer = TranscriptWriter("s1", "alice", sink)
+        writer.append("USER", "lost")
+        writer.end_turn()
+        writer.append("USER", "kept")
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert [(batch[2], _contents(batch)) for batch in sink.batches] == [(0, [("USER", "kept")])]
+
+
+def test_local_sink_appends_json_lines(tmp_path, monkeypatch):
+    monkeypatch.delenv("SEARCH_INDEX_DIR", raising=False)
+    sink = LocalTranscriptSink(str(tmp_path))
+
+    async def scenario():
+        writer = TranscriptWriter("s1", "alice", sink)
+        writer.append("USER", "hello")
+        writer.end_turn()
+        writer.append("ASSISTANT", "hi")
+        await writer.close()
+
+    asyncio.run(scenario())
+    lines = (tmp_path / "s1.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["content"] for line in lines] == ["hello", "hi"]
@@ -56,9 +56,14 @@ const existingLambda = Function.fromFunctionArn(
 
 const restApi = new RestApi(apiStack, "RestApi", {
   restApiName: "imageAnalyzer",
+  // Types the Lambda may return base64-wrapped (gzip/br JSON, exports); keep
+  // in sync with http_cache.BINARY_MEDIA_TYPES. A wildcard would also catch
+  // the CORS OPTIONS mocks and break preflight
+  binaryMediaTypes: ["application/json", "application/zip", "application/x-ndjson"],
   defaultCorsPreflightOptions: {
     allowOrigins: Cors.ALL_ORIGINS,
     allowMethods: Cors.ALL_METHODS,
+    allowHeaders: [...Cors.DEFAULT_HEADERS, "Idempotency-Key"],
   },
 });
 
@@ -81,6 +86,25 @@ recordsResource.addMethod("GET", lambdaIntegration, {
   authorizationType: AuthorizationType.COGNITO,
 });
 
+// GET /records/search?q= → SAM Lambda → handle_search_records()
+recordsResource.addResource("search").addMethod("GET", lambdaIntegration, {
+  authorizer,
+  authorizationType: AuthorizationType.COGNITO,
+});
+
+// GET /records/export → SAM Lambda → handle_export_records()
+const exportResource = recordsResource.addResource("export");
+exportResource.addMethod("GET", lambdaIntegration, {
+  authorizer,
+  authorizationType: AuthorizationType.COGNITO,
+});
+
+// GET /records/export/{jobId} → SAM Lambda → handle_get_export_job()
+exportResource.addResource("{jobId}").addMethod("GET", lambdaIntegration, {
+  authorizer,
+  authorizationType: AuthorizationType.COGNITO,
+});
+
 // GET /records/{id} → SAM Lambda → handle_get_single_record()
 const recordIdResource = recordsResource.addResource("{id}");
 recordIdResource.addMethod("GET", lambdaIntegration, {
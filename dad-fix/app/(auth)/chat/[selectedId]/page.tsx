@@ -45,6 +45,7 @@ function Home() {
         const response = await get({
           apiName: "myExistingApi",
           path: `/records/${selectedId}`,
+          options: { headers: { Accept: "application/json" } },
         }).response;
 
         const item = (await response.body.json()) as RecordItem;
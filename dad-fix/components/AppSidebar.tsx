@@ -35,6 +35,8 @@ export function AppSidebar() {
         const response = await get({
           apiName: "myExistingApi",
           path: "/records",
+          // API Gateway only decodes compressed bodies for a binary Accept type
+          options: { headers: { Accept: "application/json" } },
         }).response;
 
         const data = (await response.body.json()) as RecordItem[];
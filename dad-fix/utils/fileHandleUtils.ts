@@ -29,17 +29,34 @@ const deriveIdFromKey = (key?: string) => {
   return lastSegment.split(".")[0];
 };
 
-export async function uploadImage(file: File) {
-  const response = await post({
-    apiName: "myExistingApi",
-    path: "/items",
-    options: {
-      body: { imageBase64: await fileToBase64(file) },
-    },
-  }).response;
-
-  const data = (await response.body.json()) as UploadImageResponse;
-  const id = data.id ?? deriveIdFromKey(data.analysisKey ?? data.imageKey);
-
-  return { ...data, id };
+const MAX_UPLOAD_RETRIES = 2;
+
+export async function uploadImage(
+  file: File,
+  idempotencyKey: string = crypto.randomUUID(),
+) {
+  const imageBase64 = await fileToBase64(file);
+
+  // Every attempt sends the same key, so a retry of a slow upload gets the
+  // first attempt's result instead of a second analysis
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const response = await post({
+        apiName: "myExistingApi",
+        path: "/items",
+        options: {
+          headers: { "Idempotency-Key": idempotencyKey },
+          body: { imageBase64 },
+        },
+      }).response;
+
+      const data = (await response.body.json()) as UploadImageResponse;
+      const id = data.id ?? deriveIdFromKey(data.analysisKey ?? data.imageKey);
+
+      return { ...data, id };
+    } catch (err) {
+      if (attempt >= MAX_UPLOAD_RETRIES) throw err;
+      await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempt));
+    }
+  }
 }